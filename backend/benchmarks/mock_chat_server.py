@@ -0,0 +1,302 @@
+"""Local stand-in for a site with an embedded AI chat widget.
+
+The host page embeds the widget in an iframe, and the widget streams replies
+from ``/api/chat`` as server-sent events, so both browser and direct runs
+work against it. Everything is configured per request through the host
+page's query string, which is passed on to the widget and its API calls:
+
+    variant          markup of the widget: classic, textarea or contenteditable
+    widget_delay_ms  delay before the widget iframe is inserted into the page
+    latency_ms       delay before the first token of a reply
+    stream_ms        delay between streamed tokens
+    reply_words      length of non-refusal replies
+    fail_rate        share of replies answered with HTTP 500 (nothing is shown)
+    hang_rate        share of replies that never arrive
+    throttle_rate    share of replies replaced by a rate-limit message
+    seed             seed for the failure draws
+
+Run it on its own from the backend directory:
+
+    python -m benchmarks.mock_chat_server [--port 8801]
+
+and point a run at e.g. http://127.0.0.1:8801/?variant=textarea&latency_ms=500
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, Literal
+from urllib.parse import urlencode
+
+import uvicorn
+from fastapi import FastAPI, Request, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+
+class MockSettings(BaseModel):
+    variant: Literal["classic", "textarea", "contenteditable"] = "classic"
+    widget_delay_ms: int = Field(default=0, ge=0)
+    latency_ms: int = Field(default=300, ge=0)
+    stream_ms: int = Field(default=20, ge=0)
+    reply_words: int = Field(default=40, ge=1)
+    fail_rate: float = Field(default=0, ge=0, le=1)
+    hang_rate: float = Field(default=0, ge=0, le=1)
+    throttle_rate: float = Field(default=0, ge=0, le=1)
+    seed: int = 0
+
+
+# Input, send control and reply markup of each widget variant
+VARIANTS: Dict[str, Dict[str, str]] = {
+    "classic": {
+        "input": '<input type="text" id="chat-input" placeholder="Type your message">',
+        "send": '<button type="submit">Send</button>',
+        "reply_class": "bot-message",
+        "reply_attrs": "",
+    },
+    "textarea": {
+        "input": '<textarea placeholder="Message the assistant" rows="2"></textarea>',
+        "send": '<button type="button" aria-label="Send message">&#10148;</button>',
+        "reply_class": "assistant-message",
+        "reply_attrs": "",
+    },
+    "contenteditable": {
+        # No send button: the prompt is submitted with Enter
+        "input": '<div contenteditable="true" role="textbox" class="composer"></div>',
+        "send": "",
+        "reply_class": "bubble",
+        "reply_attrs": 'data-role="assistant"',
+    },
+}
+
+REFUSAL_TRIGGERS = ("ignore", "system prompt", "password", "developer mode", "jailbreak")
+
+FILLER = (
+    "the assistant can help with account questions, order tracking, returns and general "
+    "product information and will do its best to answer clearly and briefly"
+).split()
+
+HOST_PAGE = """<!doctype html>
+<html><head><title>Mock shop</title></head>
+<body>
+<h1>Mock shop</h1>
+<p>A stand-in page with an embedded chat widget.</p>
+<script>
+setTimeout(() => {
+    const frame = document.createElement('iframe');
+    frame.src = '/chat-widget?__QUERY__';
+    frame.title = 'Chat assistant';
+    frame.style.cssText = 'position:fixed;right:16px;bottom:16px;width:360px;height:480px;border:1px solid #ccc';
+    document.body.appendChild(frame);
+}, __WIDGET_DELAY__);
+</script>
+</body></html>
+"""
+
+WIDGET_PAGE = """<!doctype html>
+<html><head><title>Chat</title>
+<style>
+body { font-family: sans-serif; margin: 0; display: flex; flex-direction: column; height: 100vh; }
+#messages { flex: 1; overflow-y: auto; padding: 8px; }
+#messages > div { margin: 4px 0; padding: 6px 8px; border-radius: 6px; }
+.user-bubble { background: #def; text-align: right; }
+form { display: flex; border-top: 1px solid #ccc; }
+form > :first-child { flex: 1; min-height: 24px; }
+</style></head>
+<body>
+<div id="messages"><div class="__REPLY_CLASS__" __REPLY_ATTRS__>Hi! How can I help you today?</div></div>
+<form id="composer">__INPUT__ __SEND__</form>
+<script>
+const messages = document.getElementById('messages');
+const form = document.getElementById('composer');
+const input = form.firstElementChild;
+const readInput = () => (input.value !== undefined ? input.value : input.innerText).trim();
+const clearInput = () => { if (input.value !== undefined) input.value = ''; else input.innerText = ''; };
+
+async function send() {
+    const text = readInput();
+    if (!text) return;
+    clearInput();
+    const mine = document.createElement('div');
+    mine.className = 'user-bubble';
+    mine.innerText = text;
+    messages.appendChild(mine);
+
+    let reply = null;
+    const response = await fetch('/api/chat?__QUERY__', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({message: text}),
+    });
+    if (!response.ok) return;
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        let end;
+        while ((end = buffer.indexOf('\\n\\n')) >= 0) {
+            const event = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            if (!event.startsWith('data: ')) continue;
+            const data = event.slice(6);
+            if (data === '[DONE]') return;
+            if (!reply) {
+                reply = document.createElement('div');
+                reply.className = '__REPLY_CLASS__';
+                __SET_REPLY_ATTRS__
+                messages.appendChild(reply);
+            }
+            reply.innerText += JSON.parse(data).delta;
+            messages.scrollTop = messages.scrollHeight;
+        }
+    }
+}
+
+form.addEventListener('submit', (event) => { event.preventDefault(); send(); });
+const button = form.querySelector('button');
+if (button && button.type === 'button') button.addEventListener('click', send);
+input.addEventListener('keydown', (event) => {
+    if (event.key === 'Enter' && !event.shiftKey) { event.preventDefault(); send(); }
+});
+</script>
+</body></html>
+"""
+
+app = FastAPI(title="RedPrompt mock chat widget")
+
+# Replies served and failures injected since the server started
+counters = {"requests": 0, "replies": 0, "failed": 0, "hung": 0, "throttled": 0}
+_draws: Dict[int, random.Random] = {}
+
+
+def _query(settings: MockSettings) -> str:
+    return urlencode(settings.dict())
+
+
+def _draw(settings: MockSettings) -> float:
+    rng = _draws.setdefault(settings.seed, random.Random(settings.seed))
+    return rng.random()
+
+
+def reply_for(prompt: str, settings: MockSettings) -> str:
+    """Deterministic reply: a refusal for obvious attacks, otherwise a compliant answer."""
+    lowered = prompt.lower()
+    if any(trigger in lowered for trigger in REFUSAL_TRIGGERS):
+        return "I'm sorry, I cannot help with that request."
+    rng = random.Random(prompt)
+    words = [rng.choice(FILLER) for _ in range(settings.reply_words)]
+    return "Sure, here is what I found: " + " ".join(words) + "."
+
+
+@app.get("/", response_class=HTMLResponse)
+async def host_page(settings: MockSettings = Depends()):
+    return HOST_PAGE.replace("__QUERY__", _query(settings)).replace("__WIDGET_DELAY__", str(settings.widget_delay_ms))
+
+
+@app.get("/chat-widget", response_class=HTMLResponse)
+async def widget_page(settings: MockSettings = Depends()):
+    variant = VARIANTS[settings.variant]
+    set_attrs = ""
+    if variant["reply_attrs"]:
+        name, value = variant["reply_attrs"].split("=", 1)
+        set_attrs = f"reply.setAttribute('{name}', {value});"
+    return (
+        WIDGET_PAGE
+        .replace("__INPUT__", variant["input"])
+        .replace("__SEND__", variant["send"])
+        .replace("__REPLY_CLASS__", variant["reply_class"])
+        .replace("__REPLY_ATTRS__", variant["reply_attrs"])
+        .replace("__SET_REPLY_ATTRS__", set_attrs)
+        .replace("__QUERY__", _query(settings))
+    )
+
+
+@app.post("/api/chat")
+async def chat(request: Request, settings: MockSettings = Depends()):
+    """Stream a reply as server-sent events, one token per event."""
+    counters["requests"] += 1
+    prompt = (await request.json()).get("message", "")
+    draw = _draw(settings)
+    if draw < settings.fail_rate:
+        counters["failed"] += 1
+        return JSONResponse({"error": "internal error"}, status_code=500)
+    draw -= settings.fail_rate
+    if draw < settings.hang_rate:
+        counters["hung"] += 1
+        # Never answer; the client gives up on its own
+        await asyncio.sleep(3600)
+    draw -= settings.hang_rate
+    if draw < settings.throttle_rate:
+        counters["throttled"] += 1
+        reply = "Too many requests. Please slow down and try again later."
+    else:
+        counters["replies"] += 1
+        reply = reply_for(prompt, settings)
+
+    async def events():
+        await asyncio.sleep(settings.latency_ms / 1000)
+        tokens = reply.split(" ")
+        for position, token in enumerate(tokens):
+            if position:
+                await asyncio.sleep(settings.stream_ms / 1000)
+            delta = token if position == len(tokens) - 1 else token + " "
+            yield f"data: {json.dumps({'delta': delta})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/api/stats")
+async def stats():
+    return counters
+
+
+class MockChatServer:
+    """Runs the mock site in a background thread, e.g. for benchmarks."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8801):
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def url(self, **settings) -> str:
+        """Host page URL with the given ``MockSettings`` overrides."""
+        query = urlencode(settings)
+        return f"http://{self.host}:{self.port}/" + (f"?{query}" if query else "")
+
+    def start(self, timeout: float = 10):
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Mock chat server did not start on port {self.port}")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock chat widget site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8801)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,48 @@ if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 from datetime import datetime
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+import hmac
 import json
 import os
+import re
+import time
 import uuid
+import logging
 
-from models import PromptData, TestRunRequest, TestRunResponse, TestResult
-from utils.file_parser import parse_prompts_file
-from utils.test_runner import run_prompt_tests
+from models import (
+    PromptData, TestRunRequest, TestRunResponse, TestResult,
+    WorkLeaseRequest, WorkCompleteRequest, WorkFailRequest, WorkResultReport
+)
+from utils.file_parser import iter_prompt_batches
+from utils.test_runner import run_prompt_tests, prompt_test_options
+from utils.selector_cache import SelectorCache
+from utils.rate_limiter import rate_limiter_snapshots
+from utils.run_log import RunLog, RESUMABLE_STATUSES, load_run_log, find_interrupted_runs
+from utils.scheduler import JobScheduler, JOB_STATUSES
+from utils.work_queue import WorkQueue, HTTPWorkQueue, open_work_queue, WORKER_TOKEN_ENV
+from utils.remote_execution import run_prompt_tests_remote, EXECUTION_MODE_ENV
+from utils.browser_pool import BrowserPool
+from utils.network_policy import StaticAssetCache
+from utils.screenshots import ScreenshotStore
+from utils.direct_protocol import ProtocolStore
+from utils.timing import TimingSummary
+from utils.prompt_store import PromptStore
+from utils.run_storage import (
+    RUN_FILE_SUFFIX, LEGACY_RUN_FILE_SUFFIX, run_file_path, write_run_file, read_run_header, dumps_bytes
+)
+from utils.run_documents import RunDocumentCache, etag_matches
+from utils import metrics
+from utils.run_events import run_events
+from utils.results_index import ResultsIndex
+from utils.stats import StatsStore, run_scope, target_scope
+from utils.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="RedPrompt Backend",
@@ -37,12 +67,126 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count every request and time it, labelled by route template rather than raw path."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=path, status=str(status))
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
+
 # Ensure results directory exists
 os.makedirs("results", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)
 
-# In-memory storage for current prompts
-current_prompts: List[PromptData] = []
+# Uploaded prompt sets; runs reference a set by ID instead of copying its prompts
+prompt_store = PromptStore()
+
+# Finished runs as ready-to-send JSON, revalidated by ETag
+run_documents = RunDocumentCache(prompt_store)
+
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Number of parsed prompts echoed back by /upload-prompts
+UPLOAD_PREVIEW_SIZE = 100
+
+# Upload/parse progress by upload ID, for the most recent uploads
+UPLOAD_PROGRESS_HISTORY = 100
+UPLOAD_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+upload_progress: Dict[str, Dict[str, Any]] = {}
+
+# Selectors that resolved each target's chat widget, shared by all runs
+selector_cache = SelectorCache()
+
+# Index of run metadata and per-result status/tags, maintained on write
+results_index = ResultsIndex()
+
+# Aggregate statistics, updated incrementally as each result lands
+stats_store = StatsStore(results_index.conn, results_index.lock)
+
+# Results and statistics of running runs are written to the index in batches, one batch at a time
+index_flush_lock = asyncio.Lock()
+
+# Completed results by (target origin, prompt content hash), for incremental reruns
+response_cache = ResponseCache()
+
+# "local" runs browsers in this process; "remote" leaves them to worker.py processes
+EXECUTION_MODE = os.environ.get(EXECUTION_MODE_ENV, "local")
+work_queue = open_work_queue() if EXECUTION_MODE == "remote" else None
+if isinstance(work_queue, HTTPWorkQueue):
+    raise RuntimeError("The API keeps the work queue itself; point REDPROMPT_WORK_QUEUE at a local queue")
+
+# Workers on other hosts lease through /work-queue and must present this token, if set
+WORKER_TOKEN = os.environ.get(WORKER_TOKEN_ENV)
+
+# Recorded chat exchanges by target origin, replayed by runs with execution="direct"
+protocol_store = ProtocolStore()
+
+# Static assets of target pages, served from disk by the network policy
+asset_cache = StaticAssetCache()
+
+# Compact, deduplicated failure screenshots with a disk budget per run
+screenshot_store = ScreenshotStore(
+    image_format=os.environ.get("REDPROMPT_SCREENSHOT_FORMAT", "jpeg"),
+    max_bytes_per_run=int(os.environ.get("REDPROMPT_SCREENSHOT_BUDGET_MB", "50")) * 1024 * 1024
+)
+
+# Warm Chromium instances shared by local runs instead of one launch per run
+browser_pool = BrowserPool(
+    size=int(os.environ.get("REDPROMPT_BROWSER_POOL_SIZE", "2")),
+    max_contexts_per_browser=int(os.environ.get("REDPROMPT_BROWSER_MAX_CONTEXTS", "500")),
+    max_rss_mb=float(os.environ.get("REDPROMPT_BROWSER_MAX_RSS_MB", "4096"))
+)
+
+
+@app.on_event("startup")
+async def index_existing_results():
+    """Index run files written before the index existed or changed on disk."""
+    results_index.sync_directory("results")
+    stats_store.rebuild_if_stale()
+    mark_interrupted_runs()
+    track_queued_runs()
+    job_scheduler.start()
+    if EXECUTION_MODE == "local":
+        try:
+            await browser_pool.start()
+        except Exception as e:
+            # Runs retry the launch when they first borrow a browser
+            logger.warning(f"Could not start the browser pool: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Interrupt running jobs (they stay resumable, queued jobs stay queued) and close the browsers."""
+    await job_scheduler.stop()
+    await flush_index_writes()
+    selector_cache.save()
+    await browser_pool.stop()
+
+
+def mark_interrupted_runs():
+    """Flag runs left "running" by a previous process as interrupted and resumable."""
+    for run_log in find_interrupted_runs():
+        manifest = run_log.update_manifest(status="interrupted")
+        save_run_file(run_log, partial_run_data(
+            run_log, manifest, "interrupted", error="Run interrupted by a server restart"
+        ))
+
+
+def track_queued_runs():
+    """Make runs still queued from a previous process followable before they start."""
+    for job in job_scheduler.list("queued", limit=10000):
+        manifest = RunLog(job["test_run_id"]).read_manifest() or {}
+        run_events.queue(job["test_run_id"], manifest.get("total_prompts"))
 
 
 @app.get("/")
@@ -51,138 +195,814 @@ async def root():
 
 
 @app.post("/upload-prompts")
-async def upload_prompts(file: UploadFile = File(...)):
-    """Upload and parse a JSON or CSV file containing adversarial prompts."""
+async def upload_prompts(
+    file: UploadFile = File(...),
+    upload_id: Optional[str] = None,
+    name: Optional[str] = None
+):
+    """Upload and parse a JSON, JSONL or CSV file containing adversarial prompts.
+
+    The upload is streamed to disk, parsed incrementally in tagged batches and
+    stored as a new prompt set (named ``name``, or after the file). Pass
+    ``upload_id`` (letters, digits, ``-`` and ``_``) to follow parsing via
+    /upload-prompts/{upload_id}/progress. The response is a summary with only
+    a preview of the parsed prompts.
+    """
+    if upload_id is not None and not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+        raise HTTPException(status_code=400, detail="Invalid upload_id")
+    upload_id = upload_id or str(uuid.uuid4())
+    file_path = None
+    prompt_set_id = None
     try:
         # Validate file type
-        if not file.filename.endswith(('.json', '.csv')):
+        extension = os.path.splitext(file.filename or "")[1]
+        if extension not in ('.json', '.jsonl', '.csv'):
             raise HTTPException(
                 status_code=400, 
-                detail="File must be JSON or CSV format"
+                detail="File must be JSON, JSONL or CSV format"
             )
         
-        # Save uploaded file
-        file_path = f"uploads/{uuid.uuid4()}_{file.filename}"
+        # Only remember the most recent uploads
+        while len(upload_progress) >= UPLOAD_PROGRESS_HISTORY:
+            upload_progress.pop(next(iter(upload_progress)))
+        progress = upload_progress[upload_id] = {
+            "upload_id": upload_id,
+            "filename": file.filename,
+            "status": "uploading",
+            "bytes_received": 0,
+            "bytes_parsed": 0,
+            "total_bytes": None,
+            "prompts_parsed": 0
+        }
+        
+        # Save uploaded file chunk by chunk, under a name of our own
+        file_path = os.path.join("uploads", f"{uuid.uuid4().hex}{extension}")
         with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                buffer.write(chunk)
+                progress["bytes_received"] += len(chunk)
         
-        # Parse prompts from file
-        global current_prompts
-        current_prompts = await parse_prompts_file(file_path)
+        progress["status"] = "parsing"
+        progress["total_bytes"] = progress["bytes_received"]
         
-        # Clean up uploaded file
-        os.remove(file_path)
+        def on_progress(prompts_parsed: int, bytes_parsed: int, total_bytes: int):
+            progress["prompts_parsed"] = prompts_parsed
+            progress["bytes_parsed"] = bytes_parsed
+        
+        # Parse prompts from file in batches and store each one, off the event loop
+        prompt_set_id = await asyncio.to_thread(prompt_store.create_set, name, source_filename=file.filename)
+        preview: List[PromptData] = []
+        batches = iter_prompt_batches(file_path, progress=on_progress)
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            await asyncio.to_thread(prompt_store.add_prompts, prompt_set_id, batch)
+            preview.extend(batch[:UPLOAD_PREVIEW_SIZE - len(preview)])
+        
+        prompt_set = await asyncio.to_thread(prompt_store.finish_set, prompt_set_id)
+        progress["status"] = "completed"
+        progress["prompt_set_id"] = prompt_set_id
         
         return {
-            "message": f"Successfully uploaded {len(current_prompts)} prompts",
-            "prompts_count": len(current_prompts),
-            "prompts": current_prompts
+            "message": f"Successfully uploaded {prompt_set['prompt_count']} prompts",
+            "upload_id": upload_id,
+            "prompt_set_id": prompt_set_id,
+            "prompts_count": prompt_set["prompt_count"],
+            "tag_counts": prompt_set["tag_counts"],
+            "prompts": preview,
+            "preview_truncated": prompt_set["prompt_count"] > len(preview)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
+        if prompt_set_id is not None:
+            await asyncio.to_thread(prompt_store.delete_set, prompt_set_id)
+        if upload_id in upload_progress:
+            upload_progress[upload_id]["status"] = "error"
+            upload_progress[upload_id]["error"] = str(e)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    finally:
+        # Clean up uploaded file
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+
+@app.get("/upload-prompts/{upload_id}/progress")
+async def get_upload_progress(upload_id: str):
+    """Get upload and parsing progress for an upload."""
+    progress = upload_progress.get(upload_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return progress
 
 
 @app.post("/run-tests", response_model=TestRunResponse)
-async def run_tests(request: TestRunRequest, background_tasks: BackgroundTasks):
-    """Execute stored prompts against the target URL using Playwright."""
+async def run_tests(request: TestRunRequest):
+    """Queue the stored prompts for execution against the target URL.
+
+    The run is checkpointed to disk and handed to the job scheduler, which
+    starts it once a browser slot for its target is free.
+    """
     try:
-        if not current_prompts:
+        if request.prompt_set_id:
+            prompt_set = await asyncio.to_thread(prompt_store.get_set, request.prompt_set_id)
+            if prompt_set is None:
+                raise HTTPException(status_code=404, detail="Prompt set not found")
+        else:
+            prompt_set = await asyncio.to_thread(prompt_store.latest_set)
+        if not prompt_set or not prompt_set["prompt_count"]:
             raise HTTPException(
                 status_code=400, 
                 detail="No prompts uploaded. Please upload prompts first."
             )
+        # Pin the set, so resuming the run later uses the same prompts
+        request.prompt_set_id = prompt_set["prompt_set_id"]
         
         # Generate unique test run ID
         test_run_id = str(uuid.uuid4())
         
-        # Start test execution in background
-        background_tasks.add_task(
-            execute_tests_background,
-            test_run_id,
-            request.target_url,
-            current_prompts.copy()
-        )
+        create_run(test_run_id, request, prompt_set["prompt_count"])
+        run_events.queue(test_run_id, prompt_set["prompt_count"])
+        job = job_scheduler.submit(test_run_id, request.target_url, priority=request.priority)
         
         return TestRunResponse(
             test_run_id=test_run_id,
-            status="started",
-            message=f"Test execution started for {len(current_prompts)} prompts",
-            prompts_count=len(current_prompts)
+            status="queued",
+            message=f"Test execution queued for {prompt_set['prompt_count']} prompts "
+                    f"(position {job['queue_position'] + 1} in queue)",
+            prompts_count=prompt_set["prompt_count"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error starting tests: {str(e)}")
 
 
 @app.get("/results")
-async def get_results():
-    """Get all previous test run results."""
+async def get_results(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    target_url: Optional[str] = None,
+    status: Optional[str] = None,
+    tag: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    fields: Optional[str] = None,
+    result_status: Optional[str] = None
+):
+    """Get previous test runs, newest first.
+
+    Only run metadata is returned; use /results/{test_run_id} for the full run.
+    Supports cursor pagination, filtering by target URL, run status (``status``),
+    the status or tag of any of the run's results (``result_status``, ``tag``)
+    and ISO timestamp range, and a comma-separated ``fields`` projection.
+    Responses carry an ETag; revalidating while no run changed returns 304.
+    """
+    etag = results_index.etag()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
     try:
-        results = []
-        
-        # Read all result files from results directory
-        for filename in os.listdir("results"):
-            if filename.endswith(".json"):
-                with open(f"results/{filename}", "r") as f:
-                    result_data = json.load(f)
-                    results.append(result_data)
-        
-        # Sort by timestamp (newest first)
-        results.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        
-        return {
-            "results": results,
-            "total_runs": len(results)
-        }
+        page = await asyncio.to_thread(
+            results_index.list_runs,
+            cursor=cursor,
+            limit=limit,
+            target_url=target_url,
+            status=status,
+            tag=tag,
+            since=since,
+            until=until,
+            fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+            result_status=result_status
+        )
+        return Response(content=dumps_bytes(page), media_type="application/json", headers=headers)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving results: {str(e)}")
 
 
 @app.get("/results/{test_run_id}")
-async def get_test_result(test_run_id: str):
-    """Get specific test run result by ID."""
+async def get_test_result(test_run_id: str, request: Request):
+    """Get specific test run result by ID.
+
+    The run is serialized off the event loop and kept in memory, and large
+    runs are streamed. Responses carry ETag and Last-Modified; revalidating
+    an unchanged run returns 304 without reading it again.
+    """
     try:
-        result_file = f"results/{test_run_id}.json"
-        
-        if not os.path.exists(result_file):
-            raise HTTPException(status_code=404, detail="Test run not found")
-        
-        with open(result_file, "r") as f:
-            result_data = json.load(f)
+        # A second attempt covers a file rewritten since it was looked up, e.g. by a migration
+        for _ in range(2):
+            run_file = run_documents.run_file(test_run_id)
+            if run_file is None:
+                break
+            if run_file.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+                return Response(status_code=304, headers=run_file.headers())
+            if run_documents.streamable(run_file):
+                return StreamingResponse(
+                    run_documents.stream(run_file), media_type="application/json", headers=run_file.headers()
+                )
+            try:
+                body = await run_documents.body(test_run_id, run_file)
+            except FileNotFoundError:
+                run_documents.invalidate(test_run_id)
+                continue
+            return Response(content=body, media_type="application/json", headers=run_file.headers())
         
-        return result_data
-        
-    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Test run not found")
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving result: {str(e)}")
 
 
+@app.get("/prompt-sets")
+async def list_prompt_sets(cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """List uploaded prompt sets, newest first, with their prompt and tag counts."""
+    try:
+        return await asyncio.to_thread(prompt_store.list_sets, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/prompt-sets/{prompt_set_id}")
+async def get_prompt_set(prompt_set_id: str):
+    """Get a prompt set's metadata."""
+    prompt_set = await asyncio.to_thread(prompt_store.get_set, prompt_set_id)
+    if prompt_set is None:
+        raise HTTPException(status_code=404, detail="Prompt set not found")
+    return prompt_set
+
+
+@app.get("/prompt-sets/{prompt_set_id}/prompts")
+async def get_prompt_set_prompts(
+    prompt_set_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    tag: Optional[str] = None
+):
+    """Get one page of a prompt set's prompts in upload order, optionally only those with ``tag``."""
+    try:
+        page = await asyncio.to_thread(prompt_store.list_prompts, prompt_set_id, cursor=cursor, limit=limit, tag=tag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Prompt set not found")
+    return page
+
+
+@app.delete("/prompt-sets/{prompt_set_id}")
+async def delete_prompt_set(prompt_set_id: str):
+    """Delete a prompt set, unless a queued or running run still uses it."""
+    if await asyncio.to_thread(prompt_store.get_set, prompt_set_id) is None:
+        raise HTTPException(status_code=404, detail="Prompt set not found")
+    if await asyncio.to_thread(prompt_set_in_use, prompt_set_id):
+        raise HTTPException(status_code=409, detail="Prompt set is used by a queued or running test run")
+    await asyncio.to_thread(prompt_store.delete_set, prompt_set_id)
+    return {"message": "Prompt set deleted successfully"}
+
+
+def prompt_set_in_use(prompt_set_id: str) -> bool:
+    for status in ("running", "queued"):
+        for job in job_scheduler.list(status, limit=1000):
+            manifest = RunLog(job["test_run_id"]).read_manifest() or {}
+            if (manifest.get("request") or {}).get("prompt_set_id") == prompt_set_id:
+                return True
+    return False
+
+
 @app.get("/current-prompts")
-async def get_current_prompts():
-    """Get currently loaded prompts."""
-    return {
-        "prompts": current_prompts,
-        "count": len(current_prompts)
-    }
+async def get_current_prompts(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    tag: Optional[str] = None
+):
+    """Get one page of the most recently uploaded prompt set."""
+    prompt_set = await asyncio.to_thread(prompt_store.latest_set)
+    if prompt_set is None:
+        return {"prompt_set_id": None, "prompts": [], "count": 0, "next_cursor": None}
+    return await get_prompt_set_prompts(prompt_set["prompt_set_id"], cursor=cursor, limit=limit, tag=tag)
 
 
 @app.delete("/current-prompts")
 async def clear_current_prompts():
-    """Clear currently loaded prompts."""
-    global current_prompts
-    current_prompts = []
+    """Delete the most recently uploaded prompt set."""
+    prompt_set = await asyncio.to_thread(prompt_store.latest_set)
+    if prompt_set is not None:
+        await delete_prompt_set(prompt_set["prompt_set_id"])
     return {"message": "Prompts cleared successfully"}
 
 
-async def execute_tests_background(test_run_id: str, target_url: str, prompts: List[PromptData]):
-    """Background task to execute prompt tests."""
+@app.get("/stats")
+async def get_stats(target_url: Optional[str] = None, test_run_id: Optional[str] = None):
+    """Get aggregate statistics globally, for one target, or for one run."""
+    if test_run_id:
+        scope = run_scope(test_run_id)
+    elif target_url:
+        scope = target_scope(target_url)
+    else:
+        scope = "global"
+    
+    summary = await asyncio.to_thread(stats_store.summary, scope)
+    if summary is None:
+        if scope != "global":
+            raise HTTPException(status_code=404, detail="No statistics for this scope")
+        summary = {"total": 0}
+    
+    return {"scope": scope, **summary}
+
+
+@app.get("/stats/targets")
+async def get_target_stats():
+    """Get aggregate statistics for every target."""
+    return {"targets": await asyncio.to_thread(stats_store.targets)}
+
+
+@app.get("/runs/{test_run_id}/progress")
+async def get_run_progress(test_run_id: str):
+    """Get live progress counters for a test run, or the final counts of a finished one."""
+    progress = run_events.progress(test_run_id)
+    if progress is None:
+        path = run_file_path(test_run_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Test run not found")
+        # No longer tracked live; the counts are in the run's result file
+        header = await asyncio.to_thread(read_run_header, path)
+        progress = {
+            "test_run_id": test_run_id,
+            "status": header.get("status"),
+            "total_prompts": header.get("total_prompts"),
+            "successful_tests": header.get("successful_tests"),
+            "failed_tests": header.get("failed_tests"),
+        }
+    return progress
+
+
+@app.post("/runs/{test_run_id}/resume", response_model=TestRunResponse)
+async def resume_run(test_run_id: str, retry_failed: bool = False):
+    """Re-queue an interrupted, cancelled or failed run from its first unfinished prompt.
+
+    Results already logged for the run are kept. With ``retry_failed``,
+    prompts that failed or timed out are run again as well, which also
+    allows re-running the failures of a completed run.
+    """
+    run_log = load_run_log(test_run_id)
+    manifest = run_log.read_manifest() if run_log is not None else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="No checkpoint found for this test run")
+    
+    resumable = RESUMABLE_STATUSES + (("completed",) if retry_failed else ())
+    if manifest.get("status") not in resumable:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Test run is {manifest.get('status')} and cannot be resumed"
+        )
+    prompt_set_id = (manifest.get("request") or {}).get("prompt_set_id")
+    if prompt_set_id and await asyncio.to_thread(prompt_store.get_set, prompt_set_id) is None:
+        raise HTTPException(status_code=409, detail="The test run's prompt set has been deleted")
+
+    try:
+        total = manifest["total_prompts"]
+        remaining = total - len([
+            status for status in run_log.iter_statuses()
+            if status == "completed" or not retry_failed
+        ])
+        # Claim the run before returning so a second resume is rejected
+        run_log.update_manifest(status="queued")
+        results_index.upsert_run({**index_entry(test_run_id, manifest), "status": "queued"})
+        run_events.queue(test_run_id, total)
+        job_scheduler.submit(
+            test_run_id,
+            manifest["target_url"],
+            priority=manifest["request"].get("priority") or 0,
+            options={"retry_failed": retry_failed}
+        )
+        
+        return TestRunResponse(
+            test_run_id=test_run_id,
+            status="queued",
+            message=f"Test execution re-queued with {remaining} of {total} prompts remaining",
+            prompts_count=remaining
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error resuming tests: {str(e)}")
+
+
+@app.get("/runs")
+async def list_runs(status: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    """List scheduled runs, running and queued ones first in the order they will run."""
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    return {"runs": job_scheduler.list(status, limit), **job_scheduler.utilization()}
+
+
+@app.get("/runs/{test_run_id}")
+async def get_run(test_run_id: str):
+    """Get a run's scheduling state and, while it runs, its live progress."""
+    job = job_scheduler.get(test_run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return {**job, "progress": run_events.progress(test_run_id)}
+
+
+@app.post("/runs/{test_run_id}/cancel")
+async def cancel_run(test_run_id: str):
+    """Cancel a queued or running run; completed results are kept and it can be resumed."""
+    job = job_scheduler.get(test_run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    if job["status"] not in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Test run is already {job['status']}")
+    
+    was_queued = job["status"] == "queued"
+    job = job_scheduler.cancel(test_run_id)
+    if was_queued:
+        run_log = RunLog(test_run_id)
+        manifest = run_log.update_manifest(status="cancelled")
+        save_run_file(run_log, {
+            **index_entry(test_run_id, manifest),
+            "timestamp": datetime.now().isoformat(),
+            "status": "cancelled",
+            "resumable": True
+        })
+        run_events.finish(test_run_id, "cancelled")
+    return {"message": "Test run cancelled", "run": job}
+
+
+@app.get("/runs/{test_run_id}/stream")
+async def stream_run(test_run_id: str):
+    """Stream per-prompt results and progress for a test run as Server-Sent Events."""
+    if run_events.progress(test_run_id) is None and run_file_path(test_run_id) is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+
+    async def event_stream():
+        if run_events.progress(test_run_id) is None:
+            # Finished before this process started; there is nothing live to send
+            yield f"event: done\ndata: {json.dumps({'test_run_id': test_run_id, 'status': 'finished'})}\n\n"
+            return
+        async for event in run_events.subscribe(test_run_id):
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/response-cache")
+async def get_response_cache():
+    """Get response cache size and hit/miss counters."""
+    return await asyncio.to_thread(response_cache.stats)
+
+
+@app.delete("/response-cache")
+async def clear_response_cache(origin: Optional[str] = None):
+    """Forget cached responses for one origin, or all origins."""
+    await asyncio.to_thread(response_cache.clear, origin)
+    return {"message": "Response cache cleared successfully"}
+
+
+@app.get("/selector-cache")
+async def get_selector_cache():
+    """Get selector cache contents and hit/miss counters."""
+    return selector_cache.stats()
+
+
+@app.delete("/selector-cache")
+async def clear_selector_cache(origin: Optional[str] = None):
+    """Forget cached selectors for one origin, or all origins."""
+    selector_cache.clear(origin)
+    return {"message": "Selector cache cleared successfully"}
+
+
+@app.get("/protocol-templates")
+async def get_protocol_templates():
+    """Get the recorded chat exchanges used by direct runs."""
+    return protocol_store.stats()
+
+
+@app.delete("/protocol-templates")
+async def clear_protocol_templates(origin: Optional[str] = None):
+    """Forget recorded chat exchanges for one origin, or all origins, so they are recorded again."""
+    protocol_store.clear(origin)
+    return {"message": "Protocol templates cleared successfully"}
+
+
+@app.get("/screenshots/{test_run_id}/{filename}")
+async def get_screenshot(test_run_id: str, filename: str):
+    """Serve a failure screenshot of a test run."""
+    path = screenshot_store.file_path(test_run_id, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    return FileResponse(path)
+
+
+@app.get("/asset-cache")
+async def get_asset_cache():
+    """Get the number and size of cached static assets."""
+    return asset_cache.stats()
+
+
+@app.delete("/asset-cache")
+async def clear_asset_cache():
+    """Forget all cached static assets."""
+    await asyncio.to_thread(asset_cache.clear)
+    return {"message": "Asset cache cleared successfully"}
+
+
+@app.get("/browser-pool")
+async def get_browser_pool():
+    """Get browser pool utilization, recycling counters and memory use."""
+    await browser_pool.sample_rss()
+    return browser_pool.snapshot()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """API and runner metrics in the Prometheus text exposition format."""
+    await browser_pool.sample_rss()
+    return Response(content=metrics.registry.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+def collect_run_metrics():
+    utilization = job_scheduler.utilization()
+    metrics.RUNS.set(utilization["running"], state="running")
+    metrics.RUNS.set(utilization["queued"], state="queued")
+    if work_queue is not None:
+        for state, count in work_queue.depth().items():
+            metrics.WORK_QUEUE_BATCHES.set(count, state=state)
+
+
+async def remote_work_queue(authorization: Optional[str] = Header(None)) -> WorkQueue:
+    """The work queue, for a worker leasing from it over HTTP (see ``HTTPWorkQueue``)."""
+    if work_queue is None:
+        raise HTTPException(status_code=404, detail="Remote execution is not enabled")
+    if WORKER_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {WORKER_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid worker token")
+    return work_queue
+
+
+@app.post("/work-queue/lease")
+async def lease_work(request: WorkLeaseRequest, queue: WorkQueue = Depends(remote_work_queue)):
+    """Lease the next batch of prompts to a worker; ``batch`` is null when there is nothing to do."""
+    batch = await asyncio.to_thread(queue.lease, request.worker_id, request.lease_seconds)
+    return {"batch": batch}
+
+
+@app.post("/work-queue/batches/{batch_id}/renew")
+async def renew_work(batch_id: int, request: WorkLeaseRequest, queue: WorkQueue = Depends(remote_work_queue)):
+    """Extend a worker's lease; ``renewed`` is false once the batch was taken away."""
+    renewed = await asyncio.to_thread(queue.renew, batch_id, request.worker_id, request.lease_seconds)
+    return {"renewed": renewed}
+
+
+@app.post("/work-queue/batches/{batch_id}/complete")
+async def complete_work(batch_id: int, request: WorkCompleteRequest, queue: WorkQueue = Depends(remote_work_queue)):
+    await asyncio.to_thread(queue.complete, batch_id, request.worker_id)
+    return {"message": "Batch completed"}
+
+
+@app.post("/work-queue/batches/{batch_id}/fail")
+async def fail_work(batch_id: int, request: WorkFailRequest, queue: WorkQueue = Depends(remote_work_queue)):
+    """Give a batch back after an error; it is redelivered until its attempts run out."""
+    await asyncio.to_thread(queue.fail, batch_id, request.worker_id, request.error)
+    return {"message": "Batch returned"}
+
+
+@app.post("/work-queue/runs/{test_run_id}/results")
+async def report_work(test_run_id: str, report: WorkResultReport, queue: WorkQueue = Depends(remote_work_queue)):
+    """Record one prompt's result; only the first result reported for a prompt is kept."""
+    await asyncio.to_thread(queue.report, test_run_id, report.index, report.result)
+    return {"message": "Result recorded"}
+
+
+@app.get("/rate-limits")
+async def get_rate_limits():
+    """Get the current adaptive pacing rate for each target."""
+    return {"targets": rate_limiter_snapshots()}
+
+
+async def flush_index_writes():
+    """Write results and statistics buffered by running runs to the index, off the event loop."""
+    async with index_flush_lock:
+        pending = results_index.take_pending()
+        stats_rows = stats_store.take_dirty()
+        if pending or stats_rows:
+            await asyncio.to_thread(write_index_batch, pending, stats_rows)
+
+
+def write_index_batch(pending: List[Any], stats_rows: List[Any]):
+    # Results and the statistics folded from them are committed together
+    with results_index.lock:
+        results_index.write_results(pending, commit=False)
+        stats_store.write(stats_rows)
+
+
+def save_run_file(run_log: RunLog, run_data: Dict[str, Any]):
+    """Write the final run result file and record its metadata in the index."""
+    run_log.sync()
+    result_file = f"results/{run_log.test_run_id}{RUN_FILE_SUFFIX}"
+    write_run_file(result_file, run_data, run_log.iter_records(), prompt_store)
+    run_documents.invalidate(run_log.test_run_id)
+    results_index.upsert_run(run_data, file_mtime=os.path.getmtime(result_file))
+    # A resumed run may still have its result file from before the compact format
+    legacy_file = f"results/{run_log.test_run_id}{LEGACY_RUN_FILE_SUFFIX}"
+    if os.path.exists(legacy_file):
+        os.remove(legacy_file)
+
+
+def index_entry(test_run_id: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Index metadata for a run from its manifest and logged results."""
+    statuses = list(RunLog(test_run_id).iter_statuses())
+    return {
+        "test_run_id": test_run_id,
+        "target_url": manifest.get("target_url"),
+        "timestamp": manifest.get("created_at"),
+        "total_prompts": manifest.get("total_prompts"),
+        "successful_tests": statuses.count("completed"),
+        "failed_tests": len(statuses) - statuses.count("completed")
+    }
+
+
+def partial_run_data(run_log: RunLog, manifest: Dict[str, Any], status: str, **fields: Any) -> Dict[str, Any]:
+    """Header for a run that stopped early; its logged results are kept and it can be resumed."""
+    return {
+        **index_entry(run_log.test_run_id, manifest),
+        "timestamp": datetime.now().isoformat(),
+        "status": status,
+        "resumable": True,
+        "attempts": manifest.get("attempts"),
+        **fields
+    }
+
+
+def create_run(test_run_id: str, request: TestRunRequest, total_prompts: int):
+    """Checkpoint a new run's settings, including its prompt set, and list it as queued."""
+    run_log = RunLog(test_run_id)
+    manifest = run_log.update_manifest(
+        target_url=request.target_url,
+        request=request.dict(),
+        total_prompts=total_prompts,
+        status="queued",
+        attempts=0,
+        created_at=datetime.now().isoformat()
+    )
+    results_index.upsert_run({**index_entry(test_run_id, manifest), "status": "queued"})
+
+
+def load_run_prompts(run_log: RunLog, request: TestRunRequest) -> List[PromptData]:
+    """The prompts of a checkpointed run, from its prompt set."""
+    if request.prompt_set_id is None:
+        # Runs checkpointed before prompt sets existed kept their own snapshot
+        return run_log.load_prompts()
+    return prompt_store.load_prompts(request.prompt_set_id)
+
+
+async def run_job(job: Dict[str, Any]) -> str:
+    """Job scheduler entry point: run (or resume) a checkpointed run."""
+    run_log = RunLog(job["test_run_id"])
     try:
-        # Run the tests using Playwright
-        results = await run_prompt_tests(target_url, prompts)
+        request = TestRunRequest(**run_log.read_manifest()["request"])
+        return await execute_tests_background(
+            job["test_run_id"],
+            request,
+            await asyncio.to_thread(load_run_prompts, run_log, request),
+            retry_failed=job["options"].get("retry_failed", False)
+        )
+    except Exception as e:
+        # The run failed before it could record its own outcome; don't leave it listed as queued
+        mark_failed_run(run_log, f"Could not start the run: {e}")
+        raise
+
+
+def mark_failed_run(run_log: RunLog, error: str):
+    """Record a run as failed in its manifest, result file and index, and end its live progress."""
+    try:
+        manifest = run_log.update_manifest(status="error", error=error)
+        save_run_file(run_log, partial_run_data(run_log, manifest, "error", error=error))
+    except Exception as e:
+        logger.error(f"Could not record the failure of run {run_log.test_run_id}: {e}")
+    run_events.finish(run_log.test_run_id, "error", error=error)
+
+
+# Runs wait here for a browser slot; at most this many run at once, one per target
+job_scheduler = JobScheduler(
+    run_job,
+    max_running=int(os.environ.get("REDPROMPT_MAX_CONCURRENT_RUNS", "2")),
+    per_target_limit=int(os.environ.get("REDPROMPT_MAX_RUNS_PER_TARGET", "1"))
+)
+
+# Gauges are refreshed from live state whenever /metrics is scraped
+metrics.registry.on_collect(collect_run_metrics)
+metrics.registry.on_collect(metrics.browser_pool_collector(browser_pool))
+
+
+async def execute_tests_background(
+    test_run_id: str,
+    request: TestRunRequest,
+    prompts: List[PromptData],
+    retry_failed: bool = False
+) -> str:
+    """Execute a checkpointed run's prompt tests and return its final status.
+
+    Every result is logged as it lands, so prompts that already have a
+    logged result from an earlier attempt (or, with ``retry_failed``, a
+    successful one) are skipped.
+    """
+    target_url = request.target_url
+    run_log = RunLog(test_run_id)
+    skip_indices = set()
+    prior_statuses: Dict[str, int] = {}
+    for record in run_log.iter_records():
+        status = record.get("status")
+        if retry_failed and status != "completed":
+            continue
+        skip_indices.add(record["index"])
+        prior_statuses[status] = prior_statuses.get(status, 0) + 1
+    manifest = run_log.update_manifest(
+        status="running",
+        attempts=(run_log.read_manifest() or {}).get("attempts", 0) + 1
+    )
+    
+    if retry_failed:
+        # Retried prompts replace their earlier results; the statistics are rebuilt afterwards
+        await asyncio.to_thread(results_index.bump_generation, test_run_id)
+    run_events.start(test_run_id, len(prompts), prior_statuses)
+    results_index.upsert_run({
+        "test_run_id": test_run_id,
+        "target_url": target_url,
+        "timestamp": manifest["created_at"],
+        "status": "running",
+        "total_prompts": len(prompts),
+        "successful_tests": prior_statuses.get("completed", 0),
+        "failed_tests": len(skip_indices) - prior_statuses.get("completed", 0)
+    })
+
+    network = {"page_loads": 0, "load_time_total": 0.0, "requests_blocked": 0, "bytes_saved": 0}
+    timings = TimingSummary()
+    status = "error"
+
+    async def on_result(index: int, result: TestResult):
+        if result.load_time is not None:
+            network["page_loads"] += 1
+            network["load_time_total"] += result.load_time
+        network["requests_blocked"] += result.requests_blocked or 0
+        network["bytes_saved"] += result.bytes_saved or 0
+        timings.add(result.timings)
+        
+        # Persist each result as it lands, index it and push it to live subscribers
+        record = run_log.append(index, result)
+        if run_log.sync_due():
+            await asyncio.to_thread(run_log.sync)
+        results_index.buffer_result(test_run_id, index, record)
+        stats_store.add(test_run_id, target_url, record)
+        if results_index.flush_due() and not index_flush_lock.locked():
+            await flush_index_writes()
+        run_events.publish_result(test_run_id, record)
+
+    try:
+        if EXECUTION_MODE == "remote":
+            # Hand the prompts to worker processes and collect their results
+            await run_prompt_tests_remote(
+                work_queue,
+                test_run_id,
+                prompts,
+                request.dict(),
+                on_result,
+                skip_indices=skip_indices
+            )
+        else:
+            # Run the tests using Playwright
+            await run_prompt_tests(
+                target_url,
+                prompts,
+                **prompt_test_options(request),
+                selector_cache=selector_cache,
+                response_cache=response_cache,
+                on_result=on_result,
+                skip_indices=skip_indices,
+                browser_pool=browser_pool,
+                asset_cache=asset_cache,
+                screenshot_store=screenshot_store,
+                run_id=test_run_id,
+                protocol_store=protocol_store
+            )
+        
+        progress = run_events.progress(test_run_id)
         
         # Prepare result data
         result_data = {
@@ -191,29 +1011,55 @@ async def execute_tests_background(test_run_id: str, target_url: str, prompts: L
             "timestamp": datetime.now().isoformat(),
             "status": "completed",
             "total_prompts": len(prompts),
-            "successful_tests": len([r for r in results if r.status == "completed"]),
-            "failed_tests": len([r for r in results if r.status == "failed"]),
-            "results": [r.dict() for r in results]
+            "successful_tests": progress["successful_tests"],
+            "failed_tests": progress["failed_tests"],
+            "concurrency": request.concurrency,
+            "cache_mode": request.cache_mode,
+            "execution": request.execution,
+            "attempts": manifest["attempts"],
+            "network": {
+                "policy": request.network.dict(),
+                "page_loads": network["page_loads"],
+                "mean_load_time": network["load_time_total"] / network["page_loads"] if network["page_loads"] else None,
+                "requests_blocked": network["requests_blocked"],
+                "bytes_saved": network["bytes_saved"]
+            },
+            "screenshots": screenshot_store.stats(test_run_id),
+            "timings": timings.snapshot()
         }
         
-        # Save results to file
-        with open(f"results/{test_run_id}.json", "w") as f:
-            json.dump(result_data, f, indent=2)
-            
+        # Save results to file, streaming them from the run log
+        await flush_index_writes()
+        save_run_file(run_log, result_data)
+        status = "completed"
+    
+    except asyncio.CancelledError:
+        # Cancelled via /runs/{id}/cancel, or interrupted by a shutdown
+        status = "interrupted" if job_scheduler.stopping else "cancelled"
+        await flush_index_writes()
+        save_run_file(run_log, partial_run_data(run_log, manifest, status))
+        run_log.update_manifest(status=status)
+        run_events.finish(test_run_id, status)
+        raise
+    
     except Exception as e:
-        # Save error result
-        error_data = {
-            "test_run_id": test_run_id,
-            "target_url": target_url,
-            "timestamp": datetime.now().isoformat(),
-            "status": "error",
-            "error": str(e),
-            "total_prompts": len(prompts),
-            "results": []
-        }
-        
-        with open(f"results/{test_run_id}.json", "w") as f:
-            json.dump(error_data, f, indent=2)
+        # Save error result, keeping whatever completed before the failure
+        await flush_index_writes()
+        save_run_file(run_log, partial_run_data(run_log, manifest, "error", error=str(e)))
+        run_log.update_manifest(status="error", error=str(e))
+        run_events.finish(test_run_id, "error", error=str(e))
+        return "error"
+    
+    finally:
+        metrics.RUNS_FINISHED.inc(status=status)
+        screenshot_store.finish_run(test_run_id)
+        if retry_failed:
+            # Retried prompts were counted once per attempt; rebuild from the index
+            await asyncio.to_thread(stats_store.rebuild_if_stale)
+    
+    run_log.update_manifest(status="completed")
+    run_events.finish(test_run_id, "completed")
+    return status
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional, Union
+from pydantic import BaseModel, Field, HttpUrl, model_validator
+from typing import Any, Dict, List, Optional, Union, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -23,13 +23,51 @@ class PromptData(BaseModel):
     tags: Optional[List[str]] = []
     execution_time: Optional[float] = None
     error_message: Optional[str] = None
+    content_hash: Optional[str] = None  # sha256 of the prompt text
+
+
+class NetworkPolicySettings(BaseModel):
+    enabled: bool = False  # opt in: blocking and caching change what the page loads
+    block_resource_types: List[str] = ["image", "media", "font"]
+    block_hosts: List[str] = []  # in addition to the built-in tracker hosts
+    block_third_party: bool = False  # hosts other than the target's own and its subdomains
+    allow_hosts: List[str] = []  # never blocked, e.g. the widget's own host or a CDN
+    cache_static_assets: bool = True
+    # widget: continue as soon as the chat widget frame has loaded
+    wait_for: Literal["widget", "networkidle"] = "networkidle"
 
 
 class TestRunRequest(BaseModel):
     target_url: str
-    max_timeout: Optional[int] = 30  # seconds
-    screenshot_on_failure: Optional[bool] = True
-    delay_between_prompts: Optional[int] = 2  # seconds
+    max_timeout: int = 30  # seconds
+    screenshot_on_failure: bool = True
+    delay_between_prompts: int = 2  # seconds
+    concurrency: int = Field(default=1, ge=1, le=16)  # parallel browser contexts
+    selector_resolution: Literal["sequential", "race"] = "sequential"
+    capture_mode: Literal["poll", "observer"] = "poll"
+    settle_quiet_ms: int = Field(default=1000, ge=100)  # observer quiet period
+    input_strategy: Literal["fill", "insert_text", "paste", "type"] = "fill"
+    max_typing_seconds: float = Field(default=10, gt=0)  # cap for humanlike typing
+    # adaptive: at most one prompt per delay_between_prompts per worker, slower when the target pushes back
+    pacing: Literal["adaptive", "fixed"] = "adaptive"
+    # off: run every prompt; only_new: reuse any cached response for this target;
+    # reverify: reuse cached responses younger than reverify_after_days
+    cache_mode: Literal["off", "only_new", "reverify"] = "off"
+    reverify_after_days: float = Field(default=7, gt=0)
+    priority: int = 0  # higher-priority runs leave the queue first
+    network: NetworkPolicySettings = NetworkPolicySettings()
+    # direct: replay the widget's recorded HTTP/WebSocket exchange, using the browser only as a fallback
+    execution: Literal["browser", "direct"] = "browser"
+    record_timings: bool = True  # per-phase timing breakdown on every result
+    prompt_set_id: Optional[str] = None  # defaults to the most recently uploaded prompt set
+
+    @model_validator(mode="before")
+    @classmethod
+    def null_means_default(cls, data: Any) -> Any:
+        # Clients (and manifests of older runs) may send null for a setting they leave at its default
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value is not None}
+        return data
 
 
 class TestRunResponse(BaseModel):
@@ -50,6 +88,18 @@ class TestResult(BaseModel):
     tags: List[str] = []
     error_message: Optional[str] = None
     screenshot_path: Optional[str] = None
+    worker_id: Optional[int] = None
+    first_token_time: Optional[float] = None  # seconds from submit to first response text
+    response_time: Optional[float] = None  # seconds from submit to final response text
+    input_strategy: Optional[str] = None
+    content_hash: Optional[str] = None
+    cached: bool = False  # reused from the response cache instead of re-run
+    cached_at: Optional[str] = None
+    load_time: Optional[float] = None  # seconds to load the target page, for the prompt that loaded it
+    requests_blocked: Optional[int] = None
+    bytes_saved: Optional[int] = None  # static asset bytes served from the local cache
+    execution: Optional[str] = None  # "direct" if replayed without the browser
+    timings: Optional[Dict[str, float]] = None  # seconds spent in each phase (see utils.timing.PHASES)
 
 
 class TestRunResult(BaseModel):
@@ -73,3 +123,22 @@ class UploadResponse(BaseModel):
 class ResultsResponse(BaseModel):
     results: List[TestRunResult]
     total_runs: int
+
+
+class WorkLeaseRequest(BaseModel):
+    worker_id: str
+    lease_seconds: float = Field(gt=0)
+
+
+class WorkCompleteRequest(BaseModel):
+    worker_id: str
+
+
+class WorkFailRequest(BaseModel):
+    worker_id: str
+    error: str
+
+
+class WorkResultReport(BaseModel):
+    index: int
+    result: Dict[str, Any]
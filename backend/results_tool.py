@@ -0,0 +1,81 @@
+"""Maintenance of stored run results.
+
+Run from the backend directory, with the API stopped or running:
+
+    python results_tool.py migrate              # rewrite results/*.json as compact .jsonl.gz files
+    python results_tool.py migrate --keep       # ... and keep the original files
+    python results_tool.py export RUN_ID out.parquet
+    python results_tool.py export RUN_ID out.csv --format csv
+"""
+import argparse
+import logging
+import os
+import sys
+
+from utils.prompt_store import PromptStore
+from utils.results_index import ResultsIndex
+from utils.run_storage import (
+    RESULTS_DIR, LEGACY_RUN_FILE_SUFFIX, RUN_FILE_SUFFIX, run_file_path, migrate_run_file, export_run
+)
+
+logger = logging.getLogger("results_tool")
+
+
+def migrate(results_dir: str, keep: bool):
+    prompt_store = PromptStore()
+    results_index = ResultsIndex()
+    migrated = failed = saved = 0
+    for filename in sorted(os.listdir(results_dir)):
+        if not filename.endswith(LEGACY_RUN_FILE_SUFFIX):
+            continue
+        path = os.path.join(results_dir, filename)
+        if os.path.exists(path[:-len(LEGACY_RUN_FILE_SUFFIX)] + RUN_FILE_SUFFIX):
+            logger.info(f"Skipping {filename}: already migrated")
+            continue
+        size = os.path.getsize(path)
+        try:
+            new_path = migrate_run_file(path, prompt_store, keep=keep)
+        except Exception as e:
+            logger.error(f"Failed to migrate {filename}: {e}")
+            failed += 1
+            continue
+        # The index remembers each run's file mtime; point it at the new file
+        results_index.index_run_file(new_path)
+        saved += size - os.path.getsize(new_path)
+        migrated += 1
+        logger.info(f"{filename}: {size} -> {os.path.getsize(new_path)} bytes")
+    logger.info(f"Migrated {migrated} run file(s), {failed} failed, {saved / (1024 * 1024):.1f} MB saved")
+    return failed == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RedPrompt run result maintenance")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Rewrite legacy JSON run files in the compact format")
+    migrate_parser.add_argument("--keep", action="store_true", help="Keep the legacy files")
+
+    export_parser = commands.add_parser("export", help="Export one run's results as a table")
+    export_parser.add_argument("test_run_id")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.command == "migrate":
+        sys.exit(0 if migrate(args.results_dir, args.keep) else 1)
+
+    path = run_file_path(args.test_run_id, args.results_dir)
+    if path is None:
+        sys.exit(f"No result file for run {args.test_run_id} in {args.results_dir}")
+    try:
+        export_run(path, args.output, PromptStore(), export_format=args.format)
+    except (RuntimeError, ValueError) as e:
+        sys.exit(str(e))
+    logger.info(f"Exported {args.test_run_id} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
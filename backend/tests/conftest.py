@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The backend is run from its own directory and imports its modules top-level
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """The API module, imported in a scratch directory so its state stays out of the tree.
+
+    Runs are handed to a (never started) remote work queue, and the scheduler
+    is not started, so submitted runs stay queued and no browser is launched.
+    """
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("api"))
+    os.environ.setdefault("REDPROMPT_EXECUTION_MODE", "remote")
+    os.environ.setdefault("REDPROMPT_WORK_QUEUE", "sqlite:///runs/work_queue.db")
+    try:
+        import main
+        yield main
+    finally:
+        os.chdir(previous)
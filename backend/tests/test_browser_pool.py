@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from utils import browser_pool as browser_pool_module
+from utils.browser_pool import BrowserPool
+
+MB = 1024 * 1024
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        return object()
+
+    async def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.launched = []
+        self.chromium = self
+
+    async def launch(self, **kwargs):
+        browser = FakeBrowser()
+        self.launched.append(browser)
+        return browser
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """The Chromium RSS the pool samples, in MB; set ``rss["mb"]`` to change it."""
+    sampled = {"mb": 100}
+    monkeypatch.setattr(browser_pool_module, "process_tree_rss", lambda pid, include_root=True: sampled["mb"] * MB)
+    return sampled
+
+
+def make_pool(**kwargs) -> BrowserPool:
+    pool = BrowserPool(**kwargs)
+    pool.playwright = FakePlaywright()
+    return pool
+
+
+def test_contexts_are_spread_over_the_least_busy_browsers(rss):
+    async def scenario():
+        pool = make_pool(size=2)
+        first, second = await pool.acquire(), await pool.acquire()
+        assert first.pooled is not second.pooled
+        await first.release()
+        third = await pool.acquire()
+        assert third.pooled is first.pooled
+        assert pool.snapshot()["active_leases"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_memory_grown_during_a_run_recycles_the_browser_at_release(rss):
+    async def scenario():
+        pool = make_pool(size=1, max_rss_mb=500)
+        lease = await pool.acquire()
+        await lease.new_context()
+        # The run's pages grew the browser past the limit; no further acquire is needed to notice
+        rss["mb"] = 800
+        await lease.release()
+        assert pool.recycled == 1
+        assert lease.browser.closed
+        assert pool.browsers[0].browser is not lease.browser
+        # The stale sample does not recycle the fresh browser again
+        rss["mb"] = 120
+        await (await pool.acquire()).release()
+        assert pool.recycled == 1
+
+    asyncio.run(scenario())
+
+
+def test_release_prefers_recycling_an_idle_browser(rss):
+    async def scenario():
+        pool = make_pool(size=2, max_rss_mb=500)
+        busy, idle = await pool.acquire(), await pool.acquire()
+        for _ in range(3):
+            await busy.new_context()
+        await idle.new_context()
+        rss["mb"] = 800
+        await idle.release()
+        assert idle.browser.closed
+        assert not busy.browser.closed
+        assert pool.retiring == []
+
+    asyncio.run(scenario())
+
+
+def test_worn_browser_in_use_retires_until_its_last_release(rss):
+    async def scenario():
+        pool = make_pool(size=1, max_contexts_per_browser=2)
+        first, second = await pool.acquire(), await pool.acquire()
+        await first.new_context()
+        await first.new_context()
+        await first.release()
+        # Still lent to the second run: replaced in the pool, closed later
+        assert pool.recycled == 1
+        assert [pooled.browser for pooled in pool.retiring] == [second.browser]
+        assert not second.browser.closed
+        await second.release()
+        assert second.browser.closed
+        assert pool.retiring == []
+        assert len(pool.browsers) == 1
+
+    asyncio.run(scenario())
+
+
+def test_release_after_stop_does_not_relaunch(rss):
+    async def scenario():
+        pool = make_pool(size=1)
+        playwright = pool.playwright
+        lease = await pool.acquire()
+        await pool.stop()
+        await lease.release()
+        assert len(playwright.launched) == 1
+        assert not pool.started
+
+    asyncio.run(scenario())
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import socket
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+
+import models
+from benchmarks.mock_chat_server import MockChatServer, MockSettings, reply_for
+from utils import test_runner
+from utils.direct_protocol import DirectProtocolClient, ProtocolStore, ReplayError
+from utils.selector_cache import SelectorCache, origin_of
+from utils.test_runner import ChatWidgetTester
+
+# The mock site answers at once, so replays are quick
+SITE = {"latency_ms": 0, "stream_ms": 0}
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockChatServer(port=free_port()) as running:
+        yield running
+
+
+def chat_url(server: MockChatServer, **settings) -> str:
+    """The widget's API URL, with the query its host page passes on."""
+    return f"http://{server.host}:{server.port}/api/chat?" + urlencode(MockSettings(**settings).dict())
+
+
+class FakeResponse:
+    def __init__(self, response: httpx.Response):
+        self.status = response.status_code
+        self.headers = dict(response.headers)
+        self.body = response.text
+
+    async def text(self):
+        return self.body
+
+
+class FakeRequest:
+    """The parts of a Playwright request that ``ProtocolRecorder`` reads."""
+
+    def __init__(self, method, url, headers, post_data):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.post_data = post_data
+        self._response = None
+
+    async def response(self):
+        return self._response
+
+    async def all_headers(self):
+        return dict(self.headers, host="127.0.0.1")
+
+
+class FakeContext:
+    def __init__(self):
+        self.page = FakePage(self)
+
+    async def new_page(self):
+        return self.page
+
+    async def cookies(self, urls):
+        return []
+
+    async def close(self):
+        pass
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.listeners = {}
+
+    def on(self, event, handler):
+        self.listeners.setdefault(event, []).append(handler)
+
+    async def close(self):
+        pass
+
+
+class WidgetTester(ChatWidgetTester):
+    """Stands in for the browser: "typing" a prompt makes the widget's own request to the mock site."""
+
+    def __init__(self, api_url: str):
+        super().__init__(selector_cache=SelectorCache(path=None), timeout=10000, settle_quiet_ms=200)
+        self.api_url = api_url
+        self.browser_prompts = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def new_context(self):
+        return FakeContext()
+
+    async def test_single_prompt(self, page, prompt_data, target_url, screenshot_on_failure=True, delay_between_prompts=2, timer=None):
+        self.browser_prompts.append(prompt_data.prompt)
+        headers = {"content-type": "application/json", "accept": "*/*"}
+        request = FakeRequest("POST", self.api_url, headers, json.dumps({"message": prompt_data.prompt}))
+        for handler in page.listeners.get("request", []):
+            handler(request)
+        async with httpx.AsyncClient() as client:
+            response = await client.post(self.api_url, headers=headers, content=request.post_data)
+        request._response = FakeResponse(response)
+        if response.status_code >= 400:
+            return models.TestResult(
+                id=prompt_data.id, prompt=prompt_data.prompt, status=models.PromptStatus.failed,
+                timestamp="2025-07-02T15:20:02", execution_time=0.1, error_message="No response captured from chat widget"
+            )
+        # What the widget displays: the streamed deltas, joined
+        reply = "".join(
+            json.loads(line[6:])["delta"] for line in response.text.split("\n")
+            if line.startswith("data: ") and line != "data: [DONE]"
+        )
+        return models.TestResult(
+            id=prompt_data.id, prompt=prompt_data.prompt, response=reply, status=models.PromptStatus.completed,
+            timestamp="2025-07-02T15:20:02", execution_time=0.1
+        )
+
+
+def prompts(count: int):
+    return [models.PromptData(id=f"p{index}", prompt=f"What are your opening hours on day {index}?") for index in range(count)]
+
+
+async def run_direct(tester: WidgetTester, store: ProtocolStore, target_url: str, items, concurrency: int = 2):
+    queue = asyncio.Queue()
+    for item in enumerate(items):
+        queue.put_nowait(item)
+    results = [None] * len(items)
+    await test_runner._run_direct(
+        tester, queue, concurrency, store, target_url, False, 0, None, results, None, len(items), None
+    )
+    left = []
+    while not queue.empty():
+        left.append(queue.get_nowait())
+    return results, left
+
+
+def record(server: MockChatServer) -> dict:
+    tester = WidgetTester(chat_url(server, **SITE))
+    prompt = prompts(1)[0]
+    results = [None]
+    template = asyncio.run(test_runner._record_protocol(
+        tester, 0, prompt, server.url(**SITE), False, results, None, None, None
+    ))
+    assert results[0].status == models.PromptStatus.completed
+    return template
+
+
+def test_record_protocol_captures_the_widget_exchange(server):
+    template = record(server)
+    assert template["transport"] == "http"
+    assert template["method"] == "POST"
+    assert template["url"] == chat_url(server, **SITE)
+    assert template["body"] == '{"message": "{{redprompt:prompt}}"}'
+    assert template["encoding"] == "json"
+    assert template["response"] == {"path": ["delta"], "join": "concat", "format": "sse"}
+    # Headers the client sets itself are not replayed
+    assert "host" not in template["headers"]
+
+
+def test_recorded_template_replays_new_prompts(server):
+    template = record(server)
+    prompt = 'Can you track order "12345" for me?'
+
+    async def replay():
+        async with DirectProtocolClient(template) as client:
+            return await client.send(prompt)
+
+    reply, first_token_time, response_time = asyncio.run(replay())
+    assert reply == reply_for(prompt, MockSettings(**SITE))
+    assert first_token_time is not None and first_token_time <= response_time
+
+
+def test_direct_run_records_once_then_replays(server):
+    tester = WidgetTester(chat_url(server, **SITE))
+    store = ProtocolStore(path=None)
+    items = prompts(5)
+    target_url = server.url(**SITE)
+
+    results, left = asyncio.run(run_direct(tester, store, target_url, items))
+    assert left == []
+    assert tester.browser_prompts == [items[0].prompt]
+    assert [result.execution for result in results] == [None] + ["direct"] * 4
+    for item, result in zip(items, results):
+        assert result.response == reply_for(item.prompt, MockSettings(**SITE))
+    assert store.get(origin_of(target_url)) is not None
+
+    # A second run reuses the stored template and needs no browser at all
+    tester.browser_prompts = []
+    results, left = asyncio.run(run_direct(tester, store, target_url, items))
+    assert tester.browser_prompts == []
+    assert all(result.execution == "direct" for result in results)
+
+
+@pytest.mark.parametrize("break_template", ["http_error", "schema_mismatch"])
+def test_failed_replays_fall_back_to_the_browser(server, break_template):
+    template = record(server)
+    if break_template == "http_error":
+        # The API now answers every prompt with HTTP 500
+        template["url"] = chat_url(server, fail_rate=1, **SITE)
+    else:
+        # The API's events no longer have the recorded shape
+        template["response"] = dict(template["response"], path=["choices", 0, "text"])
+    target_url = server.url(**SITE)
+    store = ProtocolStore(path=None)
+    store.record(origin_of(target_url), template)
+    items = prompts(test_runner.DIRECT_FAILURE_LIMIT + 2)
+
+    results, left = asyncio.run(run_direct(WidgetTester(chat_url(server, **SITE)), store, target_url, items, concurrency=1))
+    # Nothing was replayed; every prompt is back on the queue for the browser workers
+    assert results == [None] * len(items)
+    assert sorted(index for index, _ in left) == list(range(len(items)))
+    # The template kept failing, so it is dropped and recorded again next time
+    assert store.get(origin_of(target_url)) is None
+
+
+def test_replay_without_a_reply_raises(server):
+    template = record(server)
+    template["response"] = dict(template["response"], path=["text"])
+
+    async def replay():
+        async with DirectProtocolClient(template) as client:
+            await client.send("hello")
+
+    with pytest.raises(ReplayError):
+        asyncio.run(replay())
+
+
+def chromium_available() -> bool:
+    from playwright.async_api import async_playwright
+
+    async def launch():
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch()
+            await browser.close()
+
+    try:
+        asyncio.run(launch())
+        return True
+    except Exception:
+        return False
+
+
+def test_direct_run_in_a_real_browser(server):
+    if not chromium_available():
+        pytest.skip("Chromium is not installed (playwright install chromium)")
+    items = prompts(4)
+    results = asyncio.run(test_runner.run_prompt_tests(
+        server.url(**SITE), items, delay_between_prompts=0, pacing="fixed", concurrency=2,
+        execution="direct", selector_cache=SelectorCache(path=None), protocol_store=ProtocolStore(path=None)
+    ))
+    assert [result.status for result in results] == [models.PromptStatus.completed] * 4
+    assert [result.execution for result in results].count("direct") == 3
+    for item, result in zip(items, results):
+        assert result.response == reply_for(item.prompt, MockSettings(**SITE))
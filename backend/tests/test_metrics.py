@@ -0,0 +1,97 @@
+import urllib.error
+import urllib.request
+
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import metrics
+from utils.metrics import CONTENT_TYPE, MetricsRegistry, start_metrics_server
+
+
+def test_samples_render_in_the_exposition_format():
+    registry = MetricsRegistry()
+    prompts = registry.counter("prompts_total", "Prompts run.", ("target", "status"))
+    leases = registry.gauge("leases", "Active leases.")
+    prompts.inc(target="https://shop.example", status="completed")
+    prompts.inc(2, target="https://shop.example", status="completed")
+    prompts.inc(target='say "hi"\n', status="failed")
+    leases.set(1.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP prompts_total Prompts run.",
+        "# TYPE prompts_total counter",
+        'prompts_total{target="https://shop.example",status="completed"} 3',
+        'prompts_total{target="say \\"hi\\"\\n",status="failed"} 1',
+        "# HELP leases Active leases.",
+        "# TYPE leases gauge",
+        "leases 1.5",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(1, 0.5))
+    for value in (0.2, 0.5, 0.7, 3):
+        latency.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.5"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 4.4",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_collectors_run_before_every_render_and_may_fail():
+    registry = MetricsRegistry()
+    depth = registry.gauge("depth", "Queue depth.")
+    readings = iter([3, 5])
+
+    def collect_depth():
+        depth.set(next(readings))
+
+    def broken():
+        raise RuntimeError("gone")
+
+    registry.on_collect(broken)
+    registry.on_collect(collect_depth)
+    assert "depth 3" in registry.render()
+    assert "depth 5" in registry.render()
+
+
+def test_names_are_registered_once():
+    registry = MetricsRegistry()
+    registry.counter("runs_total", "Runs.")
+    with pytest.raises(ValueError):
+        registry.gauge("runs_total", "Runs.")
+
+
+def test_metrics_server_for_workers():
+    server = start_metrics_server(0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert "# TYPE redprompt_prompts_total counter" in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_api_requests_are_labelled_by_route_template(api):
+    client = TestClient(api.app)
+    client.get("/results/no-such-run")
+    client.get("/no-such-route")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    body = response.text
+    assert 'redprompt_http_requests_total{method="GET",route="/results/{test_run_id}",status="404"}' in body
+    assert 'redprompt_http_requests_total{method="GET",route="unmatched",status="404"}' in body
+    assert "no-such-run" not in body
+    assert 'redprompt_runs{state="running"} 0' in body
+    assert metrics.BROWSER_LEASES.values[()] == 0
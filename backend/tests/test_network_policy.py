@@ -0,0 +1,175 @@
+import asyncio
+import os
+
+import pytest
+
+import models
+from utils.network_policy import NetworkPolicy, StaticAssetCache, cache_lifetime, host_matches
+
+DATE = "Wed, 02 Jul 2025 15:20:02 GMT"
+
+
+@pytest.mark.parametrize("headers, lifetime", [
+    ({"cache-control": "public, max-age=600"}, 600),
+    ({"cache-control": "max-age=600, s-maxage=60"}, 60),
+    ({"cache-control": 'max-age="30"'}, 30),
+    ({"cache-control": "max-age=0"}, None),
+    ({"cache-control": "max-age=soon"}, None),
+    ({"cache-control": "private, max-age=600"}, None),
+    ({"cache-control": "no-store"}, None),
+    ({"cache-control": "no-cache, max-age=600"}, None),
+    ({"expires": "Wed, 02 Jul 2025 16:20:02 GMT", "date": DATE}, 3600),
+    ({"expires": "Wed, 02 Jul 2025 14:20:02 GMT", "date": DATE}, None),
+    ({"expires": "0", "date": DATE}, None),
+    ({}, None),
+])
+def test_cache_lifetime(headers, lifetime):
+    assert cache_lifetime(headers) == lifetime
+
+
+def test_host_matches_subdomains_only():
+    assert host_matches("google-analytics.com", ["google-analytics.com"])
+    assert host_matches("ssl.google-analytics.com", ["google-analytics.com"])
+    assert not host_matches("notgoogle-analytics.com", ["google-analytics.com"])
+
+
+def test_assets_are_stored_only_when_http_caching_allows(tmp_path):
+    cache = StaticAssetCache(str(tmp_path))
+    headers = {"cache-control": "max-age=600", "content-type": "text/css", "set-cookie": "id=1"}
+    assert cache.put("https://cdn.example/app.css", 200, headers, b"body {}")
+    assert not cache.put("https://cdn.example/private.css", 200, {"cache-control": "private, max-age=600"}, b"x")
+    assert not cache.put("https://cdn.example/any.css", 200, dict(headers, vary="*"), b"x")
+
+    entry = cache.get("https://cdn.example/app.css")
+    assert entry["body"] == b"body {}"
+    # Per-client headers are never replayed
+    assert entry["headers"] == {"cache-control": "max-age=600", "content-type": "text/css"}
+    assert cache.get("https://cdn.example/private.css") is None
+    assert cache.stats() == {"entries": 1, "bytes": 7, "max_bytes": cache.max_bytes}
+
+
+def test_vary_headers_must_match(tmp_path):
+    cache = StaticAssetCache(str(tmp_path))
+    headers = {"cache-control": "max-age=600", "vary": "Accept-Language, Accept-Encoding"}
+    cache.put("https://cdn.example/app.js", 200, headers, b"en", request_headers={"accept-language": "en", "accept-encoding": "gzip"})
+    assert cache.get("https://cdn.example/app.js", {"accept-language": "en", "accept-encoding": "br"})["body"] == b"en"
+    assert cache.get("https://cdn.example/app.js", {"accept-language": "de"}) is None
+
+
+def test_entries_expire_at_their_own_lifetime_or_the_cache_maximum(tmp_path):
+    cache = StaticAssetCache(str(tmp_path), max_age_seconds=0)
+    cache.put("https://cdn.example/app.js", 200, {"cache-control": "max-age=600"}, b"js")
+    assert cache.get("https://cdn.example/app.js") is None
+    assert cache.stats()["entries"] == 0
+    assert [name for name in os.listdir(tmp_path)] == []
+
+
+def test_least_recently_used_assets_are_evicted(tmp_path):
+    cache = StaticAssetCache(str(tmp_path), max_bytes=10)
+    headers = {"cache-control": "max-age=600"}
+    cache.put("https://cdn.example/a", 200, headers, b"aaaa")
+    cache.put("https://cdn.example/b", 200, headers, b"bbbb")
+    cache.get("https://cdn.example/a")
+    cache.put("https://cdn.example/c", 200, headers, b"cccc")
+    assert cache.get("https://cdn.example/b") is None
+    assert cache.get("https://cdn.example/a")["body"] == b"aaaa"
+    assert cache.size == 8
+    assert not cache.put("https://cdn.example/huge", 200, headers, b"x" * 11)
+
+    # A new process picks the index up from disk, dropping unfinished writes
+    (tmp_path / "leftover.body.tmp").write_bytes(b"partial")
+    reopened = StaticAssetCache(str(tmp_path), max_bytes=10)
+    assert reopened.size == 8
+    assert not (tmp_path / "leftover.body.tmp").exists()
+    reopened.clear()
+    assert reopened.stats()["entries"] == 0 and os.listdir(tmp_path) == []
+
+
+class FakeResponse:
+    status = 200
+    headers = {"cache-control": "max-age=600", "content-encoding": "gzip", "content-type": "text/javascript"}
+
+    async def body(self):
+        return b"console.log(1)"
+
+
+class FakeRoute:
+    def __init__(self, fail_first_continue=False):
+        self.outcome = None
+        self.fetches = 0
+        self.fail_first_continue = fail_first_continue
+
+    async def abort(self, reason):
+        self.outcome = ("abort", reason)
+
+    async def continue_(self):
+        if self.fail_first_continue:
+            self.fail_first_continue = False
+            raise RuntimeError("route handling failed")
+        self.outcome = ("continue",)
+
+    async def fetch(self):
+        self.fetches += 1
+        return FakeResponse()
+
+    async def fulfill(self, status, headers, body):
+        self.outcome = ("fulfill", status, headers, body)
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type="script", method="GET", headers=None):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = method
+        self.headers = headers or {}
+
+    async def all_headers(self):
+        return self.headers
+
+
+def route(policy: NetworkPolicy, request: FakeRequest, **kwargs) -> FakeRoute:
+    fake = FakeRoute(**kwargs)
+    asyncio.run(policy._handle(fake, request))
+    return fake
+
+
+def test_noise_is_blocked_and_the_widget_is_not():
+    settings = models.NetworkPolicySettings(
+        enabled=True, block_third_party=True, allow_hosts=["cdn.example"], block_hosts=["ads.example"],
+        cache_static_assets=False
+    )
+    policy = NetworkPolicy(settings, "https://shop.example/")
+    assert route(policy, FakeRequest("https://shop.example/logo.png", "image")).outcome[0] == "abort"
+    assert route(policy, FakeRequest("https://www.google-analytics.com/ga.js")).outcome[0] == "abort"
+    assert route(policy, FakeRequest("https://x.ads.example/pixel.js")).outcome[0] == "abort"
+    assert route(policy, FakeRequest("https://tracker.other/t.js")).outcome[0] == "abort"
+    # First-party, allowed hosts and third-party frames (the widget) go through
+    assert route(policy, FakeRequest("https://static.shop.example/app.js")).outcome == ("continue",)
+    assert route(policy, FakeRequest("https://cdn.example/lib.js")).outcome == ("continue",)
+    assert route(policy, FakeRequest("https://widget.vendor/chat", "document")).outcome == ("continue",)
+    assert policy.snapshot()["requests_blocked"] == 4
+
+
+def test_static_assets_are_served_from_the_cache(tmp_path):
+    settings = models.NetworkPolicySettings(enabled=True, block_resource_types=[])
+    policy = NetworkPolicy(settings, "https://shop.example/", StaticAssetCache(str(tmp_path)))
+
+    first = route(policy, FakeRequest("https://shop.example/app.js"))
+    assert first.fetches == 1
+    assert first.outcome[0] == "fulfill"
+    assert "content-encoding" not in first.outcome[2]
+
+    second = route(policy, FakeRequest("https://shop.example/app.js"))
+    assert second.fetches == 0
+    assert second.outcome[3] == b"console.log(1)"
+    assert policy.snapshot() == {"requests_blocked": 0, "cache_hits": 1, "bytes_saved": 14}
+
+    # Authorized requests are fetched but never stored
+    private = FakeRequest("https://shop.example/me.js", headers={"authorization": "Bearer x"})
+    route(policy, private)
+    assert route(policy, private).fetches == 1
+
+
+def test_a_route_is_settled_even_when_handling_it_fails():
+    policy = NetworkPolicy(models.NetworkPolicySettings(enabled=True), "https://shop.example/")
+    assert route(policy, FakeRequest("https://shop.example/api", "xhr"), fail_first_continue=True).outcome == ("continue",)
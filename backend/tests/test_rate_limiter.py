@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+import models
+from utils import rate_limiter
+from utils.rate_limiter import AdaptiveRateLimiter, get_rate_limiter, run_pacing
+
+
+def result(status=models.PromptStatus.completed, response="Sure, here you go.", response_time=1.0):
+    return models.TestResult(
+        id="p", prompt="hi", response=response, status=status, timestamp="2025-07-02T15:20:02",
+        execution_time=response_time, response_time=response_time
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+
+
+def test_ceiling_scales_with_concurrency():
+    pacing = run_pacing(delay_between_prompts=2, concurrency=8)
+    assert pacing["initial_rate"] == 0.5
+    assert pacing["max_rate"] == 4.0
+    limiter = get_rate_limiter("http://target", **pacing)
+    for _ in range(rate_limiter.RAMP_UP_PROMPTS):
+        limiter.record_result(result())
+    assert limiter.rate == pytest.approx(4.0)
+
+
+def test_rate_ramps_up_on_successes_and_stops_at_the_ceiling():
+    limiter = AdaptiveRateLimiter("http://target", initial_rate=1.0, max_rate=2.0, additive_step=0.25)
+    rates = []
+    for _ in range(6):
+        limiter.record_result(result())
+        rates.append(limiter.rate)
+    assert rates == [1.25, 1.5, 1.75, 2.0, 2.0, 2.0]
+    assert limiter.successes == 6
+
+
+@pytest.mark.parametrize("pushback", [
+    result(response="429 Too Many Requests"),
+    result(status=models.PromptStatus.failed, response=None),
+    result(status=models.PromptStatus.timeout, response=None),
+    result(response_time=60.0),
+])
+def test_rate_halves_when_the_target_pushes_back(pushback):
+    limiter = AdaptiveRateLimiter("http://target", initial_rate=2.0, max_rate=4.0)
+    limiter.record_result(pushback)
+    assert limiter.rate == 1.0
+    assert limiter.backoffs == 1
+
+
+def test_concurrent_reports_of_one_incident_back_off_once():
+    limiter = AdaptiveRateLimiter("http://target", initial_rate=2.0, max_rate=4.0)
+    for _ in range(4):
+        limiter.record_result(result(response="Rate limit exceeded, try again later"))
+    assert limiter.rate == 1.0
+
+
+def test_new_run_is_reseeded_but_keeps_a_recent_backoff():
+    limiter = get_rate_limiter("http://target", **run_pacing(1, 4))
+    for _ in range(40):
+        limiter.record_result(result())
+    assert limiter.rate == 4.0
+    # Without pushback a new run starts again from one worker's pace
+    assert get_rate_limiter("http://target", **run_pacing(1, 4)).rate == 1.0
+    limiter.back_off("error banner")
+    assert get_rate_limiter("http://target", **run_pacing(1, 4)).rate == 0.5
+
+
+def test_acquire_spaces_prompts_at_the_rate():
+    limiter = AdaptiveRateLimiter("http://target", initial_rate=20.0, max_rate=20.0)
+
+    async def take(count):
+        started = time.monotonic()
+        for _ in range(count):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    # The first token is the burst; the other four wait 1/20 s each
+    assert asyncio.run(take(5)) == pytest.approx(0.2, abs=0.08)
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+import models
+from utils.response_cache import ResponseCache
+from utils.test_runner import run_prompt_tests, _content_hash
+
+ORIGIN = "http://target"
+
+
+def result(response="I can't help with that.", status=models.PromptStatus.completed):
+    return models.TestResult(
+        id="p", prompt="hi", response=response, status=status,
+        timestamp="2025-07-02T15:20:02", execution_time=1.0
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    yield cache
+    cache.conn.close()
+
+
+def test_round_trip_and_counters(cache):
+    cache.put(ORIGIN, "a", result("first"))
+    assert cache.get(ORIGIN, "a")["result"]["response"] == "first"
+    assert cache.get(ORIGIN, "b") is None
+    assert cache.get("http://other", "a") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_failures_are_not_cached(cache):
+    cache.put(ORIGIN, "a", result(status=models.PromptStatus.failed))
+    cache.put(ORIGIN, "b", result(status=models.PromptStatus.timeout))
+    assert cache.get_many(ORIGIN, ["a", "b"]) == {}
+
+
+def test_get_many_spans_lookup_batches(cache):
+    for number in range(0, 1200, 2):
+        cache.put(ORIGIN, f"h{number}", result(f"r{number}"))
+    found = cache.get_many(ORIGIN, [f"h{number}" for number in range(1200)])
+    assert sorted(found) == sorted(f"h{number}" for number in range(0, 1200, 2))
+    assert found["h1000"]["result"]["response"] == "r1000"
+    assert (cache.hits, cache.misses) == (600, 600)
+
+
+def test_max_age_limits_hits(cache):
+    cache.put(ORIGIN, "a", result())
+    cache.conn.execute("UPDATE responses SET created_at = ?", (time.time() - 3600,))
+    assert cache.get_many(ORIGIN, ["a"], max_age_seconds=60) == {}
+    assert "a" in cache.get_many(ORIGIN, ["a"], max_age_seconds=7200)
+
+
+def test_eviction_is_deferred_until_full_or_due(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=100, evict_interval=3600)
+    for number in range(100):
+        cache.put(ORIGIN, f"h{number}", result())
+    assert cache.entries == 100
+    # Touch the oldest entry so it is not the least recently used
+    cache.get(ORIGIN, "h0")
+    cache.put(ORIGIN, "h100", result())
+    assert cache.stats()["entries"] == 95
+    assert cache.get(ORIGIN, "h0") is not None
+    assert cache.get(ORIGIN, "h1") is None
+
+
+def test_replaced_entries_are_recounted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=10, evict_interval=3600)
+    for _ in range(11):
+        cache.put(ORIGIN, "same", result())
+    assert cache.entries == 1
+    assert cache.get(ORIGIN, "same") is not None
+
+
+def test_entry_count_survives_a_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path)
+    cache.put(ORIGIN, "a", result())
+    cache.put(ORIGIN, "b", result())
+    cache.conn.close()
+    assert ResponseCache(path).entries == 2
+
+
+def test_runner_reuses_cached_results_with_one_lookup(cache, monkeypatch):
+    prompts = [models.PromptData(id=f"p{number}", prompt=f"prompt {number}") for number in range(5)]
+    for prompt in prompts:
+        cache.put("http://target", _content_hash(prompt), result(f"cached {prompt.id}"))
+    lookups = []
+    get_many = cache.get_many
+    monkeypatch.setattr(cache, "get_many", lambda *args: lookups.append(args) or get_many(*args))
+
+    results = asyncio.run(run_prompt_tests(
+        "http://target/chat", prompts, response_cache=cache, cache_mode="only_new", skip_indices={4}
+    ))
+    assert len(lookups) == 1 and len(lookups[0][1]) == 4
+    assert [r.response for r in results] == [f"cached p{number}" for number in range(4)]
+    assert all(r.cached for r in results)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from utils import run_documents as run_documents_module
+from utils.prompt_store import PromptStore
+from utils.run_documents import RunDocumentCache
+from utils.run_storage import RUN_FILE_SUFFIX, write_run_file
+
+TARGET_URL = "https://results-api.example"
+
+
+def write_run(
+    results_dir, prompt_store, test_run_id: str, timestamp: str = "2025-07-02T15:20:02", count: int = 3,
+    target_url: str = TARGET_URL
+):
+    os.makedirs(results_dir, exist_ok=True)
+    header = {
+        "test_run_id": test_run_id, "target_url": target_url, "timestamp": timestamp, "status": "completed",
+        "total_prompts": count, "successful_tests": count, "failed_tests": 0
+    }
+    records = [{"index": index, "prompt": f"prompt {index}", "status": "completed"} for index in range(count)]
+    write_run_file(os.path.join(results_dir, f"{test_run_id}{RUN_FILE_SUFFIX}"), header, records, prompt_store)
+
+
+def slow_documents(tmp_path, monkeypatch, release: threading.Event):
+    results_dir = str(tmp_path / "results")
+    prompt_store = PromptStore(str(tmp_path / "prompts.db"))
+    write_run(results_dir, prompt_store, "run-1")
+    documents = RunDocumentCache(prompt_store, results_dir)
+    serialize = documents._serialize
+    calls = []
+
+    def slow_serialize(path):
+        calls.append(path)
+        release.wait(5)
+        return serialize(path)
+
+    monkeypatch.setattr(documents, "_serialize", slow_serialize)
+    return documents, calls
+
+
+def test_serializing_a_run_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    release = threading.Event()
+    documents, _ = slow_documents(tmp_path, monkeypatch, release)
+
+    async def scenario():
+        reading = asyncio.create_task(documents.body("run-1", documents.run_file("run-1")))
+        started = time.perf_counter()
+        # Other requests keep being served while the run is read
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        waited = time.perf_counter() - started
+        assert not reading.done()
+        release.set()
+        return waited, await reading
+
+    waited, body = asyncio.run(scenario())
+    assert waited < 1
+    assert json.loads(body)["test_run_id"] == "run-1"
+
+
+def test_concurrent_reads_of_a_run_serialize_it_once(tmp_path, monkeypatch):
+    release = threading.Event()
+    documents, calls = slow_documents(tmp_path, monkeypatch, release)
+
+    async def scenario():
+        run_file = documents.run_file("run-1")
+        readers = [asyncio.create_task(documents.body("run-1", run_file)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        # A client that disconnects does not cancel the read for the others
+        readers[0].cancel()
+        release.set()
+        return await asyncio.gather(*readers[1:])
+
+    bodies = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert len(set(bodies)) == 1
+    assert documents.stats()["runs"] == 1
+
+
+def test_large_runs_are_streamed(api, monkeypatch):
+    write_run("results", api.prompt_store, "streamed-run", count=30)
+    api.run_documents.invalidate("streamed-run")
+    monkeypatch.setattr(run_documents_module, "STREAM_THRESHOLD_BYTES", 0)
+    client = TestClient(api.app)
+
+    response = client.get("/results/streamed-run")
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    document = response.json()
+    assert [result["prompt"] for result in document["results"]] == [f"prompt {index}" for index in range(30)]
+    assert "streamed-run" not in api.run_documents.bodies
+    assert client.get("/results/streamed-run", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_legacy_runs_are_served_as_stored(api):
+    legacy = {"test_run_id": "legacy-run", "target_url": TARGET_URL, "results": [{"prompt": "old", "status": "completed"}]}
+    with open(os.path.join("results", "legacy-run.json"), "w") as f:
+        json.dump(legacy, f)
+    api.run_documents.invalidate("legacy-run")
+
+    response = TestClient(api.app).get("/results/legacy-run")
+    assert response.json() == legacy
+
+
+def test_run_listing_pages_with_a_projection(api):
+    target_url = "https://listed.example"
+    for index in range(5):
+        write_run(
+            "results", api.prompt_store, f"listed-run-{index}", timestamp=f"2025-07-0{index + 1}T12:00:00",
+            target_url=target_url
+        )
+    api.results_index.sync_directory("results")
+    client = TestClient(api.app)
+
+    listed, cursor = [], None
+    while True:
+        params = {"target_url": target_url, "limit": 2, "fields": "test_run_id, status"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/results", params=params).json()
+        assert page["total_runs"] == 5
+        assert all(set(run) == {"test_run_id", "status"} for run in page["results"])
+        listed += [run["test_run_id"] for run in page["results"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert listed == [f"listed-run-{index}" for index in range(4, -1, -1)]
+
+    since = client.get("/results", params={"target_url": target_url, "since": "2025-07-04"}).json()
+    assert [run["test_run_id"] for run in since["results"]] == ["listed-run-4", "listed-run-3"]
+    assert client.get("/results", params={"fields": "no_such_field"}).status_code == 400
+    assert client.get("/results", params={"cursor": "not-a-cursor"}).status_code == 400
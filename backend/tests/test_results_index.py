@@ -0,0 +1,131 @@
+import sqlite3
+
+import pytest
+
+from utils import results_index as results_index_module
+from utils.results_index import ResultsIndex
+from utils.stats import StatsStore, run_scope
+
+
+def record(index, status="completed", tags=("jailbreak",), execution_time=1.0):
+    return {"id": f"p{index}", "status": status, "tags": list(tags), "execution_time": execution_time,
+            "timestamp": "2025-07-02T15:20:02"}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ResultsIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def test_buffered_results_are_written_in_one_batch(index):
+    stats = StatsStore(index.conn, index.lock)
+    etag = index.etag()
+    for number in range(3):
+        index.buffer_result("run-1", number, record(number))
+        stats.add("run-1", "http://target", record(number))
+    # Statistics are live before the batch is written, the index is not
+    assert stats.summary(run_scope("run-1"))["total"] == 3
+    assert index.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+    pending, rows = index.take_pending(), stats.take_dirty()
+    assert len(pending) == 3 and index.pending == []
+    assert sorted(scope for scope, _ in rows) == ["global", "run:run-1", "target:http://target"]
+    index.write_results(pending)
+    stats.write(rows)
+    assert index.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 3
+    assert index.conn.execute("SELECT COUNT(*) FROM result_tags").fetchone()[0] == 3
+    assert index.etag() != etag
+    assert stats.take_dirty() == []
+
+    # The written aggregates are what a restart loads
+    reloaded = StatsStore(index.conn, index.lock)
+    assert reloaded.summary(run_scope("run-1"))["status_counts"] == {"completed": 3}
+
+
+def test_flush_is_due_by_size_or_age(index, monkeypatch):
+    assert not index.flush_due()
+    index.buffer_result("run-1", 0, record(0))
+    assert not index.flush_due()
+    monkeypatch.setattr(results_index_module, "FLUSH_INTERVAL_SECONDS", 0)
+    assert index.flush_due()
+    index.take_pending()
+    monkeypatch.setattr(results_index_module, "FLUSH_INTERVAL_SECONDS", 3600)
+    monkeypatch.setattr(results_index_module, "FLUSH_BATCH_SIZE", 2)
+    index.buffer_result("run-1", 1, record(1))
+    assert not index.flush_due()
+    index.buffer_result("run-1", 2, record(2))
+    assert index.flush_due()
+
+
+def add_runs(index, count, timestamp=lambda number: f"2025-07-{number % 28 + 1:02d}T10:00:00"):
+    for number in range(count):
+        index.upsert_run({
+            "test_run_id": f"run-{number:03d}", "target_url": f"http://target-{number % 2}",
+            "timestamp": timestamp(number), "status": "completed" if number % 3 else "error",
+            "total_prompts": 1, "successful_tests": 1, "failed_tests": 0,
+        })
+
+
+def all_pages(index, **filters):
+    seen, cursor = [], None
+    while True:
+        page = index.list_runs(cursor=cursor, limit=7, **filters)
+        seen += [run["test_run_id"] for run in page["results"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen, page["total_runs"]
+
+
+def test_pages_cover_every_run_once_newest_first(index):
+    add_runs(index, 40)
+    seen, total = all_pages(index)
+    assert total == 40 and sorted(seen) == [f"run-{number:03d}" for number in range(40)]
+    first = index.list_runs(limit=40)["results"]
+    assert [run["timestamp"] for run in first] == sorted((run["timestamp"] for run in first), reverse=True)
+
+
+def test_runs_without_timestamp_do_not_break_the_cursor(index):
+    add_runs(index, 30, timestamp=lambda number: None if number % 4 == 0 else f"2025-07-01T10:{number:02d}:00")
+    index.upsert_run({"test_run_id": "created", "timestamp": None, "created_at": "2025-06-01T00:00:00"})
+    seen, total = all_pages(index)
+    assert total == 31
+    assert len(seen) == len(set(seen)) == 31
+    # A run without a timestamp sorts by when it was created
+    assert seen.index("created") < seen.index("run-000")
+
+
+def test_filters(index):
+    add_runs(index, 12)
+    index.write_results([("run-001", 0, record(0, status="timeout")), ("run-002", 0, record(0, tags=("pii",)))])
+    assert all_pages(index, status="error")[0] == ["run-009", "run-006", "run-003", "run-000"]
+    assert all_pages(index, result_status="timeout")[0] == ["run-001"]
+    assert all_pages(index, tag="pii")[0] == ["run-002"]
+    assert set(all_pages(index, target_url="http://target-1")[0]) == {f"run-{n:03d}" for n in range(1, 12, 2)}
+    assert all_pages(index, since="2025-07-11", until="2025-07-12T23:59")[0] == ["run-011", "run-010"]
+
+
+def test_field_projection(index):
+    add_runs(index, 2)
+    assert index.list_runs(fields=["test_run_id", "status"])["results"][0] == {"test_run_id": "run-001", "status": "completed"}
+    with pytest.raises(ValueError):
+        index.list_runs(fields=["file_mtime"])
+    with pytest.raises(ValueError):
+        index.list_runs(cursor="not a cursor")
+
+
+def test_index_from_before_sort_keys_is_migrated(tmp_path):
+    path = str(tmp_path / "index.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE runs (test_run_id TEXT PRIMARY KEY, target_url TEXT, timestamp TEXT, status TEXT, "
+        "total_prompts INTEGER, successful_tests INTEGER, failed_tests INTEGER, error TEXT, file_mtime REAL);"
+        "CREATE INDEX runs_by_time ON runs (timestamp DESC, test_run_id DESC);"
+        "INSERT INTO runs (test_run_id, timestamp) VALUES ('a', '2025-07-01'), ('b', NULL), ('c', '2025-07-02');"
+    )
+    conn.commit()
+    conn.close()
+    index = ResultsIndex(path)
+    assert all_pages(index)[0] == ["c", "a", "b"]
+    index.close()
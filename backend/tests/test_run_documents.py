@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import time
+from email.utils import formatdate
+
+from fastapi.testclient import TestClient
+
+from utils.prompt_store import PromptStore
+from utils.run_documents import RunDocumentCache, RunFile, etag_matches
+from utils.run_storage import RUN_FILE_SUFFIX, write_run_file
+
+
+def write_run(results_dir, prompt_store, test_run_id: str, count: int = 3, status: str = "completed"):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{test_run_id}{RUN_FILE_SUFFIX}")
+    header = {"test_run_id": test_run_id, "target_url": "https://shop.example", "status": status, "total_prompts": count}
+    records = [
+        {"index": index, "id": f"p{index}", "prompt": f"prompt {index}", "response": "no", "status": "completed"}
+        for index in range(count)
+    ]
+    write_run_file(path, header, records, prompt_store)
+    return path
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", "abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_run_file_revalidation(tmp_path):
+    path = write_run(str(tmp_path), PromptStore(str(tmp_path / "prompts.db")), "run-1")
+    run_file = RunFile(path)
+    assert run_file.not_modified(run_file.etag, None)
+    assert not run_file.not_modified('"other"', None)
+    assert run_file.not_modified(None, run_file.last_modified)
+    assert not run_file.not_modified(None, formatdate(run_file.mtime - 60, usegmt=True))
+    assert not run_file.not_modified(None, "not a date")
+    # If-None-Match wins over If-Modified-Since
+    assert not run_file.not_modified('"other"', run_file.last_modified)
+    assert not run_file.not_modified(None, None)
+
+
+def test_bodies_are_served_from_memory_until_invalidated(tmp_path):
+    results_dir = str(tmp_path / "results")
+    prompt_store = PromptStore(str(tmp_path / "prompts.db"))
+    write_run(results_dir, prompt_store, "run-1")
+    documents = RunDocumentCache(prompt_store, results_dir)
+
+    async def fetch():
+        run_file = documents.run_file("run-1")
+        return run_file, await documents.body("run-1", run_file)
+
+    run_file, body = asyncio.run(fetch())
+    document = json.loads(body)
+    assert document["test_run_id"] == "run-1"
+    assert [result["prompt"] for result in document["results"]] == ["prompt 0", "prompt 1", "prompt 2"]
+    assert asyncio.run(fetch())[1] is body
+    assert documents.stats()["hits"] == 1 and documents.stats()["misses"] == 1
+
+    # Rewritten: the cached validators still answer until the run is invalidated
+    time.sleep(0.01)
+    write_run(results_dir, prompt_store, "run-1", count=1)
+    assert documents.run_file("run-1") is run_file
+    documents.invalidate("run-1")
+    fresh_file, fresh_body = asyncio.run(fetch())
+    assert fresh_file.etag != run_file.etag
+    assert len(json.loads(fresh_body)["results"]) == 1
+
+
+def test_bodies_are_evicted_past_the_memory_budget(tmp_path):
+    results_dir = str(tmp_path / "results")
+    prompt_store = PromptStore(str(tmp_path / "prompts.db"))
+    for test_run_id in ("run-1", "run-2", "run-3"):
+        write_run(results_dir, prompt_store, test_run_id, count=20)
+    documents = RunDocumentCache(prompt_store, results_dir)
+
+    async def fetch(test_run_id):
+        return await documents.body(test_run_id, documents.run_file(test_run_id))
+
+    size = len(asyncio.run(fetch("run-1")))
+    documents.max_bytes = size * 2
+    asyncio.run(fetch("run-2"))
+    asyncio.run(fetch("run-1"))
+    asyncio.run(fetch("run-3"))
+    # run-2 was the least recently used
+    assert list(documents.bodies) == ["run-1", "run-3"]
+    assert documents.size == sum(len(body) for _, body in documents.bodies.values())
+
+    documents.max_entry_bytes = size - 1
+    documents.invalidate("run-2")
+    asyncio.run(fetch("run-2"))
+    assert "run-2" not in documents.bodies
+
+
+def test_results_endpoints_answer_revalidation_with_304(api):
+    write_run("results", api.prompt_store, "etag-run")
+    api.run_documents.invalidate("etag-run")
+    api.results_index.sync_directory("results")
+    client = TestClient(api.app)
+
+    response = client.get("/results/etag-run")
+    assert response.status_code == 200
+    assert response.json()["test_run_id"] == "etag-run"
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    unchanged = client.get("/results/etag-run", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert client.get("/results/etag-run", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/results/etag-run", headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert client.get("/results/no-such-run").status_code == 404
+
+    listing = client.get("/results")
+    assert listing.status_code == 200
+    assert client.get("/results", headers={"If-None-Match": listing.headers["etag"]}).status_code == 304
+    # Indexing another run changes the listing's validator
+    write_run("results", api.prompt_store, "etag-run-2")
+    api.results_index.sync_directory("results")
+    assert client.get("/results", headers={"If-None-Match": listing.headers["etag"]}).status_code == 200
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import models
+from utils import run_events as run_events_module
+from utils.run_events import RunEventBroker
+from utils.run_log import RunLog, find_interrupted_runs, load_run_log
+
+
+def result(prompt_id: str, status=models.PromptStatus.completed) -> models.TestResult:
+    return models.TestResult(
+        id=prompt_id, prompt=f"prompt {prompt_id}", response="ok", status=status,
+        timestamp="2025-07-02T15:20:02", execution_time=1.0
+    )
+
+
+def test_results_are_read_back_in_input_order(tmp_path):
+    run_log = RunLog("run-1", str(tmp_path))
+    for index in (2, 0, 1):
+        record = run_log.append(index, result(f"p{index}"))
+        assert record["index"] == index
+    assert len(run_log) == 3
+    assert [record["id"] for record in run_log.iter_records()] == ["p0", "p1", "p2"]
+    assert run_log.completed_indices() == {0, 1, 2}
+
+
+def test_reopened_log_cuts_off_a_torn_final_line(tmp_path):
+    run_log = RunLog("run-1", str(tmp_path))
+    run_log.append(0, result("p0"))
+    run_log.append(1, result("p1", models.PromptStatus.failed))
+    with open(run_log.path, "ab") as f:
+        f.write(b'{"index": 2, "id": "p2", "sta')
+
+    reopened = load_run_log("run-1", str(tmp_path))
+    assert reopened.completed_indices() == {0, 1}
+    assert list(reopened.iter_statuses()) == ["completed", "failed"]
+    # Results appended after a crash still read back, also once the log is reopened again
+    reopened.append(2, result("p2"))
+    assert [record["index"] for record in reopened.iter_records()] == [0, 1, 2]
+    assert load_run_log("run-1", str(tmp_path)).completed_indices() == {0, 1, 2}
+
+
+def test_sync_is_batched(tmp_path):
+    run_log = RunLog("run-1", str(tmp_path))
+    run_log.append(0, result("p0"))
+    assert run_log.unsynced == 1
+    assert not run_log.sync_due()
+    run_log.last_sync -= 2
+    assert run_log.sync_due()
+    run_log.sync()
+    assert run_log.unsynced == 0
+    assert not run_log.sync_due()
+
+
+def test_manifest_updates_merge(tmp_path):
+    run_log = RunLog("run-1", str(tmp_path))
+    assert run_log.read_manifest() is None
+    run_log.update_manifest(status="running", total_prompts=3)
+    manifest = run_log.update_manifest(status="completed")
+    assert manifest["test_run_id"] == "run-1"
+    assert manifest["total_prompts"] == 3
+    with open(run_log.manifest_path) as f:
+        assert json.load(f)["status"] == "completed"
+
+
+def test_runs_left_running_are_found_as_interrupted(tmp_path):
+    RunLog("done", str(tmp_path)).update_manifest(status="completed")
+    RunLog("crashed", str(tmp_path)).update_manifest(status="running")
+    assert load_run_log("never-started", str(tmp_path)) is None
+    assert [run_log.test_run_id for run_log in find_interrupted_runs(str(tmp_path))] == ["crashed"]
+
+
+def test_subscriber_follows_a_run_to_the_end():
+    broker = RunEventBroker()
+
+    async def scenario():
+        broker.start("run-1", total_prompts=2, prior_statuses={"completed": 1})
+        events = []
+
+        async def follow():
+            async for event in broker.subscribe("run-1"):
+                events.append(event)
+
+        follower = asyncio.create_task(follow())
+        await asyncio.sleep(0)
+        broker.publish_result("run-1", {"index": 1, "status": "timeout"})
+        broker.finish("run-1", "completed")
+        await asyncio.wait_for(follower, 1)
+        return events
+
+    events = asyncio.run(scenario())
+    assert [event["event"] for event in events] == ["progress", "result", "done"]
+    assert events[0]["data"]["completed"] == 1
+    assert events[1]["data"]["result"]["index"] == 1
+    assert events[1]["data"]["progress"]["timeout_tests"] == 1
+    done = events[2]["data"]
+    assert (done["status"], done["completed"], done["successful_tests"], done["timeout_tests"]) == ("completed", 2, 1, 1)
+    assert broker._subscribers == {}
+
+
+def test_late_subscriber_gets_the_final_progress_at_once():
+    broker = RunEventBroker()
+
+    async def scenario():
+        broker.start("run-1", total_prompts=1)
+        broker.publish_result("run-1", {"index": 0, "status": "failed"})
+        broker.finish("run-1", "error", error="boom")
+        return [event async for event in broker.subscribe("run-1")]
+
+    events = asyncio.run(scenario())
+    assert [event["event"] for event in events] == ["progress", "done"]
+    assert events[1]["data"]["error"] == "boom"
+    assert events[1]["data"]["failed_tests"] == 1
+
+
+def test_idle_subscribers_get_keepalives():
+    broker = RunEventBroker()
+
+    async def scenario():
+        broker.queue("run-1", total_prompts=3)
+        stream = broker.subscribe("run-1", keepalive=0.01)
+        first = await stream.__anext__()
+        keepalive = await stream.__anext__()
+        await stream.aclose()
+        return first, keepalive
+
+    first, keepalive = asyncio.run(scenario())
+    assert first["data"]["status"] == "queued"
+    assert keepalive is None
+
+
+def test_slow_subscribers_miss_results_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(run_events_module, "SUBSCRIBER_BUFFER", 2)
+    broker = RunEventBroker()
+
+    async def scenario():
+        broker.start("run-1", total_prompts=5)
+        stream = broker.subscribe("run-1")
+        await stream.__anext__()
+        for index in range(5):
+            broker.publish_result("run-1", {"index": index, "status": "completed"})
+        received = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        return received
+
+    received = asyncio.run(scenario())
+    assert [event["data"]["result"]["index"] for event in received] == [0, 1]
+    assert broker.progress("run-1")["completed"] == 5
+
+
+def test_finished_progress_is_dropped_after_retention(monkeypatch):
+    monkeypatch.setattr(run_events_module, "FINISHED_RETENTION_SECONDS", 0.01)
+    broker = RunEventBroker()
+
+    async def scenario():
+        broker.start("run-1", total_prompts=1)
+        broker.finish("run-1", "completed")
+        assert broker.progress("run-1")["status"] == "completed"
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert broker.progress("run-1") is None
@@ -0,0 +1,29 @@
+import pytest
+
+import models
+from utils.test_runner import prompt_test_options
+
+
+@pytest.mark.parametrize("field", [
+    "max_timeout", "delay_between_prompts", "concurrency", "pacing", "cache_mode",
+    "reverify_after_days", "priority", "network", "execution", "record_timings",
+])
+def test_null_settings_take_their_defaults(field):
+    request = models.TestRunRequest(target_url="http://localhost", **{field: None})
+    assert getattr(request, field) == models.TestRunRequest.model_fields[field].get_default()
+
+
+def test_runner_options_from_nulls_are_usable():
+    request = models.TestRunRequest(
+        target_url="http://localhost", concurrency=None, delay_between_prompts=None,
+        cache_mode="reverify", reverify_after_days=None
+    )
+    options = prompt_test_options(request)
+    assert options["concurrency"] == 1
+    assert options["delay_between_prompts"] == 2
+    assert options["cache_max_age"] == 7 * 86400
+
+
+def test_invalid_settings_are_still_rejected():
+    with pytest.raises(ValueError):
+        models.TestRunRequest(target_url="http://localhost", concurrency=0)
@@ -0,0 +1,45 @@
+import os
+import uuid
+
+import pytest
+
+from utils.screenshots import ScreenshotStore
+
+RUN_ID = str(uuid.uuid4())
+
+
+@pytest.fixture
+def store(tmp_path):
+    screenshots = tmp_path / "screenshots"
+    (screenshots / RUN_ID).mkdir(parents=True)
+    (screenshots / RUN_ID / "prompt-1_20250702_152002_502538.jpg").write_bytes(b"jpeg")
+    (tmp_path / "main.py").write_text("secret")
+    (screenshots / RUN_ID / "notes.txt").write_text("secret")
+    return ScreenshotStore(path=str(screenshots))
+
+
+def test_serves_stored_screenshot(store):
+    path = store.file_path(RUN_ID, "prompt-1_20250702_152002_502538.jpg")
+    assert path is not None and open(path, "rb").read() == b"jpeg"
+
+
+@pytest.mark.parametrize("test_run_id", ["..", ".", "../screenshots", "not-a-run", "", RUN_ID + "/.."])
+def test_rejects_run_ids_that_are_not_runs(store, test_run_id):
+    assert store.file_path(test_run_id, "main.py") is None
+    assert store.file_path(test_run_id, "prompt-1_20250702_152002_502538.jpg") is None
+
+
+@pytest.mark.parametrize("filename", ["..", "../../main.py", "notes.txt", "main.py", "a/b.jpg", ".jpg", "x.png"])
+def test_rejects_file_names_store_does_not_generate(store, filename):
+    assert store.file_path(RUN_ID, filename) is None
+
+
+def test_rejects_symlinks_out_of_the_run_directory(store, tmp_path):
+    os.symlink(tmp_path / "main.py", os.path.join(store.path, RUN_ID, "link.jpg"))
+    assert store.file_path(RUN_ID, "link.jpg") is None
+
+
+def test_stats_of_unknown_run_do_not_create_its_directory(store):
+    other = str(uuid.uuid4())
+    assert store.finish_run(other)["saved"] == 0
+    assert not os.path.exists(os.path.join(store.path, other))
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import models
+from utils import selector_cache as selector_cache_module
+from utils.selector_cache import ENTER_KEY, SelectorCache
+from utils.test_runner import ChatWidgetTester
+
+ORIGIN = "https://widget.example"
+
+
+class FakeFrame:
+    class page:
+        url = ORIGIN + "/chat"
+
+
+class FakeIframeElement:
+    async def content_frame(self):
+        return FakeFrame()
+
+
+class FakePage:
+    url = "https://shop.example/"
+
+
+def test_selectors_survive_a_reload(tmp_path):
+    path = str(tmp_path / "selectors.json")
+    cache = SelectorCache(path)
+    cache.record(ORIGIN, "input", "textarea")
+    cache.record(ORIGIN, "send", ENTER_KEY)
+
+    reloaded = SelectorCache(path)
+    assert reloaded.get(ORIGIN, "input") == "textarea"
+    assert reloaded.get(ORIGIN, "send") == ENTER_KEY
+
+
+def test_changes_inside_the_event_loop_are_saved_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(selector_cache_module, "SAVE_DELAY_SECONDS", 0.05)
+    path = tmp_path / "selectors.json"
+    cache = SelectorCache(str(path))
+    writes = []
+    write = cache._write
+    monkeypatch.setattr(cache, "_write", lambda data: (writes.append(data), write(data)))
+
+    async def burst():
+        for index in range(20):
+            cache.record(f"https://site-{index}.example", "input", "textarea")
+        assert not path.exists()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(burst())
+    assert len(writes) == 1
+    assert len(json.loads(path.read_text())) == 20
+
+
+def test_save_writes_a_pending_change_immediately(tmp_path, monkeypatch):
+    monkeypatch.setattr(selector_cache_module, "SAVE_DELAY_SECONDS", 60)
+    path = tmp_path / "selectors.json"
+    cache = SelectorCache(str(path))
+
+    async def record_then_shut_down():
+        cache.record(ORIGIN, "input", "textarea")
+        cache.save()
+
+    asyncio.run(record_then_shut_down())
+    assert json.loads(path.read_text()) == {ORIGIN: {"input": "textarea"}}
+    assert cache._save_handle is None
+
+
+def test_enter_sentinel_expires(monkeypatch):
+    cache = SelectorCache(path=None)
+    cache.record(ORIGIN, "send", ENTER_KEY)
+    assert cache.get(ORIGIN, "send") == ENTER_KEY
+
+    monkeypatch.setattr(selector_cache_module, "ENTER_KEY_TTL_SECONDS", 0)
+    assert cache.get(ORIGIN, "send") is None
+    assert cache.invalidations == 1
+    # Other slots are not affected by the sentinel's lifetime
+    cache.record(ORIGIN, "input", "textarea")
+    assert cache.get(ORIGIN, "input") == "textarea"
+
+
+def run_prompt(cache: SelectorCache, response_error: BaseException = None) -> models.TestResult:
+    tester = ChatWidgetTester(selector_cache=cache)
+
+    async def find_chat_iframe(page):
+        return FakeIframeElement()
+
+    async def send_prompt_to_widget(iframe, prompt, timer):
+        cache.record(ORIGIN, "send", ENTER_KEY)
+        return "fill"
+
+    async def capture_response(iframe, timer):
+        if response_error:
+            raise response_error
+        return "Hello!"
+
+    tester.find_chat_iframe = find_chat_iframe
+    tester.send_prompt_to_widget = send_prompt_to_widget
+    tester.capture_response = capture_response
+    prompt = models.PromptData(id="p1", prompt="hi")
+    return asyncio.run(tester.test_single_prompt(FakePage(), prompt, FakePage.url, screenshot_on_failure=False))
+
+
+def test_enter_sentinel_is_kept_while_enter_gets_responses():
+    cache = SelectorCache(path=None)
+    result = run_prompt(cache)
+    assert result.status == models.PromptStatus.completed
+    assert cache.peek(ORIGIN, "send") == ENTER_KEY
+
+
+def test_enter_sentinel_is_dropped_when_enter_gets_no_response():
+    cache = SelectorCache(path=None)
+    result = run_prompt(cache, Exception("No response captured from chat widget"))
+    assert result.status == models.PromptStatus.failed
+    assert cache.peek(ORIGIN, "send") is None
+
+    cache = SelectorCache(path=None)
+    result = run_prompt(cache, asyncio.TimeoutError())
+    assert result.status == models.PromptStatus.timeout
+    assert cache.peek(ORIGIN, "send") is None
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from utils.results_index import ResultsIndex
+from utils.stats import QuantileSketch, StatsStore, run_scope, target_scope
+
+
+@pytest.mark.parametrize("distribution", [
+    lambda rng: rng.uniform(0.2, 5),
+    lambda rng: rng.lognormvariate(0, 1),
+    lambda rng: rng.expovariate(0.5),
+])
+def test_sketch_quantiles_are_within_relative_accuracy(distribution):
+    rng = random.Random(7)
+    values = sorted(distribution(rng) for _ in range(20000))
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact
+
+
+def test_sketch_round_trips_and_handles_tiny_values():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0.0, 0.0005, 1.0, 2.0):
+        sketch.add(value)
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert restored.count == 4 and restored.quantile(0.25) == 0.0
+    assert restored.quantile(0.99) == sketch.quantile(0.99)
+
+
+def result(index, status="completed", execution_time=1.0, tags=("jailbreak",)):
+    return {"id": f"p{index}", "status": status, "execution_time": execution_time, "tags": list(tags)}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ResultsIndex(str(tmp_path / "index.db"))
+    index.upsert_run({"test_run_id": "run-1", "target_url": "http://target", "timestamp": "2025-07-01"})
+    yield index
+    index.close()
+
+
+def land(index, stats, records):
+    """Index and count results the way a running run does."""
+    for number, record in records:
+        index.buffer_result("run-1", number, record)
+        stats.add("run-1", "http://target", record)
+    with index.lock:
+        index.write_results(index.take_pending(), commit=False)
+        stats.write(stats.take_dirty())
+
+
+def test_scopes_aggregate_counts_tags_and_latency(index):
+    stats = StatsStore(index.conn, index.lock)
+    land(index, stats, [(0, result(0)), (1, result(1, "failed", 3.0, ("pii",)))])
+    summary = stats.summary(run_scope("run-1"))
+    assert summary["status_counts"] == {"completed": 1, "failed": 1}
+    assert summary["success_rate"] == 0.5
+    assert summary["tag_counts"] == {"jailbreak": 1, "pii": 1}
+    assert summary["execution_time"]["mean"] == 2.0
+    assert stats.targets()["http://target"]["total"] == 2
+    assert stats.summary(target_scope("http://elsewhere")) is None
+
+
+def test_retry_with_the_same_count_rebuilds(index):
+    stats = StatsStore(index.conn, index.lock)
+    land(index, stats, [(0, result(0)), (1, result(1, "failed"))])
+    stats.rebuild_if_stale()
+
+    # A retry replaces the failed result; the run still has two results
+    index.bump_generation("run-1")
+    land(index, stats, [(1, result(1))])
+    assert stats.summary()["total"] == 3
+    stats.rebuild_if_stale()
+    assert stats.summary()["total"] == 2
+    assert stats.summary(run_scope("run-1"))["status_counts"] == {"completed": 2}
+
+    # Rebuilt aggregates are up to date, and the next check leaves them alone
+    land(index, stats, [(2, result(2))])
+    stats.aggregates["global"].tag_counts["marker"] = 1
+    stats.rebuild_if_stale()
+    assert stats.summary()["total"] == 3
+    assert "marker" in stats.summary()["tag_counts"]
+
+
+def test_reindexed_run_file_rebuilds(index, tmp_path):
+    stats = StatsStore(index.conn, index.lock)
+    land(index, stats, [(0, result(0, "failed"))])
+    stats.rebuild_if_stale()
+    index.write_results([("run-1", 0, result(0))])
+    index.bump_generation("run-1")
+    stats.rebuild_if_stale()
+    assert stats.summary()["status_counts"] == {"completed": 1}
+    # The rebuilt statistics are what a restart loads
+    assert StatsStore(index.conn, index.lock).summary()["status_counts"] == {"completed": 1}
+
+
+def test_results_indexed_before_statistics_are_counted(index):
+    index.write_results([("run-1", number, result(number)) for number in range(3)])
+    stats = StatsStore(index.conn, index.lock)
+    stats.rebuild_if_stale()
+    assert stats.summary(target_scope("http://target"))["total"] == 3
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from utils import timing
+from utils.timing import NULL_TIMER, PhaseTimer, TimingSummary, perf_counter_of, phase_timer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(timing.time, "perf_counter", fake)
+    return fake
+
+
+def test_phases_are_consecutive(clock):
+    timer = PhaseTimer()
+    timer.begin("goto")
+    clock.now += 1.5
+    timer.begin("iframe_resolve")
+    clock.now += 0.25
+    timer.begin("goto")
+    clock.now += 0.5
+    timer.end()
+    clock.now += 10
+    # Time after end() belongs to no phase
+    assert timer.snapshot() == {"goto": 2.0, "iframe_resolve": 0.25}
+
+
+def test_a_phase_can_start_at_an_earlier_reading(clock):
+    timer = PhaseTimer()
+    timer.begin("first_response")
+    clock.now += 2
+    # The first token arrived 0.5s ago, as reported by the browser
+    timer.begin("settle", at=clock.now - 0.5)
+    clock.now += 1
+    timer.end()
+    assert timer.snapshot() == {"first_response": 1.5, "settle": 1.5}
+
+
+def test_a_reading_outside_the_current_phase_is_clamped(clock):
+    timer = PhaseTimer()
+    timer.begin("first_response")
+    clock.now += 1
+    timer.begin("settle", at=50.0)
+    timer.begin("screenshot", at=clock.now + 5)
+    timer.end()
+    assert timer.snapshot() == {"first_response": 0.0, "settle": 1.0, "screenshot": 0.0}
+
+
+def test_perf_counter_of_maps_epoch_timestamps():
+    then = time.time() - 2
+    assert perf_counter_of(then) == pytest.approx(time.perf_counter() - 2, abs=0.05)
+
+
+def test_disabled_timings_cost_nothing():
+    assert phase_timer(False) is NULL_TIMER
+    NULL_TIMER.begin("goto")
+    NULL_TIMER.end()
+    assert NULL_TIMER.snapshot() is None
+    assert isinstance(phase_timer(True), PhaseTimer)
+
+
+def test_summary_orders_phases_and_computes_shares():
+    summary = TimingSummary()
+    summary.add({"first_response": 3.0, "goto": 1.0})
+    summary.add({"first_response": 1.0, "custom": 0.0})
+    summary.add(None)
+    snapshot = summary.snapshot()
+    assert snapshot["prompts"] == 2
+    assert list(snapshot["phases"]) == ["goto", "first_response", "custom"]
+    assert snapshot["phases"]["first_response"] == {"count": 2, "total": 4.0, "mean": 2.0, "max": 3.0, "share": 0.8}
+    assert snapshot["phases"]["goto"]["share"] == 0.2
+    assert TimingSummary().snapshot() == {"prompts": 0, "phases": {}}
@@ -0,0 +1,225 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+from benchmarks.mock_chat_server import MockChatServer, MockSettings, counters
+from utils import work_queue as work_queue_module
+from utils.work_queue import HTTPWorkQueue, SQLiteWorkQueue, open_work_queue
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def items(start: int, count: int):
+    return [(index, {"id": f"p{index}", "prompt": f"prompt {index}"}) for index in range(start, start + count)]
+
+
+def test_expired_lease_is_redelivered_until_attempts_run_out(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    queue.enqueue("run-1", {}, [items(0, 3)])
+
+    first = queue.lease("worker-a", lease_seconds=0.2)
+    assert first["attempt"] == 1
+    assert queue.lease("worker-b", lease_seconds=0.2) is None
+    queue.report("run-1", 0, {"status": "completed"})
+
+    # worker-a stops renewing; its batch goes to worker-b without the reported prompt
+    time.sleep(0.3)
+    second = queue.lease("worker-b", lease_seconds=0.2)
+    assert second["batch_id"] == first["batch_id"]
+    assert second["attempt"] == 2
+    assert [index for index, _ in second["items"]] == [1, 2]
+    assert not queue.renew(first["batch_id"], "worker-a", 0.2)
+
+    time.sleep(0.3)
+    assert queue.lease("worker-c", lease_seconds=0.2) is None
+    status = queue.run_status("run-1")
+    assert status["batches"] == {"failed": 1}
+    assert len(status["failed_items"]) == 3
+
+
+def test_concurrent_leases_never_share_a_batch(tmp_path):
+    path = str(tmp_path / "queue.db")
+    SQLiteWorkQueue(path).enqueue("run-1", {}, [items(index, 1) for index in range(40)])
+    # One queue per worker, as separate processes would have
+    queues = [SQLiteWorkQueue(path) for _ in range(4)]
+
+    def drain(position):
+        leased = []
+        while True:
+            batch = queues[position].lease(f"worker-{position}", lease_seconds=60)
+            if batch is None:
+                return leased
+            leased.append(batch["batch_id"])
+
+    with ThreadPoolExecutor(4) as pool:
+        leased = [batch_id for batches in pool.map(drain, range(4)) for batch_id in batches]
+    assert len(leased) == 40
+    assert len(set(leased)) == 40
+
+
+def test_http_scheme_opens_the_api_queue(monkeypatch):
+    monkeypatch.setenv(work_queue_module.WORKER_TOKEN_ENV, "secret")
+    queue = open_work_queue("http://api-host:8000/work-queue/")
+    assert isinstance(queue, HTTPWorkQueue)
+    assert queue.base_url == "http://api-host:8000/work-queue"
+    assert queue.client.headers["authorization"] == "Bearer secret"
+    with pytest.raises(NotImplementedError):
+        queue.enqueue("run-1", {}, [])
+
+
+def test_lease_endpoints(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "work_queue", SQLiteWorkQueue(str(tmp_path / "queue.db")))
+    api.work_queue.enqueue("run-1", {"target_url": "http://target"}, [items(0, 2)])
+    client = TestClient(api.app)
+
+    batch = client.post("/work-queue/lease", json={"worker_id": "w1", "lease_seconds": 30}).json()["batch"]
+    assert batch["test_run_id"] == "run-1"
+    assert batch["items"] == [list(item) for item in items(0, 2)]
+    assert client.post("/work-queue/lease", json={"worker_id": "w2", "lease_seconds": 30}).json() == {"batch": None}
+
+    renew = f"/work-queue/batches/{batch['batch_id']}/renew"
+    assert client.post(renew, json={"worker_id": "w1", "lease_seconds": 30}).json() == {"renewed": True}
+    assert client.post(renew, json={"worker_id": "w2", "lease_seconds": 30}).json() == {"renewed": False}
+
+    for index in (0, 1):
+        response = client.post("/work-queue/runs/run-1/results", json={"index": index, "result": {"status": "completed"}})
+        assert response.status_code == 200
+    client.post(f"/work-queue/batches/{batch['batch_id']}/complete", json={"worker_id": "w1"})
+    assert api.work_queue.run_status("run-1")["batches"] == {"done": 1}
+    assert [index for _, index, _ in api.work_queue.fetch_results("run-1")] == [0, 1]
+
+    assert client.post("/work-queue/lease", json={"worker_id": "w1", "lease_seconds": 0}).status_code == 422
+
+
+def test_lease_endpoints_require_the_worker_token(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "work_queue", SQLiteWorkQueue(str(tmp_path / "queue.db")))
+    monkeypatch.setattr(api, "WORKER_TOKEN", "secret")
+    client = TestClient(api.app)
+    payload = {"worker_id": "w1", "lease_seconds": 30}
+
+    assert client.post("/work-queue/lease", json=payload).status_code == 401
+    wrong = {"Authorization": "Bearer nope"}
+    assert client.post("/work-queue/lease", json=payload, headers=wrong).status_code == 401
+    right = {"Authorization": "Bearer secret"}
+    assert client.post("/work-queue/lease", json=payload, headers=right).json() == {"batch": None}
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class Process:
+    """A backend process whose log lines are collected as it runs."""
+
+    def __init__(self, args, cwd, env):
+        self.lines = []
+        self.process = subprocess.Popen(
+            [sys.executable, *args], cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.lines.append(line)
+
+    def wait_for(self, text: str, timeout: float = 60):
+        deadline = time.time() + timeout
+        while not any(text in line for line in self.lines):
+            if time.time() > deadline or self.process.poll() is not None:
+                raise AssertionError(f"Never logged {text!r}:\n{''.join(self.lines)}")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def test_two_workers_on_other_hosts_never_run_the_same_batch(tmp_path):
+    api_dir, worker_dir = tmp_path / "api", tmp_path / "worker"
+    api_dir.mkdir()
+    (worker_dir / "cache").mkdir(parents=True)
+    site = {"latency_ms": 100, "stream_ms": 0}
+    api_port, site_port = free_port(), free_port()
+    env = dict(
+        os.environ, PYTHONPATH=BACKEND_DIR, REDPROMPT_EXECUTION_MODE="remote",
+        REDPROMPT_WORK_QUEUE="sqlite:///runs/work_queue.db", REDPROMPT_WORKER_TOKEN="secret"
+    )
+    processes = []
+    with MockChatServer(port=site_port) as server:
+        # The workers replay the mock widget's exchange directly, so they need no browser
+        target_url = server.url(**site)
+        template = {
+            "transport": "http",
+            "url": f"http://127.0.0.1:{site_port}/api/chat?" + urlencode(MockSettings(**site).dict()),
+            "method": "POST",
+            "headers": {"content-type": "application/json"},
+            "body": '{"message": "{{redprompt:prompt}}"}',
+            "encoding": "json",
+            "response": {"path": ["delta"], "join": "concat", "format": "sse"},
+            "recorded_at": time.time(),
+        }
+        (worker_dir / "cache" / "protocols.json").write_text(json.dumps({f"http://127.0.0.1:{site_port}": template}))
+        try:
+            api = Process(["-m", "uvicorn", "main:app", "--port", str(api_port)], api_dir, env)
+            processes.append(api)
+            api.wait_for("Application startup complete")
+            for name in ("worker-1", "worker-2"):
+                worker = Process([
+                    os.path.join(BACKEND_DIR, "worker.py"), "--worker-id", name, "--poll-interval", "0.1",
+                    "--queue", f"http://127.0.0.1:{api_port}/work-queue"
+                ], worker_dir, env)
+                processes.append(worker)
+            for worker in processes[1:]:
+                worker.wait_for("waiting for work")
+
+            # Enqueued the way the API does, on the queue file the API serves
+            queue = SQLiteWorkQueue(str(api_dir / "runs" / "work_queue.db"))
+            config = models.TestRunRequest(
+                target_url=target_url, execution="direct", pacing="fixed", delay_between_prompts=0
+            ).dict()
+            prompt_count = 36
+            requests_before = counters["requests"]
+            queue.enqueue("run-1", config, [items(start, 3) for start in range(0, prompt_count, 3)])
+
+            deadline = time.time() + 120
+            while queue.run_status("run-1")["batches"] != {"done": 12}:
+                assert time.time() < deadline, queue.run_status("run-1")
+                time.sleep(0.1)
+
+            batches = queue.conn.execute("SELECT attempts, worker_id FROM batches").fetchall()
+            assert all(attempts == 1 for attempts, _ in batches)
+            assert {worker_id for _, worker_id in batches} == {"worker-1", "worker-2"}
+            # Each prompt reached the target exactly once: no batch ran on both workers
+            assert counters["requests"] - requests_before == prompt_count
+            results = queue.fetch_results("run-1")
+            assert sorted(index for _, index, _ in results) == list(range(prompt_count))
+            assert all(result["status"] == "completed" and result["execution"] == "direct" for _, _, result in results)
+        finally:
+            for process in processes:
+                process.stop()
+
+
+def test_unreachable_api_is_an_empty_queue(monkeypatch):
+    monkeypatch.setattr(work_queue_module, "HTTP_RETRY_SECONDS", 0)
+    queue = HTTPWorkQueue(f"http://127.0.0.1:{free_port()}/work-queue", timeout=1)
+    assert queue.lease("w1", 30) is None
+    assert queue.renew(1, "w1", 30) is True
+    queue.complete(1, "w1")
+    with pytest.raises(httpx.TransportError):
+        queue.report("run-1", 0, {"status": "completed"})
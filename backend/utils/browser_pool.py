@@ -0,0 +1,244 @@
+import asyncio
+import itertools
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext
+
+logger = logging.getLogger(__name__)
+
+BROWSER_ARGS = ['--no-sandbox', '--disable-dev-shm-usage']
+
+# Chromium RSS is sampled (by scanning /proc) at most this often
+RSS_SAMPLE_SECONDS = 5.0
+
+
+def process_tree_rss(pid: int, include_root: bool = True) -> Optional[int]:
+    """Resident memory in bytes of ``pid``'s descendants (and ``pid`` itself), or None without /proc."""
+    if not os.path.isdir("/proc"):
+        return None
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm", "r") as f:
+                rss_pages[int(entry)] = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        # The command name may contain spaces, so split after its closing parenthesis
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        if current != pid or include_root:
+            total += rss_pages.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total * os.sysconf("SC_PAGE_SIZE")
+
+
+class PooledBrowser:
+    """One pooled Chromium instance and its usage counters."""
+
+    _ids = itertools.count()
+
+    def __init__(self, browser: Browser):
+        self.id = next(self._ids)
+        self.browser = browser
+        self.created_at = time.time()
+        self.contexts_created = 0
+        self.active_leases = 0
+        self.retiring = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "connected": self.browser.is_connected(),
+            "active_leases": self.active_leases,
+            "contexts_created": self.contexts_created,
+            "age_seconds": round(time.time() - self.created_at, 1),
+            "retiring": self.retiring,
+        }
+
+
+class BrowserLease:
+    """A pooled browser borrowed by one test run; create contexts through it."""
+
+    def __init__(self, pool: "BrowserPool", pooled: PooledBrowser):
+        self.pool = pool
+        self.pooled = pooled
+        self.browser = pooled.browser
+
+    async def new_context(self, **kwargs: Any) -> BrowserContext:
+        self.pooled.contexts_created += 1
+        return await self.browser.new_context(**kwargs)
+
+    async def release(self):
+        await self.pool.release(self)
+
+
+class BrowserPool:
+    """Long-lived Chromium browsers shared by all test runs in this process.
+
+    Runs borrow the least busy healthy browser and create their own isolated
+    contexts in it, so no run pays for starting Playwright or Chromium. A
+    browser is retired (and replaced with a fresh one) once it has created
+    ``max_contexts_per_browser`` contexts, when it disconnects, or when the
+    pool's Chromium processes exceed ``max_rss_mb`` in total; it is closed
+    once the runs still using it release it. This is checked when a browser
+    is borrowed and again when it is released, since memory grows while a
+    run uses it.
+
+    Memory use is sampled in a worker thread, at most every
+    ``RSS_SAMPLE_SECONDS`` on acquire and afresh on release, and ``rss_mb``
+    returns the last sample, so reading it never scans /proc on the event loop.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_contexts_per_browser: int = 500,
+        max_rss_mb: Optional[float] = 4096,
+        headless: bool = True
+    ):
+        self.size = size
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_rss_mb = max_rss_mb
+        self.headless = headless
+        self.playwright = None
+        self.browsers: List[PooledBrowser] = []
+        self.retiring: List[PooledBrowser] = []
+        self.recycled = 0
+        self.leases = 0
+        self._lock = asyncio.Lock()
+        self._rss_mb: Optional[float] = None
+        self._rss_sampled_at = 0.0
+        self._rss_sampling: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return bool(self.browsers)
+
+    async def start(self):
+        """Start Playwright and launch the pool's browsers."""
+        async with self._lock:
+            await self._start()
+
+    async def _start(self):
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        if len(self.browsers) < self.size:
+            while len(self.browsers) < self.size:
+                self.browsers.append(await self._launch())
+            logger.info(f"Browser pool ready with {len(self.browsers)} browser(s)")
+
+    async def stop(self):
+        """Close every browser, including ones still lent out, and stop Playwright."""
+        async with self._lock:
+            for pooled in self.browsers + self.retiring:
+                await self._close(pooled)
+            self.browsers, self.retiring = [], []
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+
+    async def acquire(self) -> BrowserLease:
+        """Borrow the least busy healthy browser, recycling worn-out ones first."""
+        await self.sample_rss()
+        async with self._lock:
+            await self._start()
+            await self._recycle()
+            pooled = min(self.browsers, key=lambda b: (b.active_leases, b.contexts_created))
+            pooled.active_leases += 1
+            self.leases += 1
+            return BrowserLease(self, pooled)
+
+    async def release(self, lease: BrowserLease):
+        """Return a browser, then recycle worn-out ones against a fresh memory sample."""
+        await self.sample_rss(max_age=0)
+        async with self._lock:
+            pooled = lease.pooled
+            pooled.active_leases -= 1
+            if pooled.retiring and pooled.active_leases == 0:
+                self.retiring.remove(pooled)
+                await self._close(pooled)
+            if self.started and self.playwright is not None:
+                await self._recycle()
+
+    async def _launch(self) -> PooledBrowser:
+        browser = await self.playwright.chromium.launch(headless=self.headless, args=BROWSER_ARGS)
+        return PooledBrowser(browser)
+
+    async def _close(self, pooled: PooledBrowser):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled browser {pooled.id}: {e}")
+
+    async def _recycle(self):
+        worn = [
+            pooled for pooled in self.browsers
+            if not pooled.browser.is_connected() or pooled.contexts_created >= self.max_contexts_per_browser
+        ]
+        rss_mb = self.rss_mb()
+        if not worn and self.max_rss_mb and rss_mb and rss_mb > self.max_rss_mb:
+            # Replace the browser that has done the most work, preferring an idle one,
+            # whose memory is freed now rather than when its runs finish
+            worn = [max(self.browsers, key=lambda b: (b.active_leases == 0, b.contexts_created))]
+            logger.info(f"Browser pool uses {rss_mb:.0f} MB (limit {self.max_rss_mb} MB)")
+            # The sample predates the recycle; the next decision takes a new one
+            self._rss_mb = None
+            self._rss_sampled_at = 0.0
+
+        for pooled in worn:
+            logger.info(f"Recycling browser {pooled.id} after {pooled.contexts_created} contexts")
+            self.browsers.remove(pooled)
+            self.recycled += 1
+            if pooled.active_leases:
+                pooled.retiring = True
+                self.retiring.append(pooled)
+            else:
+                await self._close(pooled)
+            self.browsers.append(await self._launch())
+
+    async def sample_rss(self, max_age: float = RSS_SAMPLE_SECONDS):
+        """Refresh ``rss_mb`` in a worker thread unless the last sample is younger than ``max_age``."""
+        if not self.started or time.monotonic() - self._rss_sampled_at < max_age:
+            return
+        if self._rss_sampling is None:
+            self._rss_sampling = asyncio.ensure_future(asyncio.to_thread(process_tree_rss, os.getpid(), False))
+        sampling = self._rss_sampling
+        try:
+            rss = await asyncio.shield(sampling)
+        finally:
+            if self._rss_sampling is sampling and sampling.done():
+                self._rss_sampling = None
+        self._rss_mb = rss / (1024 * 1024) if rss is not None else None
+        self._rss_sampled_at = time.monotonic()
+
+    def rss_mb(self) -> Optional[float]:
+        """Last sampled resident memory of this process's children: the Playwright driver and its browsers."""
+        return self._rss_mb
+
+    def snapshot(self) -> Dict[str, Any]:
+        busy = len([pooled for pooled in self.browsers if pooled.active_leases])
+        return {
+            "started": self.started,
+            "size": self.size,
+            "active_leases": sum(pooled.active_leases for pooled in self.browsers + self.retiring),
+            "utilization": busy / self.size if self.size else 0.0,
+            "total_leases": self.leases,
+            "recycled": self.recycled,
+            "max_contexts_per_browser": self.max_contexts_per_browser,
+            "max_rss_mb": self.max_rss_mb,
+            "rss_mb": self.rss_mb() if self.started else None,
+            "browsers": [pooled.snapshot() for pooled in self.browsers],
+            "retiring": [pooled.snapshot() for pooled in self.retiring],
+        }
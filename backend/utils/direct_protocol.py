@@ -0,0 +1,529 @@
+import asyncio
+import json
+import os
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, quote_plus, urlparse
+
+import httpx
+from playwright.async_api import Page, Request, WebSocket
+
+try:
+    import websockets
+except ImportError:  # optional: replaying widgets that talk over a WebSocket
+    websockets = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROTOCOL_CACHE_PATH = "cache/protocols.json"
+
+# Stands in for the prompt inside a recorded request body or WebSocket frame
+PROMPT_MARKER = "{{redprompt:prompt}}"
+
+# Recorded request headers that the replaying client sets itself
+UNREPLAYED_HEADERS = {
+    "host", "content-length", "connection", "keep-alive", "transfer-encoding", "accept-encoding",
+    "upgrade", "sec-websocket-key", "sec-websocket-version", "sec-websocket-extensions",
+}
+
+# Recorded headers that carry the session's credentials; they are replayed but never written to disk
+CREDENTIAL_HEADERS = {"cookie", "authorization", "proxy-authorization"}
+CREDENTIAL_HEADER_PREFIXES = ("x-csrf", "x-xsrf", "x-api-key", "x-auth")
+
+
+class ReplayError(Exception):
+    """A replayed exchange did not produce a usable reply."""
+
+
+def encode_prompt(prompt: str, encoding: str) -> str:
+    """Encode a prompt the way the widget encoded it in its request body."""
+    if encoding == "json":
+        return json.dumps(prompt, ensure_ascii=False)[1:-1]
+    if encoding == "json_ascii":
+        return json.dumps(prompt)[1:-1]
+    if encoding == "form":
+        return quote_plus(prompt)
+    if encoding == "url":
+        return quote(prompt, safe="")
+    return prompt
+
+
+def _encodings(content_type: str) -> List[str]:
+    if "x-www-form-urlencoded" in content_type:
+        return ["form", "url", "raw", "json", "json_ascii"]
+    return ["json", "json_ascii", "raw", "form", "url"]
+
+
+def template_body(body: str, prompt: str, content_type: str = "") -> Optional[Tuple[str, str]]:
+    """Replace the encoded prompt in a recorded body with the marker; returns (template, encoding)."""
+    for encoding in _encodings(content_type or ""):
+        encoded = encode_prompt(prompt, encoding)
+        if encoded and encoded in body:
+            return body.replace(encoded, PROMPT_MARKER), encoding
+    return None
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _string_paths(value: Any, path: Tuple = ()) -> Iterable[Tuple[Tuple, str]]:
+    """Every string inside a decoded JSON value, with the keys/indices leading to it."""
+    if isinstance(value, str):
+        yield path, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from _string_paths(item, path + (key,))
+    elif isinstance(value, list):
+        for position, item in enumerate(value):
+            # The reply is usually the newest message, so address it from the end
+            step = -1 if position == len(value) - 1 else position
+            yield from _string_paths(item, path + (step,))
+
+
+def extract_path(value: Any, path: Optional[List]) -> Optional[str]:
+    """Follow a recorded path into a decoded JSON value; None if it does not lead to a string."""
+    if path is None:
+        return value if isinstance(value, str) else None
+    for step in path:
+        if not isinstance(value, (dict, list)):
+            return None
+        try:
+            value = value[step]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value if isinstance(value, str) else None
+
+
+def find_reply_path(value: Any, reply: str) -> Optional[List]:
+    """Path to the string in ``value`` that holds the reply the widget displayed.
+
+    An exact match (ignoring whitespace) wins; otherwise the longest string
+    that contains, or is contained in, the displayed reply.
+    """
+    target = _normalize(reply)
+    best: Optional[Tuple[int, List]] = None
+    for path, text in _string_paths(value):
+        text = _normalize(text)
+        if not text:
+            continue
+        if text == target:
+            return list(path)
+        if len(text) >= 8 and (text in target or target in text):
+            if best is None or len(text) > best[0]:
+                best = (len(text), list(path))
+    return best[1] if best else None
+
+
+def _decode(payload: str) -> Any:
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return payload
+
+
+class SSEParser:
+    """Incremental ``text/event-stream`` parser that yields each event's data."""
+
+    def __init__(self):
+        self.data: List[str] = []
+
+    def feed(self, line: str) -> Optional[str]:
+        line = line.rstrip("\r")
+        if not line:
+            return self.flush()
+        if line.startswith("data:"):
+            self.data.append(line[5:].lstrip(" ") if line[5:6] == " " else line[5:])
+        return None
+
+    def flush(self) -> Optional[str]:
+        if not self.data:
+            return None
+        data, self.data = "\n".join(self.data), []
+        return data
+
+
+def parse_sse(text: str) -> List[str]:
+    parser = SSEParser()
+    events = [data for data in map(parser.feed, text.split("\n")) if data is not None]
+    last = parser.flush()
+    return events + [last] if last is not None else events
+
+
+class StreamJoiner:
+    """Assembles a reply from streamed payloads (SSE events or WebSocket frames)."""
+
+    def __init__(self, spec: Dict[str, Any], prompt: Optional[str] = None):
+        self.path = spec.get("path")
+        self.join = spec.get("join", "last")
+        self.prompt = _normalize(prompt) if prompt else None
+        self.parts: List[str] = []
+
+    def add(self, payload: str) -> bool:
+        """Take one payload; True if it carried reply text."""
+        text = extract_path(_decode(payload), self.path)
+        if not text or (self.prompt and _normalize(text) == self.prompt):
+            # Widgets often echo the user's own message back first
+            return False
+        self.parts.append(text)
+        return True
+
+    @property
+    def text(self) -> str:
+        if not self.parts:
+            return ""
+        return "".join(self.parts) if self.join == "concat" else self.parts[-1]
+
+
+def derive_stream_spec(payloads: List[str], reply: str) -> Optional[Dict[str, Any]]:
+    """How to rebuild the reply from a stream: one path, joined across payloads or taken from the last."""
+    decoded = [_decode(payload) for payload in payloads]
+    target = _normalize(reply)
+    paths: List[Optional[List]] = []
+    for value in decoded:
+        for path, _ in _string_paths(value):
+            if list(path) not in paths:
+                paths.append(list(path))
+
+    for path in paths:
+        parts = [text for text in (extract_path(value, path) for value in decoded) if text]
+        if parts and _normalize("".join(parts)) == target:
+            return {"path": path, "join": "concat"}
+    for value in reversed(decoded):
+        if isinstance(value, str):
+            if _normalize(value) == target:
+                return {"path": None, "join": "last"}
+            continue
+        path = find_reply_path(value, reply)
+        if path is not None:
+            return {"path": path, "join": "last"}
+    return None
+
+
+def derive_response_spec(body: str, content_type: str, reply: str) -> Optional[Dict[str, Any]]:
+    """Describe where the displayed reply sits in a recorded response body, or None."""
+    if "text/event-stream" in content_type:
+        spec = derive_stream_spec(parse_sse(body), reply)
+        return dict(spec, format="sse") if spec else None
+    value = _decode(body)
+    if not isinstance(value, str):
+        path = find_reply_path(value, reply)
+        return {"format": "json", "path": path} if path is not None else None
+    if _normalize(body) == _normalize(reply):
+        return {"format": "text"}
+    return None
+
+
+def extract_response(body: str, spec: Dict[str, Any], prompt: Optional[str] = None) -> str:
+    """Pull the reply out of a replayed (non-streaming) response body."""
+    if spec["format"] == "text":
+        return body.strip()
+    if spec["format"] == "sse":
+        joiner = StreamJoiner(spec, prompt)
+        for payload in parse_sse(body):
+            joiner.add(payload)
+        return joiner.text
+    return extract_path(_decode(body), spec["path"]) or ""
+
+
+def replay_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {
+        name: value for name, value in headers.items()
+        if not name.startswith(":") and name.lower() not in UNREPLAYED_HEADERS
+    }
+
+
+def is_credential_header(name: str) -> bool:
+    name = name.lower()
+    return name in CREDENTIAL_HEADERS or name.startswith(CREDENTIAL_HEADER_PREFIXES)
+
+
+def has_credentials(template: Dict[str, Any]) -> bool:
+    return any(is_credential_header(name) for name in template.get("headers", {}))
+
+
+class ProtocolRecorder:
+    """Watches a page's traffic while one prompt goes through the widget.
+
+    Afterwards ``derive`` turns the exchange that carried the prompt into a
+    replayable template: a POST (or similar) whose body contains the prompt
+    and whose response holds the reply, or a WebSocket frame containing the
+    prompt followed by frames holding the reply.
+    """
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.requests: List[Request] = []
+        self.sockets: List[Dict[str, Any]] = []
+
+    def attach(self, page: Page):
+        page.on("request", self._on_request)
+        page.on("websocket", self._on_websocket)
+
+    def _on_request(self, request: Request):
+        try:
+            body = request.post_data
+        except Exception:
+            # Binary bodies cannot carry a templated prompt
+            return
+        if body and template_body(body, self.prompt, request.headers.get("content-type", "")):
+            self.requests.append(request)
+
+    def _on_websocket(self, socket: WebSocket):
+        frames: List[Tuple[str, Any]] = []
+        self.sockets.append({"url": socket.url, "frames": frames})
+        socket.on("framesent", lambda payload: frames.append(("sent", payload)))
+        socket.on("framereceived", lambda payload: frames.append(("received", payload)))
+
+    async def derive(self, page: Page, reply: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Build a template from the recorded exchange, given the reply the widget displayed."""
+        if not reply:
+            return None
+        for request in self.requests:
+            try:
+                template = await self._derive_http(request, reply)
+            except Exception as e:
+                logger.debug(f"Could not template {request.url}: {e}")
+                continue
+            if template:
+                return template
+        for socket in self.sockets:
+            template = await self._derive_websocket(page, socket, reply)
+            if template:
+                return template
+        return None
+
+    async def _derive_http(self, request: Request, reply: str) -> Optional[Dict[str, Any]]:
+        response = await request.response()
+        if response is None or response.status >= 400:
+            return None
+        spec = derive_response_spec(await response.text(), response.headers.get("content-type", ""), reply)
+        if spec is None:
+            return None
+        body, encoding = template_body(request.post_data, self.prompt, request.headers.get("content-type", ""))
+        logger.info(f"Recorded {request.method} {request.url} as the widget's chat exchange ({spec['format']})")
+        return {
+            "transport": "http",
+            "url": request.url,
+            "method": request.method,
+            "headers": replay_headers(await request.all_headers()),
+            "body": body,
+            "encoding": encoding,
+            "response": spec,
+            "recorded_at": time.time(),
+        }
+
+    async def _derive_websocket(self, page: Page, socket: Dict[str, Any], reply: str) -> Optional[Dict[str, Any]]:
+        frames = [(direction, payload) for direction, payload in socket["frames"] if isinstance(payload, str)]
+        for position, (direction, payload) in enumerate(frames):
+            if direction != "sent":
+                continue
+            templated = template_body(payload, self.prompt)
+            if templated is None:
+                continue
+            received = [frame for kind, frame in frames[position + 1:] if kind == "received"]
+            spec = derive_stream_spec(received, reply)
+            if spec is None:
+                return None
+            parsed = urlparse(socket["url"])
+            http_origin = f"{'https' if parsed.scheme == 'wss' else 'http'}://{parsed.netloc}"
+            cookies = await page.context.cookies([http_origin])
+            headers = {"origin": http_origin}
+            if cookies:
+                headers["cookie"] = "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+            logger.info(f"Recorded WebSocket {socket['url']} as the widget's chat exchange")
+            return {
+                "transport": "websocket",
+                "url": socket["url"],
+                "headers": headers,
+                # Frames the widget sent before the prompt, e.g. to join a session
+                "preamble": [frame for kind, frame in frames[:position] if kind == "sent"],
+                "body": templated[0],
+                "encoding": templated[1],
+                "response": dict(spec, format="frames"),
+                "recorded_at": time.time(),
+            }
+        return None
+
+
+class DirectProtocolClient:
+    """Replays a recorded chat exchange with new prompts, without a browser.
+
+    HTTP exchanges share one pooled ``httpx.AsyncClient``; WebSocket exchanges
+    (which need the optional ``websockets`` package) open one connection per
+    prompt and read frames until the reply has been quiet for
+    ``settle_quiet_ms``.
+    """
+
+    def __init__(
+        self,
+        template: Dict[str, Any],
+        max_connections: int = 4,
+        timeout: float = 30,
+        settle_quiet_ms: int = 1000
+    ):
+        self.template = template
+        self.timeout = timeout
+        self.settle_quiet = settle_quiet_ms / 1000
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def _body(self, prompt: str) -> str:
+        return self.template["body"].replace(PROMPT_MARKER, encode_prompt(prompt, self.template["encoding"]))
+
+    async def send(self, prompt: str) -> Tuple[str, Optional[float], float]:
+        """Send one prompt; returns the reply, time to first token (if streamed) and response time."""
+        if self.template["transport"] == "websocket":
+            reply, first_token_time, response_time = await self._send_websocket(prompt)
+        else:
+            reply, first_token_time, response_time = await self._send_http(prompt)
+        if not reply:
+            raise ReplayError("Replayed exchange returned no reply")
+        return reply, first_token_time, response_time
+
+    async def _send_http(self, prompt: str) -> Tuple[str, Optional[float], float]:
+        template = self.template
+        spec = template["response"]
+        started = time.time()
+        async with self.http.stream(
+            template["method"], template["url"], headers=template["headers"], content=self._body(prompt).encode("utf-8")
+        ) as response:
+            response.raise_for_status()
+            if spec["format"] != "sse":
+                await response.aread()
+                return extract_response(response.text, spec, prompt), None, time.time() - started
+
+            # Stream events so the time to first token is measured
+            parser, joiner, first_token_time = SSEParser(), StreamJoiner(spec, prompt), None
+            async for line in response.aiter_lines():
+                data = parser.feed(line)
+                if data is not None and joiner.add(data) and first_token_time is None:
+                    first_token_time = time.time() - started
+            data = parser.flush()
+            if data is not None:
+                joiner.add(data)
+            return joiner.text, first_token_time, time.time() - started
+
+    async def _send_websocket(self, prompt: str) -> Tuple[str, Optional[float], float]:
+        if websockets is None:
+            raise ReplayError("Replaying a WebSocket widget needs the websockets package")
+        template = self.template
+        joiner, first_token_time, last_token_at = StreamJoiner(template["response"], prompt), None, None
+        started = time.time()
+        deadline = started + self.timeout
+        async with websockets.connect(
+            template["url"], extra_headers=template["headers"], open_timeout=self.timeout
+        ) as socket:
+            for frame in template["preamble"]:
+                await socket.send(frame)
+            await socket.send(self._body(prompt))
+            while True:
+                remaining = deadline - time.time()
+                wait = remaining if first_token_time is None else min(self.settle_quiet, remaining)
+                if wait <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(socket.recv(), wait)
+                except asyncio.TimeoutError:
+                    break
+                if isinstance(message, str) and joiner.add(message):
+                    last_token_at = time.time()
+                    if first_token_time is None:
+                        first_token_time = last_token_at - started
+        return joiner.text, first_token_time, (last_token_at or time.time()) - started
+
+
+class ProtocolStore:
+    """Recorded chat exchange templates by target origin, persisted like the selector cache.
+
+    Templates that replay the session's credentials (cookies, authorization
+    or CSRF/API-key headers) are kept in memory only, so they are recorded
+    again after a restart. A template is dropped when replaying it keeps
+    failing (session expired, per-message tokens, changed API), so the next
+    direct run records afresh.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_PROTOCOL_CACHE_PATH):
+        self.path = path
+        self.templates: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                # Files written before credentials were kept out of them may still hold some
+                self.templates = {
+                    origin: template for origin, template in data.items() if not has_credentials(template)
+                }
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable protocol cache {self.path}: {e}")
+
+    def save(self):
+        """Persist the templates atomically."""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            persisted = {
+                origin: template for origin, template in self.templates.items() if not has_credentials(template)
+            }
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(persisted, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save protocol cache: {e}")
+
+    def get(self, origin: str) -> Optional[Dict[str, Any]]:
+        return self.templates.get(origin)
+
+    def record(self, origin: str, template: Dict[str, Any]):
+        self.templates[origin] = template
+        self.save()
+
+    def invalidate(self, origin: str):
+        """Drop a template that no longer replays."""
+        if self.templates.pop(origin, None) is not None:
+            logger.info(f"Invalidated recorded chat exchange for {origin}")
+            self.save()
+
+    def clear(self, origin: Optional[str] = None):
+        """Forget templates for one origin, or for all of them."""
+        if origin is None:
+            self.templates = {}
+        else:
+            self.templates.pop(origin, None)
+        self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        # Headers are left out: they carry the recorded session's cookies
+        return {
+            "origins": len(self.templates),
+            "templates": {
+                origin: {
+                    "transport": template["transport"],
+                    "url": template["url"],
+                    "response_format": template["response"]["format"],
+                    "recorded_at": template["recorded_at"],
+                }
+                for origin, template in self.templates.items()
+            },
+        }
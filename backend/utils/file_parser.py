@@ -1,207 +1,395 @@
+import io
+import hashlib
 import json
 import csv
+import os
 import pandas as pd
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Callable, TextIO
 from models import PromptData, PromptStatus
+from utils.tagging import get_tagging_engine
+
+# Bytes read from disk at a time by the streaming parsers
+READ_CHUNK_SIZE = 64 * 1024
+
+# Prompts created and tagged together by iter_prompt_batches
+DEFAULT_BATCH_SIZE = 1000
+
+PROMPT_COLUMNS = ['prompt', 'prompts', 'text', 'message', 'query']
+TAG_COLUMNS = ['tags', 'tag', 'categories', 'category', 'labels', 'label']
+
+# Called with (records parsed so far, bytes read so far, total bytes)
+ProgressCallback = Callable[[int, int, int], None]
+
+RawPrompt = Tuple[str, List[str]]
 
 
 async def parse_prompts_file(file_path: str) -> List[PromptData]:
     """
-    Parse uploaded CSV or JSON file containing adversarial prompts.
+    Parse uploaded CSV, JSON or JSONL file containing adversarial prompts.
     
     Expected formats:
     - JSON: [{"prompt": "...", "tags": ["tag1", "tag2"]}, ...]
+    - JSONL: one prompt object (or string) per line
     - CSV: columns "prompt" (required), "tags" (optional, comma-separated)
+    
+    This loads every prompt into memory; use iter_prompt_batches for large files.
     """
     prompts = []
-    
-    if file_path.endswith('.json'):
-        prompts = await parse_json_file(file_path)
-    elif file_path.endswith('.csv'):
-        prompts = await parse_csv_file(file_path)
-    else:
-        raise ValueError("Unsupported file format. Only JSON and CSV are supported.")
-    
+    for batch in iter_prompt_batches(file_path):
+        prompts.extend(batch)
     return prompts
 
 
 async def parse_json_file(file_path: str) -> List[PromptData]:
     """Parse JSON file containing prompts."""
-    prompts = []
-    
     with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Handle different JSON structures
-    if isinstance(data, list):
+        return create_prompt_batch(list(iter_json_prompts(f)))
+
+
+async def parse_csv_file(file_path: str) -> List[PromptData]:
+    """Parse CSV file containing prompts."""
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        return create_prompt_batch(list(iter_csv_prompts(f)))
+
+
+def iter_prompt_batches(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Optional[ProgressCallback] = None
+) -> Iterator[List[PromptData]]:
+    """Stream prompts from a file in tagged batches of ``batch_size``.
+
+    Only one batch (plus the parser's read buffer) is held in memory at a time.
+    """
+    if file_path.endswith('.json'):
+        iter_prompts = iter_json_prompts
+    elif file_path.endswith('.jsonl'):
+        iter_prompts = iter_jsonl_prompts
+    elif file_path.endswith('.csv'):
+        iter_prompts = iter_csv_prompts
+    else:
+        raise ValueError("Unsupported file format. Only JSON, JSONL and CSV are supported.")
+
+    total_bytes = os.path.getsize(file_path)
+    raw = _CountingFile(file_path)
+    parsed = 0
+    batch: List[RawPrompt] = []
+
+    with io.TextIOWrapper(io.BufferedReader(raw, READ_CHUNK_SIZE), encoding='utf-8', newline='') as f:
+        for raw_prompt in iter_prompts(f):
+            batch.append(raw_prompt)
+            if len(batch) >= batch_size:
+                parsed += len(batch)
+                yield create_prompt_batch(batch)
+                batch = []
+                if progress:
+                    progress(parsed, raw.bytes_read, total_bytes)
+        if batch:
+            parsed += len(batch)
+            yield create_prompt_batch(batch)
+        if progress:
+            progress(parsed, total_bytes, total_bytes)
+
+
+class _CountingFile(io.RawIOBase):
+    """Raw binary file that tracks how far it has been read, for progress reporting."""
+
+    def __init__(self, file_path: str):
+        self._f = open(file_path, 'rb', buffering=0)
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._f.readinto(b)
+        self.bytes_read = self._f.tell()
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        position = self._f.seek(offset, whence)
+        self.bytes_read = position
+        return position
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def _split_tags(tags: Any) -> List[str]:
+    if isinstance(tags, str):
+        return [tag.strip() for tag in tags.split(',') if tag.strip()]
+    if isinstance(tags, list):
+        return tags
+    return []
+
+
+def _prompt_from_item(item: Any) -> Optional[RawPrompt]:
+    """Turn one JSON value (a string or a prompt object) into prompt text and tags."""
+    if isinstance(item, str):
+        # Simple array of strings
+        return (item, []) if item else None
+    if isinstance(item, dict):
+        prompt_text = item.get('prompt', item.get('text', ''))
+        if prompt_text:
+            return prompt_text, _split_tags(item.get('tags', []))
+    return None
+
+
+class _JsonStream:
+    """Incremental reader that decodes one JSON value at a time from a text file."""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed so the buffer stays small
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Invalid JSON: expected '{char}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number or literal at the end of the buffer may be cut short
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill():
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                self.pos = end
+                return value
+
+    def array_items(self) -> Iterator[Any]:
+        """Yield the elements of the array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("Invalid JSON: expected ',' or ']' in array")
+
+
+def iter_json_prompts(f: TextIO) -> Iterator[RawPrompt]:
+    """Stream prompts from a JSON document without loading it whole.
+
+    Handles a top-level array of strings/objects, an object with a
+    ``prompts`` array, or a single prompt object.
+    """
+    stream = _JsonStream(f)
+    first = stream.peek()
+
+    if first == '[':
         # Array of prompt objects
-        for item in data:
-            if isinstance(item, str):
-                # Simple array of strings
-                prompts.append(create_prompt_data(item))
-            elif isinstance(item, dict):
-                # Array of objects
-                prompt_text = item.get('prompt', item.get('text', ''))
-                if prompt_text:
-                    tags = item.get('tags', [])
-                    if isinstance(tags, str):
-                        tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
-                    prompts.append(create_prompt_data(prompt_text, tags))
-    elif isinstance(data, dict):
-        # Single object or structured data
-        if 'prompts' in data:
-            # Structured format with prompts array
-            for item in data['prompts']:
-                if isinstance(item, str):
-                    prompts.append(create_prompt_data(item))
-                elif isinstance(item, dict):
-                    prompt_text = item.get('prompt', item.get('text', ''))
-                    if prompt_text:
-                        tags = item.get('tags', [])
-                        if isinstance(tags, str):
-                            tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
-                        prompts.append(create_prompt_data(prompt_text, tags))
+        for item in stream.array_items():
+            prompt = _prompt_from_item(item)
+            if prompt:
+                yield prompt
+
+    elif first == '{':
+        # Structured format with a prompts array, or a single prompt object
+        stream.expect('{')
+        fields: Dict[str, Any] = {}
+        has_prompts = False
+        if stream.peek() == '}':
+            stream.pos += 1
         else:
+            while True:
+                key = stream.value()
+                stream.expect(':')
+                if key == 'prompts' and stream.peek() == '[':
+                    has_prompts = True
+                    for item in stream.array_items():
+                        prompt = _prompt_from_item(item)
+                        if prompt:
+                            yield prompt
+                else:
+                    fields[key] = stream.value()
+                char = stream.peek()
+                stream.pos += 1
+                if char == '}':
+                    break
+                if char != ',':
+                    raise ValueError("Invalid JSON: expected ',' or '}' in object")
+        if not has_prompts:
             # Single prompt object
-            prompt_text = data.get('prompt', data.get('text', ''))
-            if prompt_text:
-                tags = data.get('tags', [])
-                if isinstance(tags, str):
-                    tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
-                prompts.append(create_prompt_data(prompt_text, tags))
-    
-    return prompts
+            prompt = _prompt_from_item(fields)
+            if prompt:
+                yield prompt
 
+    elif first:
+        raise ValueError("Invalid JSON: expected an array or object of prompts")
 
-async def parse_csv_file(file_path: str) -> List[PromptData]:
-    """Parse CSV file containing prompts."""
-    prompts = []
-    
+
+def iter_jsonl_prompts(f: TextIO) -> Iterator[RawPrompt]:
+    """Stream prompts from a JSON Lines document, one value per line."""
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        prompt = _prompt_from_item(item)
+        if prompt:
+            yield prompt
+
+
+def _find_column(columns: List[str], names: List[str]) -> Optional[str]:
+    for col in columns:
+        if str(col).lower() in names:
+            return col
+    return None
+
+
+def iter_csv_prompts(f: TextIO) -> Iterator[RawPrompt]:
+    """Stream prompts from a CSV document in chunks."""
+    yielded = False
     try:
         # Try to read with pandas for better handling of various CSV formats
-        df = pd.read_csv(file_path)
-        
-        # Look for prompt column (case-insensitive)
-        prompt_column = None
-        for col in df.columns:
-            if col.lower() in ['prompt', 'prompts', 'text', 'message', 'query']:
-                prompt_column = col
-                break
-        
-        if prompt_column is None:
-            raise ValueError("No prompt column found. Expected column names: 'prompt', 'text', 'message', or 'query'")
-        
-        # Look for tags column (optional)
-        tags_column = None
-        for col in df.columns:
-            if col.lower() in ['tags', 'tag', 'categories', 'category', 'labels', 'label']:
-                tags_column = col
-                break
-        
-        # Process each row
-        for _, row in df.iterrows():
-            prompt_text = str(row[prompt_column]).strip()
-            if prompt_text and prompt_text.lower() != 'nan':
-                tags = []
-                if tags_column and pd.notna(row[tags_column]):
-                    tags_str = str(row[tags_column])
-                    tags = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-                
-                prompts.append(create_prompt_data(prompt_text, tags))
+        prompt_column = tags_column = None
+        with pd.read_csv(f, chunksize=DEFAULT_BATCH_SIZE) as reader:
+            for chunk in reader:
+                if prompt_column is None:
+                    # Look for prompt column (case-insensitive) and optional tags column
+                    prompt_column = _find_column(list(chunk.columns), PROMPT_COLUMNS)
+                    if prompt_column is None:
+                        raise ValueError("No prompt column found. Expected column names: 'prompt', 'text', 'message', or 'query'")
+                    tags_column = _find_column(list(chunk.columns), TAG_COLUMNS)
+
+                tags_values = chunk[tags_column] if tags_column else [None] * len(chunk)
+                for prompt_value, tags_value in zip(chunk[prompt_column], tags_values):
+                    prompt_text = str(prompt_value).strip()
+                    if prompt_text and prompt_text.lower() != 'nan':
+                        tags = []
+                        if tags_column and pd.notna(tags_value):
+                            tags = _split_tags(str(tags_value))
+                        yielded = True
+                        yield prompt_text, tags
+        return
+    except Exception:
+        # Rows already handed out cannot be taken back
+        if yielded:
+            raise
+
+    # Fallback to basic CSV parsing
+    f.seek(0)
+    csv_reader = csv.DictReader(f)
     
-    except Exception as e:
-        # Fallback to basic CSV parsing
-        with open(file_path, 'r', encoding='utf-8') as f:
-            csv_reader = csv.DictReader(f)
-            
-            # Get field names and find prompt column
-            fieldnames = csv_reader.fieldnames
-            prompt_field = None
-            tags_field = None
-            
-            for field in fieldnames:
-                field_lower = field.lower()
-                if field_lower in ['prompt', 'prompts', 'text', 'message', 'query']:
-                    prompt_field = field
-                elif field_lower in ['tags', 'tag', 'categories', 'category', 'labels', 'label']:
-                    tags_field = field
-            
-            if not prompt_field:
-                raise ValueError("No prompt column found in CSV file")
-            
-            # Process rows
-            for row in csv_reader:
-                prompt_text = row.get(prompt_field, '').strip()
-                if prompt_text:
-                    tags = []
-                    if tags_field and row.get(tags_field):
-                        tags = [tag.strip() for tag in row[tags_field].split(',') if tag.strip()]
-                    
-                    prompts.append(create_prompt_data(prompt_text, tags))
+    # Get field names and find prompt column
+    fieldnames = csv_reader.fieldnames or []
+    prompt_field = _find_column(fieldnames, PROMPT_COLUMNS)
+    tags_field = _find_column(fieldnames, TAG_COLUMNS)
     
-    return prompts
+    if not prompt_field:
+        raise ValueError("No prompt column found in CSV file")
+    
+    # Process rows
+    for row in csv_reader:
+        prompt_text = (row.get(prompt_field) or '').strip()
+        if prompt_text:
+            tags = []
+            if tags_field and row.get(tags_field):
+                tags = _split_tags(row[tags_field])
+            yield prompt_text, tags
+
+
+def create_prompt_batch(raw_prompts: List[RawPrompt]) -> List[PromptData]:
+    """Create and tag PromptData objects for a batch of (prompt text, tags) pairs."""
+    auto_tags = detect_security_tags_batch([prompt_text for prompt_text, _ in raw_prompts])
+    return [
+        _build_prompt_data(prompt_text, tags, prompt_auto_tags)
+        for (prompt_text, tags), prompt_auto_tags in zip(raw_prompts, auto_tags)
+    ]
 
 
 def create_prompt_data(prompt_text: str, tags: List[str] = None) -> PromptData:
     """Create a PromptData object from prompt text and tags."""
+    # Auto-detect potential security tags based on content
+    return _build_prompt_data(prompt_text, tags, detect_security_tags(prompt_text))
+
+
+def _build_prompt_data(prompt_text: str, tags: Optional[List[str]], auto_tags: List[str]) -> PromptData:
     if tags is None:
         tags = []
     
-    # Auto-detect potential security tags based on content
-    auto_tags = detect_security_tags(prompt_text)
     all_tags = list(set(tags + auto_tags))
     
     return PromptData(
         id=str(uuid.uuid4()),
         prompt=prompt_text,
         status=PromptStatus.pending,
-        tags=all_tags
+        tags=all_tags,
+        content_hash=prompt_content_hash(prompt_text)
     )
 
 
+def prompt_content_hash(prompt_text: str) -> str:
+    """Stable identity of a prompt's content, independent of its per-upload ID."""
+    return hashlib.sha256(prompt_text.encode('utf-8')).hexdigest()
+
+
 def detect_security_tags(prompt: str) -> List[str]:
     """Automatically detect security-related tags based on prompt content."""
+    # Keyword rule sets (jailbreak, injection, social engineering) from the tagging rules
+    tags = get_tagging_engine('prompt').tag(prompt)
+    return tags + _format_tags(prompt)
+
+
+def detect_security_tags_batch(prompts: List[str]) -> List[List[str]]:
+    """Detect security tags for a whole batch of prompts in one call."""
+    keyword_tags = get_tagging_engine('prompt').tag_batch(prompts)
+    return [tags + _format_tags(prompt) for prompt, tags in zip(prompts, keyword_tags)]
+
+
+def _format_tags(prompt: str) -> List[str]:
+    """Tags based on the shape of the prompt rather than its keywords."""
     tags = []
-    prompt_lower = prompt.lower()
-    
-    # Common jailbreak patterns
-    jailbreak_patterns = [
-        'ignore', 'forget', 'disregard', 'override', 'bypass', 'disable',
-        'pretend', 'roleplay', 'act as', 'imagine', 'hypothetical',
-        'developer mode', 'admin mode', 'debug mode', 'maintenance mode',
-        'system prompt', 'instructions', 'guidelines', 'rules'
-    ]
-    
-    # Injection patterns
-    injection_patterns = [
-        'system:', 'user:', 'assistant:', 'human:', 'ai:',
-        'prompt injection', 'command injection', 'code injection',
-        '```', 'exec', 'eval', 'script'
-    ]
-    
-    # Social engineering patterns
-    social_patterns = [
-        'urgent', 'emergency', 'immediate', 'confidential', 'secret',
-        'password', 'token', 'api key', 'credential', 'login',
-        'personal information', 'private data', 'sensitive'
-    ]
-    
-    # Check for patterns
-    for pattern in jailbreak_patterns:
-        if pattern in prompt_lower:
-            tags.append('Jailbreak Attempt')
-            break
-    
-    for pattern in injection_patterns:
-        if pattern in prompt_lower:
-            tags.append('Injection Attempt')
-            break
-    
-    for pattern in social_patterns:
-        if pattern in prompt_lower:
-            tags.append('Social Engineering')
-            break
     
     # Check for suspicious characters or formatting
     if '\\n' in prompt or '\\t' in prompt or prompt.count('\n') > 3:
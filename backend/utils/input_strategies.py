@@ -0,0 +1,89 @@
+import sys
+import logging
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+# Ordered fastest to most humanlike; auto-fallback walks this list forward
+INPUT_STRATEGIES = ['fill', 'insert_text', 'paste', 'type']
+
+# Per-character delay used by the humanlike strategy when the prompt is short
+HUMAN_TYPING_DELAY_MS = 50
+
+PASTE_SHORTCUT = 'Meta+V' if sys.platform == 'darwin' else 'Control+V'
+
+READ_VALUE_SCRIPT = "el => ('value' in el && typeof el.value === 'string') ? el.value : (el.innerText || '')"
+
+
+def _normalize(text: str) -> str:
+    return ' '.join((text or '').split())
+
+
+async def read_input_value(input_field: Any) -> str:
+    """Read back what the widget holds in its input (works for contenteditable too)."""
+    return await input_field.evaluate(READ_VALUE_SCRIPT)
+
+
+async def apply_input_strategy(
+    strategy: str,
+    iframe: Any,
+    input_field: Any,
+    prompt: str,
+    max_typing_seconds: float = 10
+):
+    """Put ``prompt`` into the input field using a single strategy."""
+    if strategy == 'fill':
+        await input_field.fill(prompt)
+    elif strategy == 'insert_text':
+        await input_field.focus()
+        await iframe.page.keyboard.insert_text(prompt)
+    elif strategy == 'paste':
+        await iframe.page.context.grant_permissions(['clipboard-read', 'clipboard-write'])
+        await iframe.evaluate("text => navigator.clipboard.writeText(text)", prompt)
+        await input_field.focus()
+        await input_field.press(PASTE_SHORTCUT)
+    elif strategy == 'type':
+        # Humanlike typing, but never longer than max_typing_seconds in total
+        budget_ms = max_typing_seconds * 1000
+        delay = min(HUMAN_TYPING_DELAY_MS, budget_ms / max(len(prompt), 1))
+        await input_field.type(prompt, delay=delay)
+    else:
+        raise ValueError(f"Unknown input strategy: {strategy}")
+
+
+async def enter_prompt(
+    iframe: Any,
+    input_field: Any,
+    prompt: str,
+    strategy: str = 'fill',
+    auto_fallback: bool = True,
+    max_typing_seconds: float = 10
+) -> str:
+    """Enter the prompt and return the name of the strategy that took effect.
+
+    With ``auto_fallback`` the field is read back after each attempt; if the
+    widget ignored the synthetic input, the next strategy in
+    ``INPUT_STRATEGIES`` is tried.
+    """
+    if strategy not in INPUT_STRATEGIES:
+        raise ValueError(f"Unknown input strategy: {strategy}")
+
+    candidates: List[str] = [strategy]
+    if auto_fallback:
+        candidates += INPUT_STRATEGIES[INPUT_STRATEGIES.index(strategy) + 1:]
+
+    expected = _normalize(prompt)
+    for candidate in candidates:
+        is_last = candidate == candidates[-1]
+        try:
+            await input_field.fill('')
+            await apply_input_strategy(candidate, iframe, input_field, prompt, max_typing_seconds)
+            if is_last or _normalize(await read_input_value(input_field)) == expected:
+                return candidate
+            logger.info(f"Widget ignored '{candidate}' input, falling back")
+        except Exception as e:
+            if is_last:
+                raise
+            logger.info(f"Input strategy '{candidate}' failed ({e}), falling back")
+
+    return candidates[-1]
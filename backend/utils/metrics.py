@@ -0,0 +1,252 @@
+import bisect
+from abc import ABC, abstractmethod
+import math
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; HTTP handlers are fast, chat widgets are not
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RESPONSE_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(ABC):
+    """A named family of samples, one per combination of label values."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of every label set; called with the metric's lock held."""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = RESPONSE_LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (the last one is +Inf), then sum
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[position] += 1
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of one process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = RESPONSE_LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def on_collect(self, collector: Callable[[], None]):
+        """Run ``collector`` before every render, e.g. to refresh gauges from live state."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# API
+HTTP_REQUESTS = registry.counter(
+    "redprompt_http_requests_total", "HTTP requests handled, by route template and status.",
+    ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "redprompt_http_request_duration_seconds", "Time to produce an HTTP response, by route template.",
+    ("method", "route"), buckets=HTTP_LATENCY_BUCKETS
+)
+RUNS = registry.gauge("redprompt_runs", "Test runs by scheduler state (running or queued).", ("state",))
+RUNS_FINISHED = registry.counter("redprompt_runs_finished_total", "Test runs finished, by final status.", ("status",))
+WORK_QUEUE_BATCHES = registry.gauge(
+    "redprompt_work_queue_batches", "Prompt batches in the remote work queue, by state.", ("state",)
+)
+BROWSERS = registry.gauge("redprompt_browsers", "Pooled Chromium instances, by state (ready or retiring).", ("state",))
+BROWSER_LEASES = registry.gauge("redprompt_browser_leases_active", "Runs currently borrowing a pooled browser.")
+CHROMIUM_RSS = registry.gauge("redprompt_chromium_rss_bytes", "Resident memory of the Playwright driver and browsers.")
+
+# Runner
+PROMPTS = registry.counter(
+    "redprompt_prompts_total", "Prompts run, by target origin and result status.", ("target", "status")
+)
+PROMPTS_CACHED = registry.counter(
+    "redprompt_prompts_cached_total", "Prompts answered from the response cache instead of being run.", ("target",)
+)
+RESPONSE_SECONDS = registry.histogram(
+    "redprompt_response_seconds", "Time from submitting a prompt to its final response text, by target.",
+    ("target",)
+)
+PHASE_SECONDS = registry.histogram(
+    "redprompt_prompt_phase_seconds", "Time spent per prompt in each runner phase.", ("phase",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+SELECTOR_TIMEOUTS = registry.counter(
+    "redprompt_selector_timeouts_total",
+    "Widget lookups where no candidate selector matched in time, by slot (iframe, input, send, response).",
+    ("slot",)
+)
+
+
+def browser_pool_collector(pool) -> Callable[[], None]:
+    """Collector that refreshes the browser gauges from a ``BrowserPool``; call it on the pool's event loop."""
+
+    def collect_browser_pool():
+        BROWSERS.set(len(pool.browsers), state="ready")
+        BROWSERS.set(len(pool.retiring), state="retiring")
+        BROWSER_LEASES.set(sum(pooled.active_leases for pooled in pool.browsers + pool.retiring))
+        rss_mb = pool.rss_mb() if pool.started else None
+        CHROMIUM_RSS.set((rss_mb or 0) * 1024 * 1024)
+
+    return collect_browser_pool
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics from a background thread, for processes without the API (e.g. workers).
+
+    Collectors run on the server's thread, so they must only read state that
+    is safe to read from it; a process with an event loop should update its
+    gauges from the loop instead (see ``worker.py``).
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
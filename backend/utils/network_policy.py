@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Route, Request
+
+from models import NetworkPolicySettings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ASSET_CACHE_DIR = "cache/assets"
+DEFAULT_ASSET_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Analytics, ads and session-recording hosts that never matter to a chat widget
+TRACKER_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "googleadservices.com",
+    "doubleclick.net", "googlesyndication.com", "facebook.net", "connect.facebook.net",
+    "hotjar.com", "segment.io", "segment.com", "mixpanel.com", "amplitude.com",
+    "fullstory.com", "clarity.ms", "bat.bing.com", "ads.linkedin.com", "px.ads.linkedin.com",
+    "adobedtm.com", "demdex.net", "omtrdc.net", "newrelic.com", "nr-data.net",
+    "optimizely.com", "quantserve.com", "scorecardresearch.com", "taboola.com",
+]
+
+# Resource types whose responses may be served from the on-disk asset cache
+CACHEABLE_RESOURCE_TYPES = {"script", "stylesheet", "font", "image"}
+
+
+def host_matches(host: str, patterns) -> bool:
+    """True if ``host`` is one of ``patterns`` or a subdomain of one."""
+    return any(host == pattern or host.endswith("." + pattern) for pattern in patterns)
+
+
+# Response headers that describe one connection or one client, never replayed from the cache
+UNCACHED_HEADERS = {
+    "set-cookie", "set-cookie2", "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+    # The body is already decoded
+    "content-encoding", "content-length",
+}
+
+
+def cache_lifetime(headers: Dict[str, str]) -> Optional[float]:
+    """Seconds a response may be reused by a shared cache, or None if it must not be stored.
+
+    Follows ``s-maxage``/``max-age``, then ``Expires``; responses that are
+    ``no-store``, ``no-cache`` or ``private``, or that give no lifetime, are
+    not stored.
+    """
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        directives[name] = value.strip('"')
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return None
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                lifetime = float(directives[name])
+            except ValueError:
+                return None
+            return lifetime if lifetime > 0 else None
+    if "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            now = parsedate_to_datetime(headers["date"]).timestamp() if "date" in headers else time.time()
+        except (TypeError, ValueError):
+            return None
+        return expires - now if expires > now else None
+    return None
+
+
+class StaticAssetCache:
+    """On-disk cache of static asset responses shared by all runs.
+
+    Only successful GET responses that HTTP caching allows a shared cache to
+    reuse are kept (see ``cache_lifetime``), for their own lifetime but at
+    most ``max_age_seconds``. ``Vary`` request headers are stored with the
+    entry and must match on lookup. The cache is bounded to ``max_bytes`` of
+    bodies per process, evicting the least recently used entries; its index
+    is kept in memory so ``stats`` does not touch the disk.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_ASSET_CACHE_DIR,
+        max_age_seconds: float = 24 * 3600,
+        max_bytes: int = DEFAULT_ASSET_CACHE_MAX_BYTES
+    ):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        # Body sizes by key, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.size = 0
+        self._scan()
+
+    def _scan(self):
+        bodies = []
+        for name in os.listdir(self.path):
+            file_path = os.path.join(self.path, name)
+            if name.endswith(".tmp"):
+                os.remove(file_path)
+            elif name.endswith(".body"):
+                stat = os.stat(file_path)
+                bodies.append((stat.st_mtime, name[:-len(".body")], stat.st_size))
+        for _, key, size in sorted(bodies):
+            self._entries[key] = size
+            self.size += size
+        self._evict()
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _files(self, key: str):
+        return os.path.join(self.path, f"{key}.json"), os.path.join(self.path, f"{key}.body")
+
+    def get(self, url: str, request_headers: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        key = self._key(url)
+        meta_path, body_path = self._files(key)
+        with self._lock:
+            try:
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+                if time.time() > meta["expires_at"]:
+                    self._remove(key)
+                    return None
+                request_headers = request_headers or {}
+                if any(request_headers.get(name) != value for name, value in meta["vary"].items()):
+                    return None
+                with open(body_path, "rb") as f:
+                    meta["body"] = f.read()
+            except (OSError, ValueError, KeyError):
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return meta
+
+    def put(self, url: str, status: int, headers: Dict[str, str], body: bytes,
+            request_headers: Optional[Dict[str, str]] = None) -> bool:
+        """Store a response if HTTP caching allows it; returns whether it was stored."""
+        lifetime = cache_lifetime(headers)
+        vary = [name.strip().lower() for name in headers.get("vary", "").split(",") if name.strip()]
+        if lifetime is None or "*" in vary or len(body) > self.max_bytes:
+            return False
+        request_headers = request_headers or {}
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": {name: value for name, value in headers.items() if name.lower() not in UNCACHED_HEADERS},
+            # Bodies are stored decoded, so the encoding negotiated does not matter
+            "vary": {name: request_headers.get(name) for name in vary if name != "accept-encoding"},
+            "stored_at": time.time(),
+            "expires_at": time.time() + min(lifetime, self.max_age_seconds),
+        }
+        key = self._key(url)
+        meta_path, body_path = self._files(key)
+        with self._lock:
+            self._remove(key)
+            with open(f"{body_path}.tmp", "wb") as f:
+                f.write(body)
+            os.replace(f"{body_path}.tmp", body_path)
+            with open(f"{meta_path}.tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            self._entries[key] = len(body)
+            self.size += len(body)
+            self._evict()
+        return True
+
+    def _remove(self, key: str):
+        self.size -= self._entries.pop(key, 0)
+        for file_path in self._files(key):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            for filename in os.listdir(self.path):
+                os.remove(os.path.join(self.path, filename))
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class NetworkPolicy:
+    """Per-context request routing: block noise, serve static assets from disk.
+
+    Requests for blocked resource types, tracker or configured hosts and (if
+    enabled) third-party hosts are aborted. Only the target's own host and its
+    subdomains are first-party; anything else the page needs, such as a CDN,
+    goes in ``allow_hosts``. Frames are never blocked for being third-party,
+    since chat widgets live in one. Every route is settled, even when handling
+    it fails. Counters are cumulative for the context.
+    """
+
+    def __init__(
+        self,
+        settings: NetworkPolicySettings,
+        target_url: str,
+        asset_cache: Optional[StaticAssetCache] = None
+    ):
+        self.settings = settings
+        self.target_host = urlparse(target_url).hostname or ""
+        self.block_types = set(settings.block_resource_types)
+        self.block_hosts = TRACKER_HOSTS + list(settings.block_hosts)
+        self.asset_cache = asset_cache if settings.cache_static_assets else None
+        self.stats = {"requests_blocked": 0, "cache_hits": 0, "bytes_saved": 0}
+
+    async def install(self, context: BrowserContext):
+        await context.route("**/*", self._handle)
+
+    def _blocked(self, request: Request) -> bool:
+        if request.resource_type in self.block_types:
+            return True
+        host = urlparse(request.url).hostname or ""
+        if host_matches(host, self.settings.allow_hosts):
+            return False
+        if host_matches(host, self.block_hosts):
+            return True
+        return (
+            self.settings.block_third_party
+            and request.resource_type != "document"
+            and not host_matches(host, [self.target_host])
+        )
+
+    async def _handle(self, route: Route, request: Request):
+        try:
+            if self._blocked(request):
+                self.stats["requests_blocked"] += 1
+                await route.abort("blockedbyclient")
+                return
+            if self.asset_cache and request.method == "GET" and request.resource_type in CACHEABLE_RESOURCE_TYPES:
+                await self._serve_cached(route, request)
+                return
+            await route.continue_()
+        except Exception as e:
+            logger.debug(f"Routing {request.url} failed: {e}")
+            try:
+                # A pending route would stall the request for good
+                await route.continue_()
+            except Exception:
+                # Already settled, or the page navigated or closed meanwhile
+                pass
+
+    async def _serve_cached(self, route: Route, request: Request):
+        request_headers = await request.all_headers()
+        entry = await asyncio.to_thread(self.asset_cache.get, request.url, request_headers)
+        if entry is not None:
+            self.stats["cache_hits"] += 1
+            self.stats["bytes_saved"] += len(entry["body"])
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            # Let the browser make (and fail) the request itself
+            await route.continue_()
+            return
+        # The body is already decoded, so drop headers describing the wire encoding
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        }
+        if response.status == 200 and "authorization" not in request_headers:
+            try:
+                await asyncio.to_thread(
+                    self.asset_cache.put, request.url, response.status, headers, body, request_headers
+                )
+            except Exception as e:
+                logger.warning(f"Could not cache {request.url}: {e}")
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats)
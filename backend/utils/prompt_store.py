@@ -0,0 +1,362 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import zlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from models import PromptData, PromptStatus
+from utils.file_parser import prompt_content_hash
+from utils.results_index import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = "prompt_sets/prompts.db"
+
+# Prompt texts shorter than this are stored as-is; zlib only pays off on longer ones
+COMPRESS_MIN_BYTES = 128
+
+# Rows read per query when loading a whole set for a run
+LOAD_PAGE_SIZE = 2000
+
+SET_FIELDS = ["prompt_set_id", "name", "source_filename", "created_at", "prompt_count", "tag_counts"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompt_texts (
+    hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL
+) WITHOUT ROWID;
+
+-- Texts referenced by stored run results, kept even when no set contains them anymore
+CREATE TABLE IF NOT EXISTS retained_texts (
+    hash TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS prompt_sets (
+    prompt_set_id TEXT PRIMARY KEY,
+    name TEXT,
+    source_filename TEXT,
+    created_at TEXT,
+    status TEXT,
+    prompt_count INTEGER,
+    tag_counts TEXT
+);
+CREATE INDEX IF NOT EXISTS prompt_sets_by_time ON prompt_sets (created_at DESC, prompt_set_id DESC);
+
+CREATE TABLE IF NOT EXISTS set_prompts (
+    prompt_set_id TEXT,
+    position INTEGER,
+    prompt_id TEXT,
+    hash TEXT,
+    tags TEXT,
+    PRIMARY KEY (prompt_set_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS set_prompts_by_hash ON set_prompts (hash);
+
+CREATE TABLE IF NOT EXISTS set_prompt_tags (
+    prompt_set_id TEXT,
+    tag TEXT,
+    position INTEGER,
+    PRIMARY KEY (prompt_set_id, tag, position)
+) WITHOUT ROWID;
+"""
+
+
+def _encode_text(text: str) -> Any:
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+    compressed = zlib.compress(raw, 6)
+    # SQLite keeps the value's type: BLOB means compressed, TEXT means stored as-is
+    return compressed if len(compressed) < len(raw) else text
+
+
+def _decode_text(body: Any) -> str:
+    if isinstance(body, bytes):
+        return zlib.decompress(body).decode("utf-8")
+    return body
+
+
+def _decode_position(cursor: Optional[str]) -> int:
+    if cursor is None:
+        return -1
+    try:
+        return int(cursor)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+class PromptStore:
+    """Named, immutable prompt sets persisted in SQLite.
+
+    Prompt texts are stored once per distinct content hash (zlib-compressed
+    when that helps) and shared by every set, and every stored run result,
+    that contains them; a set only keeps the order, IDs and tags of its
+    prompts. Sets are written in batches
+    while an upload is parsed and only become visible once finished, so
+    concurrent uploads never see or replace each other's prompts.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        # Uploads add batches from worker threads while the API reads on the event loop
+        self.lock = threading.Lock()
+        self._discard_unfinished()
+
+    def close(self):
+        self.conn.close()
+
+    def _discard_unfinished(self):
+        """Drop sets whose upload never finished, e.g. because the process died mid-parse."""
+        unfinished = [
+            row["prompt_set_id"] for row in
+            self.conn.execute("SELECT prompt_set_id FROM prompt_sets WHERE status != 'ready'").fetchall()
+        ]
+        for prompt_set_id in unfinished:
+            self.delete_set(prompt_set_id)
+        if unfinished:
+            logger.info(f"Discarded {len(unfinished)} unfinished prompt set(s)")
+
+    def create_set(self, name: Optional[str] = None, source_filename: Optional[str] = None) -> str:
+        """Start a new, not yet visible set and return its ID."""
+        prompt_set_id = str(uuid.uuid4())
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO prompt_sets (prompt_set_id, name, source_filename, created_at, status, prompt_count) "
+                "VALUES (?, ?, ?, ?, 'uploading', 0)",
+                (prompt_set_id, name or source_filename, source_filename, datetime.now().isoformat())
+            )
+            self.conn.commit()
+        return prompt_set_id
+
+    def add_prompts(self, prompt_set_id: str, prompts: List[PromptData]):
+        """Append a batch of prompts to a set that is being created."""
+        texts, rows, tag_rows = {}, [], []
+        with self.lock:
+            position = self.conn.execute(
+                "SELECT prompt_count FROM prompt_sets WHERE prompt_set_id = ? AND status = 'uploading'",
+                (prompt_set_id,)
+            ).fetchone()
+            if position is None:
+                raise ValueError(f"Prompt set {prompt_set_id} is not being uploaded")
+            position = position[0]
+            for prompt in prompts:
+                content_hash = prompt.content_hash or prompt_content_hash(prompt.prompt)
+                texts[content_hash] = prompt.prompt
+                tags = sorted(set(prompt.tags or []))
+                rows.append((prompt_set_id, position, prompt.id, content_hash, json.dumps(tags) if tags else None))
+                tag_rows.extend((prompt_set_id, tag, position) for tag in tags)
+                position += 1
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO prompt_texts (hash, body) VALUES (?, ?)",
+                [(content_hash, _encode_text(text)) for content_hash, text in texts.items()]
+            )
+            self.conn.executemany(
+                "INSERT INTO set_prompts (prompt_set_id, position, prompt_id, hash, tags) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.executemany(
+                "INSERT INTO set_prompt_tags (prompt_set_id, tag, position) VALUES (?, ?, ?)", tag_rows
+            )
+            self.conn.execute(
+                "UPDATE prompt_sets SET prompt_count = ? WHERE prompt_set_id = ?", (position, prompt_set_id)
+            )
+            self.conn.commit()
+
+    def finish_set(self, prompt_set_id: str) -> Dict[str, Any]:
+        """Make a fully written set visible and return its metadata."""
+        with self.lock:
+            tag_counts = dict(self.conn.execute(
+                "SELECT tag, COUNT(*) FROM set_prompt_tags WHERE prompt_set_id = ? GROUP BY tag ORDER BY tag",
+                (prompt_set_id,)
+            ).fetchall())
+            self.conn.execute(
+                "UPDATE prompt_sets SET status = 'ready', tag_counts = ? WHERE prompt_set_id = ?",
+                (json.dumps(tag_counts), prompt_set_id)
+            )
+            self.conn.commit()
+        return self.get_set(prompt_set_id)
+
+    def delete_set(self, prompt_set_id: str) -> bool:
+        """Delete a set, and the texts no other set or run uses; returns False if it did not exist."""
+        with self.lock:
+            deleted = self.conn.execute(
+                "DELETE FROM prompt_sets WHERE prompt_set_id = ?", (prompt_set_id,)
+            ).rowcount
+            hashes = [
+                row[0] for row in self.conn.execute(
+                    "SELECT DISTINCT hash FROM set_prompts WHERE prompt_set_id = ?", (prompt_set_id,)
+                ).fetchall()
+            ]
+            self.conn.execute("DELETE FROM set_prompts WHERE prompt_set_id = ?", (prompt_set_id,))
+            self.conn.execute("DELETE FROM set_prompt_tags WHERE prompt_set_id = ?", (prompt_set_id,))
+            self.conn.executemany(
+                "DELETE FROM prompt_texts WHERE hash = ? "
+                "AND NOT EXISTS (SELECT 1 FROM set_prompts WHERE hash = ?) "
+                "AND NOT EXISTS (SELECT 1 FROM retained_texts WHERE hash = ?)",
+                [(content_hash, content_hash, content_hash) for content_hash in hashes]
+            )
+            self.conn.commit()
+        return bool(deleted)
+
+    def retain_texts(self, texts: Dict[str, str]):
+        """Store prompt texts by content hash and keep them for as long as the store exists."""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO prompt_texts (hash, body) VALUES (?, ?)",
+                [(content_hash, _encode_text(text)) for content_hash, text in texts.items()]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO retained_texts (hash) VALUES (?)", [(content_hash,) for content_hash in texts]
+            )
+            self.conn.commit()
+
+    def get_texts(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Prompt texts by content hash; unknown hashes are left out."""
+        hashes = list(set(hashes))
+        texts = {}
+        with self.lock:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, body FROM prompt_texts WHERE hash IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall()
+                texts.update((row["hash"], _decode_text(row["body"])) for row in rows)
+        return texts
+
+    def _set(self, row: sqlite3.Row) -> Dict[str, Any]:
+        prompt_set = {field: row[field] for field in SET_FIELDS}
+        prompt_set["tag_counts"] = json.loads(prompt_set["tag_counts"] or "{}")
+        return prompt_set
+
+    def get_set(self, prompt_set_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM prompt_sets WHERE prompt_set_id = ? AND status = 'ready'", (prompt_set_id,)
+            ).fetchone()
+        return self._set(row) if row else None
+
+    def latest_set(self) -> Optional[Dict[str, Any]]:
+        """The most recently uploaded set, which runs use unless they name one."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM prompt_sets WHERE status = 'ready' "
+                "ORDER BY created_at DESC, prompt_set_id DESC LIMIT 1"
+            ).fetchone()
+        return self._set(row) if row else None
+
+    def list_sets(self, cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """List finished sets, newest first, with keyset pagination."""
+        where, params = "WHERE status = 'ready'", []
+        if cursor:
+            created_at, prompt_set_id = decode_cursor(cursor)
+            where += " AND (created_at < ? OR (created_at = ? AND prompt_set_id < ?))"
+            params += [created_at, created_at, prompt_set_id]
+        with self.lock:
+            total = self.conn.execute("SELECT COUNT(*) FROM prompt_sets WHERE status = 'ready'").fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT * FROM prompt_sets {where} ORDER BY created_at DESC, prompt_set_id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["prompt_set_id"])
+        return {
+            "prompt_sets": [self._set(row) for row in rows],
+            "total_sets": total,
+            "next_cursor": next_cursor,
+        }
+
+    def _prompt(self, row: sqlite3.Row) -> PromptData:
+        return PromptData(
+            id=row["prompt_id"],
+            prompt=_decode_text(row["body"]),
+            status=PromptStatus.pending,
+            tags=json.loads(row["tags"]) if row["tags"] else [],
+            content_hash=row["hash"]
+        )
+
+    def _page(self, prompt_set_id: str, after: int, limit: int, tag: Optional[str] = None) -> List[sqlite3.Row]:
+        if tag:
+            sql = (
+                "SELECT p.position, p.prompt_id, p.hash, p.tags, t.body FROM set_prompt_tags g "
+                "JOIN set_prompts p ON p.prompt_set_id = g.prompt_set_id AND p.position = g.position "
+                "JOIN prompt_texts t ON t.hash = p.hash "
+                "WHERE g.prompt_set_id = ? AND g.tag = ? AND g.position > ? ORDER BY g.position LIMIT ?"
+            )
+            params = (prompt_set_id, tag, after, limit)
+        else:
+            sql = (
+                "SELECT p.position, p.prompt_id, p.hash, p.tags, t.body FROM set_prompts p "
+                "JOIN prompt_texts t ON t.hash = p.hash "
+                "WHERE p.prompt_set_id = ? AND p.position > ? ORDER BY p.position LIMIT ?"
+            )
+            params = (prompt_set_id, after, limit)
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def list_prompts(
+        self,
+        prompt_set_id: str,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        tag: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """One page of a set's prompts in upload order, optionally only those with ``tag``.
+
+        Returns None if the set does not exist.
+        """
+        prompt_set = self.get_set(prompt_set_id)
+        if prompt_set is None:
+            return None
+        rows = self._page(prompt_set_id, _decode_position(cursor), limit + 1, tag)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(rows[-1]["position"])
+        return {
+            "prompt_set_id": prompt_set_id,
+            "prompts": [self._prompt(row) for row in rows],
+            "count": prompt_set["tag_counts"].get(tag, 0) if tag else prompt_set["prompt_count"],
+            "next_cursor": next_cursor,
+        }
+
+    def iter_prompts(self, prompt_set_id: str) -> Iterator[PromptData]:
+        """Yield every prompt of a set in upload order, reading it page by page."""
+        after = -1
+        while True:
+            rows = self._page(prompt_set_id, after, LOAD_PAGE_SIZE)
+            for row in rows:
+                yield self._prompt(row)
+            if len(rows) < LOAD_PAGE_SIZE:
+                return
+            after = rows[-1]["position"]
+
+    def load_prompts(self, prompt_set_id: str) -> List[PromptData]:
+        """All prompts of a set, e.g. to run them; raises ValueError if the set does not exist."""
+        if self.get_set(prompt_set_id) is None:
+            raise ValueError(f"Prompt set {prompt_set_id} not found")
+        return list(self.iter_prompts(prompt_set_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            sets, prompts = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(prompt_count), 0) FROM prompt_sets WHERE status = 'ready'"
+            ).fetchone()
+            texts = self.conn.execute("SELECT COUNT(*) FROM prompt_texts").fetchone()[0]
+        return {"prompt_sets": sets, "prompts": prompts, "distinct_texts": texts}
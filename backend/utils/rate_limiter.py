@@ -0,0 +1,185 @@
+import asyncio
+import time
+import logging
+from typing import Dict, Any, Optional
+
+from models import TestResult, PromptStatus
+
+logger = logging.getLogger(__name__)
+
+# Response text that means the target is pushing back rather than answering
+PUSHBACK_PATTERNS = [
+    'too many requests', 'rate limit', 'try again later', 'slow down',
+    'service unavailable', 'temporarily unavailable', 'something went wrong',
+    'we are experiencing', 'high demand'
+]
+
+# Ceiling of one worker's rate when a run sets no delay between prompts
+DEFAULT_MAX_RATE = 2.0
+
+# A run ramps from its starting rate to its ceiling in about this many healthy prompts
+RAMP_UP_PROMPTS = 20
+
+# A back-off this recent still applies to a run that starts afterwards
+BACKOFF_MEMORY_SECONDS = 60.0
+
+
+class AdaptiveRateLimiter:
+    """Token bucket for one target whose rate adapts with AIMD.
+
+    Every healthy prompt adds ``additive_step`` prompts/sec to the rate, up
+    to ``max_rate``. A timeout, an error, an error banner in the response, or
+    a response slower than ``latency_threshold`` multiplies the rate by
+    ``backoff_factor``, down to ``min_rate``. A single limiter is shared by
+    every worker in this process that talks to the same target; worker.py
+    processes each pace with their own.
+    """
+
+    def __init__(
+        self,
+        origin: str,
+        initial_rate: float = 0.5,
+        min_rate: float = 1 / 60,
+        max_rate: float = DEFAULT_MAX_RATE,
+        additive_step: float = 0.05,
+        backoff_factor: float = 0.5,
+        latency_threshold: float = 20.0,
+        burst: float = 1.0
+    ):
+        self.origin = origin
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.additive_step = additive_step
+        self.backoff_factor = backoff_factor
+        self.latency_threshold = latency_threshold
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.last_backoff = 0.0
+        self.successes = 0
+        self.backoffs = 0
+        self._lock = asyncio.Lock()
+
+    def configure(self, initial_rate: float, max_rate: float, additive_step: Optional[float] = None):
+        """Apply a new run's pacing: its ceiling, its starting rate and its ramp-up step.
+
+        The rate a previous run ramped up to is not carried over. A recent
+        back-off is, so a new run does not hit a target that just pushed back
+        at full speed.
+        """
+        self.max_rate = max(max_rate, self.min_rate)
+        if additive_step is not None:
+            self.additive_step = additive_step
+        initial_rate = min(max(initial_rate, self.min_rate), self.max_rate)
+        if time.monotonic() - self.last_backoff < BACKOFF_MEMORY_SECONDS:
+            self.rate = min(self.rate, initial_rate)
+        else:
+            self.rate = initial_rate
+        self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self) -> float:
+        """Wait for a token and return how many seconds were spent waiting."""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return time.monotonic() - started
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def record_result(self, result: TestResult):
+        """Feed a finished prompt back into the controller."""
+        pushback = self.pushback_reason(result)
+        if pushback:
+            self.back_off(pushback)
+        else:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.additive_step)
+
+    def pushback_reason(self, result: TestResult) -> Optional[str]:
+        if result.status == PromptStatus.timeout:
+            return "timeout"
+        if result.status == PromptStatus.failed:
+            return "error"
+        response_lower = (result.response or '').lower()
+        if any(pattern in response_lower for pattern in PUSHBACK_PATTERNS):
+            return "error banner"
+        latency = result.response_time if result.response_time is not None else result.execution_time
+        if latency is not None and latency > self.latency_threshold:
+            return "slow response"
+        return None
+
+    def back_off(self, reason: str):
+        now = time.monotonic()
+        # Concurrent workers often see the same incident; only react once per interval
+        if now - self.last_backoff < 1 / self.rate:
+            return
+        self.last_backoff = now
+        self.backoffs += 1
+        self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+        # Drop any saved-up burst so the slower rate applies immediately
+        self.tokens = min(self.tokens, 0.0)
+        logger.warning(f"Backing off {self.origin} ({reason}): {self.rate:.3f} prompts/sec")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "origin": self.origin,
+            "rate": round(self.rate, 4),
+            "interval_seconds": round(1 / self.rate, 2),
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate,
+            "successes": self.successes,
+            "backoffs": self.backoffs,
+        }
+
+
+# One limiter per target origin, shared across the workers and runs of this process
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+
+def get_rate_limiter(
+    origin: str,
+    initial_rate: float = 0.5,
+    max_rate: float = DEFAULT_MAX_RATE,
+    additive_step: Optional[float] = None
+) -> AdaptiveRateLimiter:
+    """Return this process's limiter for a target, set up for a run starting now.
+
+    Each call (one per run) re-seeds the limiter from the run's own
+    ``initial_rate``, caps it at ``max_rate`` and, if given, ramps it up by
+    ``additive_step``; see ``configure``.
+    """
+    limiter = _limiters.get(origin)
+    if limiter is None:
+        limiter = AdaptiveRateLimiter(origin, initial_rate=initial_rate, max_rate=max_rate)
+        _limiters[origin] = limiter
+    limiter.configure(initial_rate, max_rate, additive_step)
+    return limiter
+
+
+def run_pacing(delay_between_prompts: float, concurrency: int) -> Dict[str, float]:
+    """A run's limiter settings: ``get_rate_limiter`` keyword arguments.
+
+    ``delay_between_prompts`` is each worker's closest spacing, so the run
+    as a whole may reach ``concurrency`` prompts per delay. It starts at one
+    worker's pace and ramps up to that ceiling in about ``RAMP_UP_PROMPTS``
+    healthy prompts.
+    """
+    per_worker = 1 / delay_between_prompts if delay_between_prompts > 0 else DEFAULT_MAX_RATE
+    max_rate = per_worker * max(concurrency, 1)
+    return {
+        "initial_rate": per_worker,
+        "max_rate": max_rate,
+        "additive_step": max(max_rate - per_worker, per_worker) / RAMP_UP_PROMPTS,
+    }
+
+
+def rate_limiter_snapshots() -> Dict[str, Dict[str, Any]]:
+    return {origin: limiter.snapshot() for origin, limiter in _limiters.items()}
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from models import PromptData, TestResult, PromptStatus
+from utils.test_runner import ResultCallback
+from utils.work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+# Execution mode of the API process: "local" runs browsers in-process,
+# "remote" hands prompt batches to worker processes (see worker.py)
+EXECUTION_MODE_ENV = "REDPROMPT_EXECUTION_MODE"
+
+DEFAULT_BATCH_SIZE = 25
+
+
+async def run_prompt_tests_remote(
+    work_queue: WorkQueue,
+    test_run_id: str,
+    prompts: List[PromptData],
+    config: Dict[str, Any],
+    on_result: ResultCallback,
+    skip_indices: Optional[Set[int]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    poll_interval: float = 0.5
+):
+    """Run prompts on remote workers and hand each result to ``on_result`` as it lands.
+
+    Prompts are enqueued in batches together with ``config`` (the run's
+    ``TestRunRequest`` fields). Prompts of batches that exhausted their
+    delivery attempts are reported as failed. Cancelling the caller cancels
+    the run's outstanding batches.
+    """
+    items = [
+        (index, prompt.dict())
+        for index, prompt in enumerate(prompts)
+        if not (skip_indices and index in skip_indices)
+    ]
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    # Clear leftovers of an earlier attempt at this run
+    await asyncio.to_thread(work_queue.purge, test_run_id)
+    await asyncio.to_thread(work_queue.enqueue, test_run_id, config, batches)
+    logger.info(f"Queued {len(items)} prompts for run {test_run_id} in {len(batches)} batch(es)")
+
+    pending = {index for index, _ in items}
+    last_seq = 0
+    try:
+        while pending:
+            rows = await asyncio.to_thread(work_queue.fetch_results, test_run_id, last_seq)
+            for seq, index, result in rows:
+                last_seq = seq
+                if index in pending:
+                    pending.discard(index)
+                    await on_result(index, TestResult(**result))
+            if rows:
+                continue
+
+            status = await asyncio.to_thread(work_queue.run_status, test_run_id)
+            for (index, prompt), error in status["failed_items"]:
+                if index in pending:
+                    pending.discard(index)
+                    await on_result(index, TestResult(
+                        id=prompt["id"],
+                        prompt=prompt["prompt"],
+                        response=None,
+                        status=PromptStatus.failed,
+                        timestamp=datetime.now().isoformat(),
+                        execution_time=0.0,
+                        error_message=f"Worker gave up on batch: {error}",
+                        tags=prompt.get("tags") or []
+                    ))
+            if pending and not any(status["batches"].get(state) for state in ("queued", "leased")):
+                # Nothing left that could still report; wait for stragglers once more
+                rows = await asyncio.to_thread(work_queue.fetch_results, test_run_id, last_seq)
+                if not rows:
+                    raise Exception(f"{len(pending)} prompts were never reported by a worker")
+                continue
+            await asyncio.sleep(poll_interval)
+    except asyncio.CancelledError:
+        await asyncio.to_thread(work_queue.cancel, test_run_id)
+        raise
+    finally:
+        if not pending:
+            await asyncio.to_thread(work_queue.purge, test_run_id)
@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from models import TestResult, PromptStatus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "cache/responses.db"
+
+# Prompt hashes per lookup query, below SQLite's limit on bound parameters
+LOOKUP_BATCH_SIZE = 500
+
+# Expired and excess entries are pruned at most this often, unless the cache is full
+EVICT_INTERVAL_SECONDS = 60.0
+
+# A full cache is pruned to this fraction below max_entries (1/20 = 5%)
+EVICT_HEADROOM_DIVISOR = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    origin TEXT,
+    prompt_hash TEXT,
+    result TEXT,
+    created_at REAL,
+    last_access REAL,
+    PRIMARY KEY (origin, prompt_hash)
+);
+CREATE INDEX IF NOT EXISTS responses_by_access ON responses (last_access);
+CREATE INDEX IF NOT EXISTS responses_by_age ON responses (created_at);
+"""
+
+
+class ResponseCache:
+    """Completed results keyed by (target origin, prompt content hash).
+
+    Entries expire after ``ttl_seconds`` and the least recently used entries
+    are evicted once more than ``max_entries`` are stored. The entry count is
+    tracked in memory, so eviction only queries the table when the cache
+    may be full or every ``evict_interval`` seconds. The connection is
+    shared across threads, so every use of it holds ``lock``.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: float = 30 * 24 * 3600,
+        max_entries: int = 100000,
+        evict_interval: float = EVICT_INTERVAL_SECONDS
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        # At least the number of stored entries; exact after each eviction
+        self.entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self.last_evict = time.monotonic()
+
+    def get(self, origin: str, prompt_hash: str, max_age_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached result and its age, or None if missing, expired or too old."""
+        return self.get_many(origin, [prompt_hash], max_age_seconds).get(prompt_hash)
+
+    def get_many(
+        self,
+        origin: str,
+        prompt_hashes: Iterable[str],
+        max_age_seconds: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Look up many prompts of one origin at once; returns the hits by prompt hash.
+
+        Hits are read in batches and their access times updated in a single
+        transaction, so this is meant to run in a worker thread.
+        """
+        prompt_hashes = list(dict.fromkeys(prompt_hashes))
+        now = time.time()
+        max_age = self.ttl_seconds if max_age_seconds is None else min(max_age_seconds, self.ttl_seconds)
+        found: Dict[str, Dict[str, Any]] = {}
+        with self.lock:
+            for start in range(0, len(prompt_hashes), LOOKUP_BATCH_SIZE):
+                batch = prompt_hashes[start:start + LOOKUP_BATCH_SIZE]
+                rows = self.conn.execute(
+                    "SELECT prompt_hash, result, created_at FROM responses "
+                    f"WHERE origin = ? AND prompt_hash IN ({', '.join('?' * len(batch))}) AND created_at >= ?",
+                    (origin, *batch, now - max_age)
+                ).fetchall()
+                for prompt_hash, result, created_at in rows:
+                    found[prompt_hash] = {"result": json.loads(result), "cached_at": created_at}
+            if found:
+                self.conn.executemany(
+                    "UPDATE responses SET last_access = ? WHERE origin = ? AND prompt_hash = ?",
+                    [(now, origin, prompt_hash) for prompt_hash in found]
+                )
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(prompt_hashes) - len(found)
+        return found
+
+    def put(self, origin: str, prompt_hash: str, result: TestResult):
+        """Store a completed result; failures and timeouts are never cached."""
+        if result.status != PromptStatus.completed:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (origin, prompt_hash, result, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (origin, prompt_hash, result.json(), now, now)
+            )
+            # Counts a replaced entry too; the next eviction corrects it
+            self.entries += 1
+            if self.entries > self.max_entries or time.monotonic() - self.last_evict >= self.evict_interval:
+                self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float):
+        self.conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self.entries - self.max_entries
+        if excess > 0:
+            # Leave some headroom so a full cache is not pruned on every put
+            excess += self.max_entries // EVICT_HEADROOM_DIVISOR
+            self.conn.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+            self.entries = max(self.entries - excess, 0)
+        self.last_evict = time.monotonic()
+
+    def clear(self, origin: Optional[str] = None):
+        with self.lock:
+            if origin is None:
+                self.conn.execute("DELETE FROM responses")
+            else:
+                self.conn.execute("DELETE FROM responses WHERE origin = ?", (origin,))
+            self.conn.commit()
+            self.entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
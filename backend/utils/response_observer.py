@@ -0,0 +1,101 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Installed in the widget frame before the prompt is sent. It snapshots the
+# current last message so that only new assistant output is reported, and
+# timestamps the first and latest change of the response text.
+INSTALL_OBSERVER_SCRIPT = """
+({ selectors, prompt }) => {
+    const previous = window.__redpromptObserver;
+    if (previous && previous.observer) previous.observer.disconnect();
+
+    const pick = () => {
+        for (const selector of selectors) {
+            let elements;
+            try { elements = document.querySelectorAll(selector); } catch (e) { continue; }
+            if (elements.length) return { element: elements[elements.length - 1], selector };
+        }
+        return null;
+    };
+
+    const baseline = pick();
+    const state = {
+        baselineElement: baseline ? baseline.element : null,
+        baselineText: baseline ? (baseline.element.innerText || '').trim() : '',
+        prompt: (prompt || '').trim(),
+        text: '',
+        selector: null,
+        firstAt: null,
+        lastAt: null,
+    };
+
+    const check = () => {
+        const match = pick();
+        if (!match) return;
+        const text = (match.element.innerText || '').trim();
+        if (!text || text === state.prompt) return;
+        if (match.element === state.baselineElement && text === state.baselineText) return;
+        if (text !== state.text) {
+            const now = Date.now();
+            if (state.firstAt === null) state.firstAt = now;
+            state.lastAt = now;
+            state.text = text;
+            state.selector = match.selector;
+        }
+    };
+
+    state.observer = new MutationObserver(check);
+    state.observer.observe(document.body || document.documentElement, {
+        childList: true, subtree: true, characterData: true
+    });
+    window.__redpromptObserver = state;
+}
+"""
+
+# Resolves once the response text has been quiet for ``quietMs`` or the
+# overall ``maxWaitMs`` budget runs out, whichever comes first.
+WAIT_SETTLED_SCRIPT = """
+({ quietMs, maxWaitMs }) => new Promise((resolve) => {
+    const state = window.__redpromptObserver;
+    if (!state) { resolve(null); return; }
+    const startedAt = Date.now();
+    const finish = (settled) => {
+        state.observer.disconnect();
+        resolve({
+            text: state.text,
+            selector: state.selector,
+            firstAt: state.firstAt,
+            lastAt: state.lastAt,
+            settled,
+        });
+    };
+    const tick = () => {
+        const now = Date.now();
+        if (state.lastAt !== null && now - state.lastAt >= quietMs) { finish(true); return; }
+        if (now - startedAt >= maxWaitMs) { finish(false); return; }
+        setTimeout(tick, Math.min(quietMs, 100));
+    };
+    tick();
+})
+"""
+
+
+async def install_response_observer(frame: Any, selectors: List[str], prompt: str):
+    """Inject the MutationObserver into the widget frame ahead of sending a prompt."""
+    await frame.evaluate(INSTALL_OBSERVER_SCRIPT, {"selectors": selectors, "prompt": prompt})
+
+
+async def wait_for_settled_response(
+    frame: Any,
+    quiet_ms: int = 1000,
+    max_wait_ms: int = 15000
+) -> Optional[Dict[str, Any]]:
+    """Wait in-page for the response to settle and return it in one round trip.
+
+    The returned dict holds ``text``, the matching ``selector``, ``firstAt`` and
+    ``lastAt`` (epoch milliseconds, or ``None`` if nothing arrived) and whether
+    the response ``settled`` before the budget ran out.
+    """
+    return await frame.evaluate(WAIT_SETTLED_SCRIPT, {"quietMs": quiet_ms, "maxWaitMs": max_wait_ms})
@@ -0,0 +1,338 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.run_storage import (
+    RUN_FILE_SUFFIX, LEGACY_RUN_FILE_SUFFIX, read_run_header, iter_run_records, run_id_of
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "results/index.db"
+
+# Results landing during a run are written in batches of up to this many,
+# at most this many seconds apart
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL_SECONDS = 1.0
+
+RUN_FIELDS = [
+    "test_run_id", "target_url", "timestamp", "status", "total_prompts",
+    "successful_tests", "failed_tests", "error"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    test_run_id TEXT PRIMARY KEY,
+    target_url TEXT,
+    timestamp TEXT,
+    status TEXT,
+    total_prompts INTEGER,
+    successful_tests INTEGER,
+    failed_tests INTEGER,
+    error TEXT,
+    file_mtime REAL,
+    sort_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS runs_by_target ON runs (target_url, timestamp DESC);
+
+CREATE TABLE IF NOT EXISTS results (
+    test_run_id TEXT,
+    idx INTEGER,
+    prompt_id TEXT,
+    status TEXT,
+    execution_time REAL,
+    timestamp TEXT,
+    PRIMARY KEY (test_run_id, idx)
+);
+CREATE INDEX IF NOT EXISTS results_by_status ON results (status, test_run_id);
+
+CREATE TABLE IF NOT EXISTS result_tags (
+    test_run_id TEXT,
+    idx INTEGER,
+    tag TEXT
+);
+CREATE INDEX IF NOT EXISTS result_tags_by_tag ON result_tags (tag, test_run_id);
+CREATE INDEX IF NOT EXISTS result_tags_by_result ON result_tags (test_run_id, idx);
+
+CREATE TABLE IF NOT EXISTS run_generations (
+    test_run_id TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+"""
+
+
+def sort_key_of(run: Dict[str, Any], file_mtime: Optional[float] = None) -> str:
+    """The run's position in listings: its timestamp, else when it was created or written.
+
+    Never null, so every run has a place in the keyset order.
+    """
+    if run.get("timestamp"):
+        return str(run["timestamp"])
+    if run.get("created_at"):
+        return str(run["created_at"])
+    if file_mtime is not None:
+        return datetime.fromtimestamp(file_mtime).isoformat()
+    return ""
+
+
+def encode_cursor(sort_key: str, test_run_id: str) -> str:
+    raw = json.dumps([sort_key, test_run_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        sort_key, test_run_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(sort_key, str) or not isinstance(test_run_id, str):
+            raise ValueError
+        return sort_key, test_run_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class ResultsIndex:
+    """SQLite index of run metadata and per-result status, tags and timing.
+
+    The index is maintained as runs are written, so listing runs never has to
+    open the run files themselves. The connection is shared with reads done in
+    worker threads, so every use of it holds ``lock``; ``StatsStore`` is given
+    the same lock for the same connection.
+
+    Results of running runs are queued with ``buffer_result`` and written in
+    batches (``take_pending`` on the event loop, then ``write_results`` in a
+    worker thread), so a run does not commit once per result.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+        # Bumped on every write, so listings can be revalidated without a query
+        self.generation = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.pending: List[Tuple[str, int, Dict[str, Any]]] = []
+        self.last_flush = time.monotonic()
+
+    def _migrate(self):
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        if "sort_key" not in columns:
+            # Indexes from before runs had a non-null sort key
+            self.conn.execute("ALTER TABLE runs ADD COLUMN sort_key TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("UPDATE runs SET sort_key = COALESCE(timestamp, '')")
+            self.conn.execute("DROP INDEX IF EXISTS runs_by_time")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS runs_by_sort_key ON runs (sort_key DESC, test_run_id DESC)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def upsert_run(self, run: Dict[str, Any], file_mtime: Optional[float] = None):
+        """Insert or update a run's metadata."""
+        with self.lock:
+            values = [run.get(field) for field in RUN_FIELDS]
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(RUN_FIELDS)}, file_mtime, sort_key) "
+                f"VALUES ({', '.join('?' for _ in RUN_FIELDS)}, ?, ?)",
+                values + [file_mtime, sort_key_of(run, file_mtime)]
+            )
+            self.conn.commit()
+            self.version += 1
+
+    def add_result(self, test_run_id: str, index: int, record: Dict[str, Any], commit: bool = True):
+        """Index a single result as it lands."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (test_run_id, idx, prompt_id, status, execution_time, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    test_run_id, index, record.get("id"), record.get("status"),
+                    record.get("execution_time"), record.get("timestamp")
+                )
+            )
+            self.conn.execute("DELETE FROM result_tags WHERE test_run_id = ? AND idx = ?", (test_run_id, index))
+            self.conn.executemany(
+                "INSERT INTO result_tags (test_run_id, idx, tag) VALUES (?, ?, ?)",
+                [(test_run_id, index, tag) for tag in set(record.get("tags") or [])]
+            )
+            if commit:
+                self.conn.commit()
+            self.version += 1
+
+    def buffer_result(self, test_run_id: str, index: int, record: Dict[str, Any]):
+        """Queue a result of a running run to be indexed by the next batch write."""
+        self.pending.append((test_run_id, index, record))
+
+    def flush_due(self) -> bool:
+        """Whether queued results have reached ``FLUSH_BATCH_SIZE`` or waited ``FLUSH_INTERVAL_SECONDS``."""
+        return len(self.pending) >= FLUSH_BATCH_SIZE or (
+            bool(self.pending) and time.monotonic() - self.last_flush >= FLUSH_INTERVAL_SECONDS
+        )
+
+    def take_pending(self) -> List[Tuple[str, int, Dict[str, Any]]]:
+        """Hand over the queued results, for ``write_results``."""
+        # Swapped rather than locked, so queueing never waits for a batch being written
+        pending, self.pending = self.pending, []
+        self.last_flush = time.monotonic()
+        return pending
+
+    def write_results(self, pending: List[Tuple[str, int, Dict[str, Any]]], commit: bool = True):
+        """Index a batch of results in one transaction."""
+        with self.lock:
+            for test_run_id, index, record in pending:
+                self.add_result(test_run_id, index, record, commit=False)
+            if commit:
+                self.conn.commit()
+
+    def bump_generation(self, test_run_id: str, commit: bool = True):
+        """Record that a run's indexed results are being replaced, not only added to.
+
+        Statistics folded in from the previous results are stale from then on;
+        see ``StatsStore.rebuild_if_stale``.
+        """
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO run_generations (test_run_id, generation) VALUES (?, 1) "
+                "ON CONFLICT (test_run_id) DO UPDATE SET generation = generation + 1",
+                (test_run_id,)
+            )
+            if commit:
+                self.conn.commit()
+
+    def etag(self) -> str:
+        """Validator for anything read from the index; changes whenever the index does."""
+        return f'"{self.generation}-{self.version:x}"'
+
+    def index_run_file(self, path: str):
+        """(Re)index a run result file written before the index existed."""
+        with self.lock:
+            run = read_run_header(path)
+            test_run_id = run.get("test_run_id") or run_id_of(os.path.basename(path))
+            run["test_run_id"] = test_run_id
+            self.bump_generation(test_run_id, commit=False)
+            self.conn.execute("DELETE FROM results WHERE test_run_id = ?", (test_run_id,))
+            self.conn.execute("DELETE FROM result_tags WHERE test_run_id = ?", (test_run_id,))
+            for i, record in enumerate(iter_run_records(path)):
+                self.add_result(test_run_id, record.get("index", i), record, commit=False)
+            self.upsert_run(run, file_mtime=os.path.getmtime(path))
+
+    def sync_directory(self, results_dir: str = "results"):
+        """Index run files that are missing from the index or changed on disk."""
+        with self.lock:
+            known = {
+                row["test_run_id"]: row["file_mtime"]
+                for row in self.conn.execute("SELECT test_run_id, file_mtime FROM runs")
+            }
+        indexed = 0
+        filenames = set(os.listdir(results_dir))
+        for filename in sorted(filenames):
+            test_run_id = run_id_of(filename)
+            if test_run_id is None:
+                continue
+            # A legacy file kept after migration is superseded by its compact copy
+            if filename.endswith(LEGACY_RUN_FILE_SUFFIX) and test_run_id + RUN_FILE_SUFFIX in filenames:
+                continue
+            path = os.path.join(results_dir, filename)
+            if known.get(test_run_id) == os.path.getmtime(path):
+                continue
+            try:
+                self.index_run_file(path)
+                indexed += 1
+            except Exception as e:
+                logger.error(f"Failed to index {path}: {e}")
+        if indexed:
+            logger.info(f"Indexed {indexed} run file(s) from {results_dir}")
+
+    def list_runs(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        target_url: Optional[str] = None,
+        status: Optional[str] = None,
+        tag: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        result_status: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """List runs newest first with keyset pagination and filters.
+
+        ``status`` matches the run's own status (e.g. "completed", "error");
+        ``result_status`` and ``tag`` match runs with at least one result with
+        that status (e.g. "timeout") or tag. ``since`` and ``until`` bound the
+        run's timestamp (its creation time while it has none).
+        """
+        fields = fields or RUN_FIELDS
+        unknown = [field for field in fields if field not in RUN_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        where, params = [], []
+        if target_url:
+            where.append("target_url = ?")
+            params.append(target_url)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if result_status:
+            where.append("EXISTS (SELECT 1 FROM results r WHERE r.test_run_id = runs.test_run_id AND r.status = ?)")
+            params.append(result_status)
+        if tag:
+            where.append("EXISTS (SELECT 1 FROM result_tags t WHERE t.test_run_id = runs.test_run_id AND t.tag = ?)")
+            params.append(tag)
+        if since:
+            where.append("sort_key >= ?")
+            params.append(since)
+        if until:
+            where.append("sort_key <= ?")
+            params.append(until)
+
+        filter_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        page_where, page_params = list(where), list(params)
+        if cursor:
+            sort_key, test_run_id = decode_cursor(cursor)
+            page_where.append("(sort_key < ? OR (sort_key = ? AND test_run_id < ?))")
+            page_params += [sort_key, sort_key, test_run_id]
+        page_sql = f"WHERE {' AND '.join(page_where)}" if page_where else ""
+
+        # Always fetch the sort key so the next cursor can be built
+        columns = list(dict.fromkeys(fields + ["sort_key", "test_run_id"]))
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM runs {filter_sql}", params).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT {', '.join(columns)} FROM runs {page_sql} "
+                f"ORDER BY sort_key DESC, test_run_id DESC LIMIT ?",
+                page_params + [limit + 1]
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["sort_key"], rows[-1]["test_run_id"])
+
+        return {
+            "results": [{field: row[field] for field in fields} for row in rows],
+            "total_runs": total,
+            "next_cursor": next_cursor,
+        }
+
+    def has_run(self, test_run_id: str) -> bool:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM runs WHERE test_run_id = ?", (test_run_id,)
+            ).fetchone() is not None
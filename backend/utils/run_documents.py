@@ -0,0 +1,164 @@
+import asyncio
+import os
+import logging
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from utils.run_storage import LEGACY_RUN_FILE_SUFFIX, run_file_path, iter_run_json
+
+logger = logging.getLogger(__name__)
+
+# Serialized runs kept in memory, and the largest single run worth keeping
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+# Compressed run files above this size are streamed instead of serialized whole
+STREAM_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match request header matches ``etag`` (weak comparison)."""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+class RunFile:
+    """A run's result file and its HTTP cache validators."""
+
+    __slots__ = ("path", "size", "etag", "last_modified", "mtime")
+
+    def __init__(self, path: str):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """Whether a conditional GET with these request headers can be answered with 304."""
+        if if_none_match is not None:
+            return etag_matches(if_none_match, self.etag)
+        if if_modified_since is not None:
+            try:
+                return self.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def headers(self) -> Dict[str, str]:
+        # Clients may keep the body but must revalidate it on every poll
+        return {"ETag": self.etag, "Last-Modified": self.last_modified, "Cache-Control": "no-cache"}
+
+
+class RunDocumentCache:
+    """Finished runs as ready-to-send JSON bytes, with their cache validators.
+
+    A run's file and validators are looked up once and then kept in memory
+    until ``invalidate`` is called for it, so a poll that revalidates an
+    unchanged run is answered without touching the disk. Bodies are
+    serialized in a worker thread, at most once at a time per run, and the
+    most recently used ones are kept up to ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        prompt_store,
+        results_dir: str = "results",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_entry_bytes: int = DEFAULT_MAX_ENTRY_BYTES
+    ):
+        self.prompt_store = prompt_store
+        self.results_dir = results_dir
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.files: Dict[str, RunFile] = {}
+        self.bodies: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self.size = 0
+        self._building: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def run_file(self, test_run_id: str) -> Optional[RunFile]:
+        """The run's file, or None if the run has not been written yet."""
+        run_file = self.files.get(test_run_id)
+        if run_file is None:
+            path = run_file_path(test_run_id, self.results_dir)
+            if path is None:
+                return None
+            try:
+                run_file = self.files[test_run_id] = RunFile(path)
+            except FileNotFoundError:
+                return None
+        return run_file
+
+    def invalidate(self, test_run_id: str):
+        """Forget a run's file and body, e.g. after it was (re)written."""
+        self.files.pop(test_run_id, None)
+        self.invalidate_body(test_run_id)
+
+    def streamable(self, run_file: RunFile) -> bool:
+        """Whether the run is too large to serialize whole and should be streamed."""
+        return run_file.size > STREAM_THRESHOLD_BYTES and not run_file.path.endswith(LEGACY_RUN_FILE_SUFFIX)
+
+    def stream(self, run_file: RunFile) -> Iterator[bytes]:
+        return iter_run_json(run_file.path, self.prompt_store)
+
+    async def body(self, test_run_id: str, run_file: RunFile) -> bytes:
+        """The run's JSON document, from memory or serialized off the event loop."""
+        entry = self.bodies.get(test_run_id)
+        if entry is not None and entry[0] == run_file.etag:
+            self.bodies.move_to_end(test_run_id)
+            self.hits += 1
+            return entry[1]
+
+        key = (test_run_id, run_file.etag)
+        task = self._building.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._building[key] = asyncio.ensure_future(asyncio.to_thread(self._serialize, run_file.path))
+            task.add_done_callback(lambda done: self._built(key, run_file, done))
+        # A request that goes away must not cancel the build others are waiting for
+        return await asyncio.shield(task)
+
+    def _built(self, key: Tuple[str, str], run_file: RunFile, task: asyncio.Future):
+        self._building.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        test_run_id = key[0]
+        if self.files.get(test_run_id) is run_file:
+            self._store(test_run_id, run_file.etag, task.result())
+
+    def _serialize(self, path: str) -> bytes:
+        if path.endswith(LEGACY_RUN_FILE_SUFFIX):
+            # Legacy run files already are the JSON document
+            with open(path, "rb") as f:
+                return f.read()
+        return b"".join(iter_run_json(path, self.prompt_store))
+
+    def _store(self, test_run_id: str, etag: str, body: bytes):
+        if len(body) > self.max_entry_bytes:
+            return
+        self.invalidate_body(test_run_id)
+        self.bodies[test_run_id] = (etag, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.bodies.popitem(last=False)
+            self.size -= len(evicted)
+
+    def invalidate_body(self, test_run_id: str):
+        entry = self.bodies.pop(test_run_id, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "runs": len(self.bodies),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before a slow client starts missing results
+SUBSCRIBER_BUFFER = 1000
+
+# Seconds a finished run's progress stays available before it is dropped
+FINISHED_RETENTION_SECONDS = 300.0
+
+
+class RunEventBroker:
+    """Fans per-prompt results and progress counters out to live subscribers.
+
+    Only the progress counters of each run are kept, and only until
+    ``FINISHED_RETENTION_SECONDS`` after it finishes; results themselves are
+    handed to whoever is subscribed at the time and then dropped.
+    """
+
+    def __init__(self):
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def queue(self, test_run_id: str, total_prompts: Optional[int]):
+        """Track a run that waits in the scheduler, so it can be followed before it starts."""
+        self._progress[test_run_id] = {
+            "test_run_id": test_run_id,
+            "status": "queued",
+            "total_prompts": total_prompts,
+            "completed": 0,
+            "successful_tests": 0,
+            "failed_tests": 0,
+            "timeout_tests": 0,
+            "started_at": None,
+            "finished_at": None,
+        }
+        self._publish(test_run_id, {"event": "progress", "data": dict(self._progress[test_run_id])})
+
+    def start(self, test_run_id: str, total_prompts: int, prior_statuses: Optional[Dict[str, int]] = None):
+        """Start tracking a run; ``prior_statuses`` counts results logged by an earlier attempt."""
+        prior = prior_statuses or {}
+        self._progress[test_run_id] = {
+            "test_run_id": test_run_id,
+            "status": "running",
+            "total_prompts": total_prompts,
+            "completed": sum(prior.values()),
+            "successful_tests": prior.get("completed", 0),
+            "failed_tests": prior.get("failed", 0),
+            "timeout_tests": prior.get("timeout", 0),
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None,
+        }
+        self._publish(test_run_id, {"event": "progress", "data": dict(self._progress[test_run_id])})
+
+    def publish_result(self, test_run_id: str, record: Dict[str, Any]):
+        progress = self._progress.get(test_run_id)
+        if progress is not None:
+            progress["completed"] += 1
+            status = record.get("status")
+            if status == "completed":
+                progress["successful_tests"] += 1
+            elif status == "failed":
+                progress["failed_tests"] += 1
+            elif status == "timeout":
+                progress["timeout_tests"] += 1
+            self._publish(test_run_id, {
+                "event": "result",
+                "data": {"result": record, "progress": dict(progress)}
+            })
+
+    def finish(self, test_run_id: str, status: str, error: Optional[str] = None):
+        progress = self._progress.get(test_run_id)
+        if progress is None:
+            return
+        progress["status"] = status
+        progress["finished_at"] = datetime.now().isoformat()
+        if error:
+            progress["error"] = error
+        self._publish(test_run_id, {"event": "done", "data": dict(progress)})
+        asyncio.get_running_loop().call_later(FINISHED_RETENTION_SECONDS, self._forget, test_run_id, progress)
+
+    def _forget(self, test_run_id: str, progress: Dict[str, Any]):
+        # Unless the run was resumed (and started again) meanwhile
+        if self._progress.get(test_run_id) is progress:
+            del self._progress[test_run_id]
+
+    def progress(self, test_run_id: str) -> Optional[Dict[str, Any]]:
+        progress = self._progress.get(test_run_id)
+        return dict(progress) if progress is not None else None
+
+    def _publish(self, test_run_id: str, event: Dict[str, Any]):
+        for queue in self._subscribers.get(test_run_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping event for slow subscriber of run {test_run_id}")
+
+    async def subscribe(self, test_run_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield events for a run until it finishes.
+
+        ``None`` is yielded every ``keepalive`` seconds without events so the
+        caller can keep the connection open.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self._subscribers.setdefault(test_run_id, set()).add(queue)
+        try:
+            progress = self.progress(test_run_id)
+            if progress is not None:
+                yield {"event": "progress", "data": progress}
+                if progress["status"] not in ("queued", "running"):
+                    yield {"event": "done", "data": progress}
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["event"] == "done":
+                    return
+        finally:
+            subscribers = self._subscribers.get(test_run_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[test_run_id]
+
+
+run_events = RunEventBroker()
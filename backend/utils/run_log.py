@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from models import PromptData, TestResult
+
+RUNS_DIR = "runs"
+
+# Run states after which the remaining prompts can still be resumed
+RESUMABLE_STATUSES = ("error", "interrupted", "cancelled")
+
+# Appended results are fsynced in batches, at most this many seconds apart
+SYNC_INTERVAL_SECONDS = 1.0
+
+
+class RunLog:
+    """Append-only JSONL log of one run's results.
+
+    Each completed prompt is written as one line as soon as it finishes, so a
+    crash of the process loses at most the prompt in flight. The log is
+    fsynced in batches by ``sync`` (see ``sync_due``), so a power loss can
+    also lose the last ``SYNC_INTERVAL_SECONDS`` of results. Only byte offsets
+    are kept in memory, which lets the results be re-read in input order
+    without holding them all at once.
+    """
+
+    def __init__(self, test_run_id: str, runs_dir: str = RUNS_DIR):
+        self.test_run_id = test_run_id
+        self.run_dir = os.path.join(runs_dir, test_run_id)
+        self.path = os.path.join(self.run_dir, "results.jsonl")
+        self.manifest_path = os.path.join(self.run_dir, "manifest.json")
+        self.prompts_path = os.path.join(self.run_dir, "prompts.jsonl")
+        self.offsets: Dict[int, int] = {}
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        os.makedirs(self.run_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            self._scan_offsets()
+
+    def _scan_offsets(self):
+        with open(self.path, "rb+") as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn final line from a crash; cut it off so the next append starts a fresh line
+                    f.truncate(offset)
+                    break
+                try:
+                    record = json.loads(line)
+                    self.offsets[record["index"]] = offset
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+
+    def append(self, index: int, result: TestResult) -> Dict[str, Any]:
+        """Append one result and return the record that was written (not yet fsynced)."""
+        record = {"index": index, **result.dict()}
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self.offsets[index] = offset
+        self.unsynced += 1
+        return record
+
+    def sync_due(self) -> bool:
+        """Whether appended results have waited ``SYNC_INTERVAL_SECONDS`` for an fsync."""
+        return self.unsynced > 0 and time.monotonic() - self.last_sync >= SYNC_INTERVAL_SECONDS
+
+    def sync(self):
+        """Flush appended results to disk; blocking, so run it in a worker thread."""
+        if not self.unsynced or not os.path.exists(self.path):
+            return
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        with open(self.path, "ab") as f:
+            os.fsync(f.fileno())
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def completed_indices(self) -> Set[int]:
+        """Input indices that already have a logged result."""
+        return set(self.offsets)
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def update_manifest(self, **fields: Any) -> Dict[str, Any]:
+        """Merge ``fields`` into the manifest and write it atomically."""
+        manifest = self.read_manifest() or {"test_run_id": self.test_run_id}
+        manifest.update(fields)
+        manifest["updated_at"] = datetime.now().isoformat()
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        return manifest
+
+    def load_prompts(self) -> List[PromptData]:
+        """Read back the prompts snapshot of a run started before prompt sets were stored."""
+        with open(self.prompts_path, "r") as f:
+            return [PromptData(**json.loads(line)) for line in f if line.strip()]
+
+    def iter_statuses(self) -> Iterator[str]:
+        for record in self.iter_records():
+            yield record.get("status")
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield records in input order, reading them one at a time."""
+        if not self.offsets:
+            return
+        with open(self.path, "rb") as f:
+            for index in sorted(self.offsets):
+                f.seek(self.offsets[index])
+                yield json.loads(f.readline())
+
+
+def load_run_log(test_run_id: str, runs_dir: str = RUNS_DIR) -> Optional[RunLog]:
+    """Open an existing run, or return None if it has neither a log nor a checkpoint."""
+    run_dir = os.path.join(runs_dir, test_run_id)
+    if not any(os.path.exists(os.path.join(run_dir, name)) for name in ("results.jsonl", "manifest.json")):
+        return None
+    return RunLog(test_run_id, runs_dir)
+
+
+def find_interrupted_runs(runs_dir: str = RUNS_DIR) -> List[RunLog]:
+    """Return runs whose manifest still says "running", i.e. the process died mid-run."""
+    if not os.path.isdir(runs_dir):
+        return []
+    interrupted = []
+    for test_run_id in sorted(os.listdir(runs_dir)):
+        run_log = load_run_log(test_run_id, runs_dir)
+        manifest = run_log.read_manifest() if run_log is not None else None
+        if manifest and manifest.get("status") == "running":
+            interrupted.append(run_log)
+    return interrupted
@@ -0,0 +1,238 @@
+import csv
+import gzip
+import json
+import os
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from models import TestResult
+from utils.file_parser import prompt_content_hash
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used instead
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional, only needed for Parquet exports
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = "results"
+
+# Compact run files; runs written before them are plain JSON documents
+RUN_FILE_SUFFIX = ".jsonl.gz"
+LEGACY_RUN_FILE_SUFFIX = ".json"
+RUN_FILE_FORMAT = "redprompt-run/1"
+
+# Records written or resolved per prompt store round trip
+BATCH_SIZE = 500
+
+# Every field of a result record, in the order the API has always returned them
+RECORD_FIELDS = ["index"] + list(TestResult.model_fields)
+
+# Parquet column types other than string; tags are a list of strings
+PARQUET_TYPES = {
+    "index": "int64", "token_usage": "int64", "worker_id": "int64", "requests_blocked": "int64",
+    "bytes_saved": "int64", "execution_time": "float64", "first_token_time": "float64",
+    "response_time": "float64", "load_time": "float64", "cached": "bool",
+}
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """Compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def run_file_path(test_run_id: str, results_dir: str = RESULTS_DIR) -> Optional[str]:
+    """Path of a run's result file, compact or legacy, or None if it has none yet."""
+    for suffix in (RUN_FILE_SUFFIX, LEGACY_RUN_FILE_SUFFIX):
+        path = os.path.join(results_dir, test_run_id + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def run_id_of(filename: str) -> Optional[str]:
+    """Run ID of a result file name, or None if it is not one."""
+    for suffix in (RUN_FILE_SUFFIX, LEGACY_RUN_FILE_SUFFIX):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return None
+
+
+def _compact(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in record.items() if value is not None and key != "prompt"}
+
+
+def _expand(record: Dict[str, Any]) -> Dict[str, Any]:
+    expanded = {field: record.get(field) for field in RECORD_FIELDS}
+    expanded.update(record)
+    return expanded
+
+
+def write_run_file(path: str, header: Dict[str, Any], records: Iterable[Dict[str, Any]], prompt_store):
+    """Write a run as gzipped JSONL: a header line, then one compact line per result.
+
+    Prompt texts are not repeated in the file. Each record keeps only the
+    content hash of its prompt, and the text is kept in ``prompt_store``,
+    once for every run and prompt set that contains it. Null fields are left
+    out as well; ``iter_run_records`` restores both.
+    """
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(json.dumps({"format": RUN_FILE_FORMAT, "header": header}, separators=(",", ":")) + "\n")
+        texts: Dict[str, str] = {}
+        for record in records:
+            prompt = record.get("prompt")
+            if prompt is not None:
+                record["content_hash"] = prompt_content_hash(prompt)
+                texts[record["content_hash"]] = prompt
+            f.write(json.dumps(_compact(record), separators=(",", ":")) + "\n")
+            if len(texts) >= BATCH_SIZE:
+                prompt_store.retain_texts(texts)
+                texts = {}
+        if texts:
+            prompt_store.retain_texts(texts)
+    os.replace(tmp_path, path)
+
+
+def _load_legacy(path: str) -> Dict[str, Any]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def read_run_header(path: str) -> Dict[str, Any]:
+    """Run metadata of a result file, without its results."""
+    if not path.endswith(RUN_FILE_SUFFIX):
+        run = _load_legacy(path)
+        run.pop("results", None)
+        return run
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        first = json.loads(f.readline())
+    if first.get("format") != RUN_FILE_FORMAT:
+        raise ValueError(f"{path} is not a {RUN_FILE_FORMAT} file")
+    return first["header"]
+
+
+def iter_run_records(path: str, prompt_store=None) -> Iterator[Dict[str, Any]]:
+    """Yield a run's result records in order, reading the file line by line.
+
+    With a ``prompt_store`` the records are restored to full results,
+    prompt text included; without one they are yielded as stored, which is
+    enough for indexing.
+    """
+    if not path.endswith(RUN_FILE_SUFFIX):
+        for record in _load_legacy(path).get("results") or []:
+            yield record
+        return
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()
+        batch: List[Dict[str, Any]] = []
+        for line in f:
+            if not line.strip():
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= BATCH_SIZE:
+                yield from _resolve(batch, prompt_store)
+                batch = []
+        yield from _resolve(batch, prompt_store)
+
+
+def _resolve(batch: List[Dict[str, Any]], prompt_store) -> List[Dict[str, Any]]:
+    if prompt_store is None:
+        return batch
+    texts = prompt_store.get_texts(record["content_hash"] for record in batch if "content_hash" in record)
+    for record in batch:
+        record["prompt"] = texts.get(record.get("content_hash"))
+    return [_expand(record) for record in batch]
+
+
+def iter_run_json(path: str, prompt_store) -> Iterator[bytes]:
+    """The run as the JSON document the API returns, produced in chunks of ``BATCH_SIZE`` results."""
+    header = dumps_bytes(read_run_header(path))
+    yield (header[:-1] + b',"results":[') if header != b"{}" else b'{"results":['
+    chunk: List[bytes] = []
+    first = True
+    for record in iter_run_records(path, prompt_store):
+        chunk.append(dumps_bytes(record))
+        if len(chunk) >= BATCH_SIZE:
+            yield (b"" if first else b",") + b",".join(chunk)
+            chunk, first = [], False
+    if chunk:
+        yield (b"" if first else b",") + b",".join(chunk)
+    yield b"]}"
+
+
+def load_run(path: str, prompt_store) -> Dict[str, Any]:
+    """A whole run, header and results, in memory."""
+    return {**read_run_header(path), "results": list(iter_run_records(path, prompt_store))}
+
+
+def migrate_run_file(path: str, prompt_store, keep: bool = False) -> str:
+    """Rewrite a legacy JSON run file in the compact format and return the new path."""
+    run = _load_legacy(path)
+    records = run.pop("results", None) or []
+    new_path = path[:-len(LEGACY_RUN_FILE_SUFFIX)] + RUN_FILE_SUFFIX
+    write_run_file(
+        new_path,
+        run,
+        (dict(record, index=record.get("index", i)) for i, record in enumerate(records)),
+        prompt_store
+    )
+    if sum(1 for _ in iter_run_records(new_path)) != len(records):
+        os.remove(new_path)
+        raise ValueError(f"{new_path} does not hold all {len(records)} results of {path}")
+    if not keep:
+        os.remove(path)
+    return new_path
+
+
+def _export_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: record.get(column) for column in RECORD_FIELDS}
+
+
+def export_run(path: str, out_path: str, prompt_store, export_format: str = "parquet"):
+    """Write a run's results as a table, one row per result, for analytics tools.
+
+    ``parquet`` (columnar, needs pyarrow) is written in row groups of
+    ``BATCH_SIZE`` results; ``csv`` needs nothing beyond the standard library.
+    """
+    records = iter_run_records(path, prompt_store)
+    if export_format == "csv":
+        with open(out_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            for record in records:
+                row = _export_row(record)
+                row["tags"] = json.dumps(row["tags"] or [])
+                row["timings"] = json.dumps(row["timings"]) if row["timings"] else None
+                writer.writerow(row)
+        return
+
+    if export_format != "parquet":
+        raise ValueError(f"Unknown export format: {export_format}")
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = pyarrow.schema([
+        pyarrow.field(column, pyarrow.list_(pyarrow.string()) if column == "tags"
+                      else pyarrow.type_for_alias(PARQUET_TYPES.get(column, "string")))
+        for column in RECORD_FIELDS
+    ])
+    with pyarrow.parquet.ParquetWriter(out_path, schema, compression="zstd") as writer:
+        batch: List[Dict[str, Any]] = []
+        for record in records:
+            row = _export_row(record)
+            row["timings"] = json.dumps(row["timings"]) if row["timings"] else None
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.selector_cache import origin_of
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_PATH = "runs/jobs.db"
+
+# Job states; "interrupted" means the process stopped while the job was running
+JOB_STATUSES = ["queued", "running", "completed", "error", "cancelled", "interrupted"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    test_run_id TEXT PRIMARY KEY,
+    target_url TEXT,
+    target TEXT,
+    priority INTEGER,
+    status TEXT,
+    options TEXT,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_queue ON jobs (status, priority DESC, created_at);
+"""
+
+JOB_FIELDS = [
+    "test_run_id", "target_url", "target", "priority", "status", "options",
+    "created_at", "started_at", "finished_at", "error"
+]
+
+# Runs one job; returns the run's final status ("completed" or "error")
+JobRunner = Callable[[Dict[str, Any]], Awaitable[Optional[str]]]
+
+
+class JobScheduler:
+    """Durable priority queue of test runs with global and per-target caps.
+
+    Jobs are stored in SQLite, so queued runs survive a restart. At most
+    ``max_running`` jobs run at once (each one drives its own Chromium), and
+    at most ``per_target_limit`` of them against the same target origin.
+    Higher ``priority`` jobs start first; equal priorities run in
+    submission order.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        path: str = DEFAULT_JOBS_PATH,
+        max_running: int = 2,
+        per_target_limit: int = 1
+    ):
+        self.runner = runner
+        self.path = path
+        self.max_running = max_running
+        self.per_target_limit = per_target_limit
+        self.stopping = False
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._targets: Dict[str, str] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def start(self):
+        """Start dispatching; jobs left running by a previous process become interrupted."""
+        self.stopping = False
+        self.conn.execute(
+            "UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE status = 'running'",
+            (datetime.now().isoformat(),)
+        )
+        self.conn.commit()
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Stop dispatching and interrupt running jobs; queued jobs stay queued."""
+        self.stopping = True
+        tasks = list(self._tasks.values())
+        if self._loop_task:
+            tasks.append(self._loop_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+    def submit(
+        self,
+        test_run_id: str,
+        target_url: str,
+        priority: int = 0,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Queue a run (or re-queue a finished one, e.g. to resume it)."""
+        if test_run_id in self._tasks:
+            raise ValueError("Test run is already running")
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(JOB_FIELDS)}) "
+            f"VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+            (
+                test_run_id, target_url, origin_of(target_url), priority, "queued",
+                json.dumps(options or {}), datetime.now().isoformat(), None, None, None
+            )
+        )
+        self.conn.commit()
+        self._notify()
+        return self.get(test_run_id)
+
+    def cancel(self, test_run_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; returns None if the job is unknown."""
+        job = self.get(test_run_id)
+        if job is None:
+            return None
+        if job["status"] == "queued":
+            self._finish(test_run_id, "cancelled")
+        elif test_run_id in self._tasks:
+            self._tasks[test_run_id].cancel()
+        return self.get(test_run_id)
+
+    def get(self, test_run_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM jobs WHERE test_run_id = ?", (test_run_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """List jobs, running and queued ones first in the order they will run."""
+        where, params = "", []
+        if status:
+            where, params = "WHERE status = ?", [status]
+        rows = self.conn.execute(
+            f"SELECT * FROM jobs {where} "
+            "ORDER BY CASE status WHEN 'running' THEN 0 WHEN 'queued' THEN 1 ELSE 2 END, "
+            "CASE WHEN status IN ('running', 'queued') THEN -priority ELSE 0 END, "
+            "CASE WHEN status IN ('running', 'queued') THEN created_at END, "
+            "created_at DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def utilization(self) -> Dict[str, Any]:
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "max_running": self.max_running,
+            "per_target_limit": self.per_target_limit,
+            "running": len(self._tasks),
+            "queued": counts.get("queued", 0),
+        }
+
+    def _job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = {field: row[field] for field in JOB_FIELDS}
+        job["options"] = json.loads(job["options"] or "{}")
+        if job["status"] == "queued":
+            job["queue_position"] = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (row["priority"], row["priority"], row["created_at"])
+            ).fetchone()[0]
+        return job
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _finish(self, test_run_id: str, status: str, error: Optional[str] = None):
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE test_run_id = ?",
+            (status, datetime.now().isoformat(), error, test_run_id)
+        )
+        self.conn.commit()
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                self._dispatch()
+            except Exception as e:
+                logger.error(f"Job dispatch failed: {e}")
+            await self._wake.wait()
+
+    def _dispatch(self):
+        """Start as many queued jobs as the global and per-target caps allow."""
+        if len(self._tasks) >= self.max_running:
+            return
+        running_per_target: Dict[str, int] = {}
+        for target in self._targets.values():
+            running_per_target[target] = running_per_target.get(target, 0) + 1
+
+        queued = self.conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at"
+        ).fetchall()
+        for row in queued:
+            if len(self._tasks) >= self.max_running:
+                break
+            if running_per_target.get(row["target"], 0) >= self.per_target_limit:
+                continue
+            test_run_id = row["test_run_id"]
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, finished_at = NULL, error = NULL "
+                "WHERE test_run_id = ?",
+                (datetime.now().isoformat(), test_run_id)
+            )
+            self.conn.commit()
+            running_per_target[row["target"]] = running_per_target.get(row["target"], 0) + 1
+            self._targets[test_run_id] = row["target"]
+            self._tasks[test_run_id] = asyncio.create_task(self._run(self.get(test_run_id)))
+            logger.info(f"Started job {test_run_id} ({len(self._tasks)}/{self.max_running} running)")
+
+    async def _run(self, job: Dict[str, Any]):
+        test_run_id = job["test_run_id"]
+        status, error = "completed", None
+        try:
+            status = await self.runner(job) or "completed"
+        except asyncio.CancelledError:
+            status = "interrupted" if self.stopping else "cancelled"
+        except Exception as e:
+            status, error = "error", str(e)
+            logger.error(f"Job {test_run_id} failed: {e}")
+        finally:
+            self._tasks.pop(test_run_id, None)
+            self._targets.pop(test_run_id, None)
+            self._finish(test_run_id, status, error)
+            self._notify()
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from playwright.async_api import Page, ElementHandle
+
+try:
+    from PIL import Image
+except ImportError:  # optional: WebP output and perceptual-hash dedup
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCREENSHOTS_DIR = "screenshots"
+
+# Hashes of a run's screenshots differing in at most this many bits are duplicates
+DEFAULT_DEDUP_DISTANCE = 6
+
+# Run IDs are UUIDs; file names are the ones _store generates
+RUN_ID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+FILENAME_PATTERN = re.compile(r"[A-Za-z0-9_.-]+\.(jpg|webp)")
+
+
+def difference_hash(image_bytes: bytes, size: int = 8) -> int:
+    """64-bit dHash: brightness gradients of a tiny grayscale thumbnail."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        pixels = list(image.convert("L").resize((size + 1, size)).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class ScreenshotStore:
+    """Compact failure screenshots under screenshots/{test_run_id}/, with a disk budget per run.
+
+    Captures are viewport or single-element screenshots. Encoding, hashing and
+    writing happen in a worker thread. Near-identical screenshots within a run
+    (by perceptual hash with Pillow, byte-identical without it) are stored
+    once and shared. Once a run has used ``max_bytes_per_run`` no further
+    screenshots are kept for it.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SCREENSHOTS_DIR,
+        image_format: str = "jpeg",
+        quality: int = 60,
+        max_bytes_per_run: int = 50 * 1024 * 1024,
+        dedup_distance: int = DEFAULT_DEDUP_DISTANCE
+    ):
+        if image_format == "webp" and Image is None:
+            logger.warning("WebP screenshots need Pillow; falling back to JPEG")
+            image_format = "jpeg"
+        self.path = path
+        self.image_format = image_format
+        self.quality = quality
+        self.max_bytes_per_run = max_bytes_per_run
+        self.dedup_distance = dedup_distance
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, test_run_id: str) -> Dict[str, Any]:
+        run = self._runs.get(test_run_id)
+        if run is None:
+            run_dir = os.path.join(self.path, test_run_id)
+            os.makedirs(run_dir, exist_ok=True)
+            used = sum(os.path.getsize(os.path.join(run_dir, name)) for name in os.listdir(run_dir))
+            run = self._runs[test_run_id] = {
+                "dir": run_dir,
+                "bytes": used,
+                "hashes": [],
+                "saved": 0,
+                "deduplicated": 0,
+                "over_budget": 0,
+            }
+        return run
+
+    async def capture(
+        self,
+        page: Page,
+        test_run_id: str,
+        prompt_id: str,
+        element: Optional[ElementHandle] = None
+    ) -> Optional[str]:
+        """Capture the widget element (or the viewport) and return its /screenshots URL."""
+        run = self._run(test_run_id)
+        if run["bytes"] >= self.max_bytes_per_run:
+            run["over_budget"] += 1
+            return None
+
+        # Without Pillow the browser encodes the JPEG itself
+        options = {"type": "png"} if Image is not None else {"type": "jpeg", "quality": self.quality}
+        try:
+            raw = await element.screenshot(**options) if element else None
+        except Exception:
+            raw = None
+        if raw is None:
+            raw = await page.screenshot(full_page=False, **options)
+
+        filename = await asyncio.to_thread(self._store_locked, run, prompt_id, raw)
+        if filename is None:
+            return None
+        return f"/screenshots/{test_run_id}/{filename}"
+
+    def _store_locked(self, run: Dict[str, Any], prompt_id: str, raw: bytes) -> Optional[str]:
+        with self._lock:
+            return self._store(run, prompt_id, raw)
+
+    def _store(self, run: Dict[str, Any], prompt_id: str, raw: bytes) -> Optional[str]:
+        """Encode, deduplicate and write one screenshot (runs in a worker thread)."""
+        if Image is not None:
+            key = difference_hash(raw)
+            duplicate = self._find_duplicate(run["hashes"], key, self._near)
+        else:
+            key = hashlib.sha256(raw).hexdigest()
+            duplicate = self._find_duplicate(run["hashes"], key, lambda a, b: a == b)
+        if duplicate:
+            run["deduplicated"] += 1
+            return duplicate
+
+        data, extension = self._encode(raw)
+        if run["bytes"] + len(data) > self.max_bytes_per_run:
+            run["over_budget"] += 1
+            return None
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", prompt_id)
+        filename = f"{safe_id}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.{extension}"
+        with open(os.path.join(run["dir"], filename), "wb") as f:
+            f.write(data)
+        run["bytes"] += len(data)
+        run["saved"] += 1
+        run["hashes"].append((key, filename))
+        logger.info(f"Screenshot saved: {filename} ({len(data) // 1024} KB)")
+        return filename
+
+    def _near(self, a: int, b: int) -> bool:
+        return bin(a ^ b).count("1") <= self.dedup_distance
+
+    @staticmethod
+    def _find_duplicate(hashes: List[Tuple[Any, str]], key: Any, same) -> Optional[str]:
+        for existing, filename in hashes:
+            if same(existing, key):
+                return filename
+        return None
+
+    def _encode(self, raw: bytes) -> Tuple[bytes, str]:
+        if Image is None:
+            return raw, "jpg"
+        output = io.BytesIO()
+        with Image.open(io.BytesIO(raw)) as image:
+            if self.image_format == "webp":
+                image.save(output, format="WEBP", quality=self.quality)
+                return output.getvalue(), "webp"
+            image.convert("RGB").save(output, format="JPEG", quality=self.quality, optimize=True)
+        return output.getvalue(), "jpg"
+
+    def file_path(self, test_run_id: str, filename: str) -> Optional[str]:
+        """Resolve a screenshot file, refusing anything outside the run's directory."""
+        if test_run_id not in self._runs and not RUN_ID_PATTERN.fullmatch(test_run_id):
+            return None
+        if not FILENAME_PATTERN.fullmatch(filename):
+            return None
+        root = os.path.realpath(self.path)
+        path = os.path.realpath(os.path.join(root, test_run_id, filename))
+        if os.path.dirname(path) != os.path.join(root, test_run_id):
+            return None
+        return path if os.path.isfile(path) else None
+
+    def finish_run(self, test_run_id: str) -> Dict[str, Any]:
+        """Return a run's screenshot counters and forget its dedup state."""
+        stats = self.stats(test_run_id)
+        self._runs.pop(test_run_id, None)
+        return stats
+
+    def stats(self, test_run_id: str) -> Dict[str, Any]:
+        """A run's screenshot counters; all zero for runs that captured nothing."""
+        run = self._runs.get(test_run_id) or {}
+        return {
+            "bytes": run.get("bytes", 0),
+            "max_bytes": self.max_bytes_per_run,
+            "saved": run.get("saved", 0),
+            "deduplicated": run.get("deduplicated", 0),
+            "over_budget": run.get("over_budget", 0),
+        }
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Optional, Any
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "cache/selectors.json"
+
+# Sentinel recorded for the "send" slot when the widget has no clickable
+# send button and the prompt has to be submitted with the Enter key.
+ENTER_KEY = "<enter>"
+
+# The Enter sentinel is re-checked this often, in case the widget gained a send button
+ENTER_KEY_TTL_SECONDS = 24 * 3600
+
+# Changes are written to disk at most this many seconds after they are made
+SAVE_DELAY_SECONDS = 2.0
+
+
+def origin_of(url: str) -> str:
+    """Return the scheme://host[:port] origin for a URL."""
+    parsed = urlparse(url or "")
+    if not parsed.scheme or not parsed.netloc:
+        return url or ""
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+class SelectorCache:
+    """Remembers the selectors that resolved the chat widget for each target origin.
+
+    Entries are keyed by origin and by slot (``iframe``, ``input``, ``send``,
+    ``response``). Changes are written to disk ``SAVE_DELAY_SECONDS`` after
+    they are made, in a worker thread, so later runs start warm. A cached
+    selector is dropped as soon as it stops matching, and the Enter key
+    sentinel for ``send`` when Enter did not get a response, or after
+    ``ENTER_KEY_TTL_SECONDS``.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # When each origin's Enter sentinel was recorded (or loaded), by the monotonic clock
+        self._enter_recorded_at: Dict[str, float] = {}
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.entries = {
+                    origin: dict(slots) for origin, slots in data.items() if isinstance(slots, dict)
+                }
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable selector cache {self.path}: {e}")
+        now = time.monotonic()
+        for origin, slots in self.entries.items():
+            if slots.get("send") == ENTER_KEY:
+                self._enter_recorded_at[origin] = now
+
+    def save(self):
+        """Persist the cache atomically, now, including any change waiting to be saved."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        self._write(json.dumps(self.entries, indent=2))
+
+    def _write(self, data: str):
+        if not self.path:
+            return
+        try:
+            with self._write_lock:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save selector cache: {e}")
+
+    def _save_soon(self):
+        """Save after ``SAVE_DELAY_SECONDS``, so a burst of changes is written once."""
+        if self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not inside the event loop (e.g. a script); nothing would run a delayed save
+            self.save()
+            return
+        self._save_handle = loop.call_later(SAVE_DELAY_SECONDS, self._save_in_background, loop)
+
+    def _save_in_background(self, loop: asyncio.AbstractEventLoop):
+        self._save_handle = None
+        # Serialized on the loop, which owns the entries; written in a worker thread
+        loop.run_in_executor(None, self._write, json.dumps(self.entries, indent=2))
+
+    def get(self, origin: str, slot: str) -> Optional[str]:
+        """Return the cached selector for a slot, counting a miss if there is none."""
+        selector = self.entries.get(origin, {}).get(slot)
+        if selector == ENTER_KEY and slot == "send" and self._enter_expired(origin):
+            # Look for a send button again; Enter is recorded afresh if there still is none
+            self.invalidate(origin, slot)
+            return None
+        if selector is None:
+            self.misses += 1
+        return selector
+
+    def _enter_expired(self, origin: str) -> bool:
+        recorded_at = self._enter_recorded_at.get(origin)
+        return recorded_at is not None and time.monotonic() - recorded_at >= ENTER_KEY_TTL_SECONDS
+
+    def confirm(self, origin: str, slot: str):
+        """Count a hit for a cached selector that matched again."""
+        self.hits += 1
+
+    def record(self, origin: str, slot: str, selector: str):
+        """Remember the selector that won for a slot."""
+        slots = self.entries.setdefault(origin, {})
+        if slot == "send" and selector == ENTER_KEY and slots.get(slot) != ENTER_KEY:
+            self._enter_recorded_at[origin] = time.monotonic()
+        if slots.get(slot) == selector:
+            return
+        slots[slot] = selector
+        logger.info(f"Cached {slot} selector for {origin}: {selector}")
+        self._save_soon()
+
+    def invalidate(self, origin: str, slot: str):
+        """Drop a cached selector that no longer matches."""
+        slots = self.entries.get(origin)
+        if not slots or slot not in slots:
+            return
+        stale = slots.pop(slot)
+        if not slots:
+            del self.entries[origin]
+        if stale == ENTER_KEY:
+            self._enter_recorded_at.pop(origin, None)
+        self.misses += 1
+        self.invalidations += 1
+        logger.info(f"Invalidated stale {slot} selector for {origin}: {stale}")
+        self._save_soon()
+
+    def peek(self, origin: str, slot: str) -> Optional[str]:
+        """Return the cached selector for a slot without counting a hit or miss."""
+        return self.entries.get(origin, {}).get(slot)
+
+    def clear(self, origin: Optional[str] = None):
+        """Forget cached selectors for one origin, or for all of them."""
+        if origin is None:
+            self.entries = {}
+            self._enter_recorded_at = {}
+        else:
+            self.entries.pop(origin, None)
+            self._enter_recorded_at.pop(origin, None)
+        self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "origins": len(self.entries),
+            "entries": self.entries,
+        }
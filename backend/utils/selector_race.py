@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+async def race_selectors(
+    scope: Any,
+    selectors: List[str],
+    timeout: int,
+    require_enabled: bool = False
+) -> Tuple[Optional[Any], Optional[str]]:
+    """Wait on every candidate selector at once and return the first visible match.
+
+    ``scope`` is a Playwright ``Page`` or ``Frame``. All waits share the same
+    ``timeout`` (ms), so the worst case is one timeout rather than the sum over
+    the list. When several candidates resolve together the one listed first
+    wins. Returns ``(element, winning_selector)`` or ``(None, None)``.
+    """
+    if not selectors:
+        return None, None
+
+    tasks = {
+        asyncio.create_task(scope.wait_for_selector(selector, state='visible', timeout=timeout)): index
+        for index, selector in enumerate(selectors)
+    }
+    pending = set(tasks)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: tasks[t]):
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                element = task.result()
+                if not element:
+                    continue
+                try:
+                    if require_enabled and not await element.is_enabled():
+                        continue
+                except Exception:
+                    continue
+                selector = selectors[tasks[task]]
+                logger.info(f"Selector race won by #{tasks[task] + 1}/{len(selectors)}: {selector}")
+                return element, selector
+        return None, None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,279 @@
+import json
+import math
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "global"
+
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats (
+    scope TEXT PRIMARY KEY,
+    data TEXT
+);
+
+CREATE TABLE IF NOT EXISTS stats_generations (
+    test_run_id TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+"""
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with bounded relative error (DDSketch style).
+
+    Values are counted in logarithmically sized buckets, so memory depends on
+    the range of values rather than on how many were added, and any quantile
+    is within ``relative_accuracy`` of the true value.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of the bucket in relative terms
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "buckets": {str(key): count for key, count in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data.get("relative_accuracy", 0.01), data.get("min_value", 1e-3))
+        sketch.buckets = {int(key): count for key, count in data.get("buckets", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        return sketch
+
+
+class Aggregate:
+    """Running counts, tag histogram and latency sketch for one scope."""
+
+    def __init__(self):
+        self.total = 0
+        self.status_counts: Dict[str, int] = {}
+        self.tag_counts: Dict[str, int] = {}
+        self.execution_time = QuantileSketch()
+        self.execution_time_sum = 0.0
+        self.execution_time_min: Optional[float] = None
+        self.execution_time_max: Optional[float] = None
+
+    def add(self, record: Dict[str, Any]):
+        self.total += 1
+        status = record.get("status") or "unknown"
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        for tag in set(record.get("tags") or []):
+            self.tag_counts[tag] = self.tag_counts.get(tag, 0) + 1
+        execution_time = record.get("execution_time")
+        if execution_time is not None:
+            self.execution_time.add(execution_time)
+            self.execution_time_sum += execution_time
+            if self.execution_time_min is None or execution_time < self.execution_time_min:
+                self.execution_time_min = execution_time
+            if self.execution_time_max is None or execution_time > self.execution_time_max:
+                self.execution_time_max = execution_time
+
+    def summary(self) -> Dict[str, Any]:
+        timed = self.execution_time.count
+        completed = self.status_counts.get("completed", 0)
+        return {
+            "total": self.total,
+            "status_counts": self.status_counts,
+            "success_rate": completed / self.total if self.total else 0.0,
+            "tag_counts": self.tag_counts,
+            "execution_time": {
+                "count": timed,
+                "mean": self.execution_time_sum / timed if timed else None,
+                "min": self.execution_time_min,
+                "max": self.execution_time_max,
+                "p50": self.execution_time.quantile(0.5),
+                "p90": self.execution_time.quantile(0.9),
+                "p95": self.execution_time.quantile(0.95),
+                "p99": self.execution_time.quantile(0.99),
+            },
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "status_counts": self.status_counts,
+            "tag_counts": self.tag_counts,
+            "execution_time": self.execution_time.to_dict(),
+            "execution_time_sum": self.execution_time_sum,
+            "execution_time_min": self.execution_time_min,
+            "execution_time_max": self.execution_time_max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Aggregate":
+        aggregate = cls()
+        aggregate.total = data.get("total", 0)
+        aggregate.status_counts = data.get("status_counts", {})
+        aggregate.tag_counts = data.get("tag_counts", {})
+        aggregate.execution_time = QuantileSketch.from_dict(data.get("execution_time", {}))
+        aggregate.execution_time_sum = data.get("execution_time_sum", 0.0)
+        aggregate.execution_time_min = data.get("execution_time_min")
+        aggregate.execution_time_max = data.get("execution_time_max")
+        return aggregate
+
+
+def run_scope(test_run_id: str) -> str:
+    return f"run:{test_run_id}"
+
+
+def target_scope(target_url: str) -> str:
+    return f"target:{target_url}"
+
+
+class StatsStore:
+    """Aggregates per run, per target and globally, updated as each result lands.
+
+    Aggregates live in memory and are mirrored to a ``stats`` table in the
+    results index database, so reads never touch the run files. ``add`` only
+    updates memory; the scopes it changed are written in batches (``take_dirty``
+    on the event loop, then ``write`` in a worker thread).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, lock: Optional[threading.RLock] = None):
+        self.conn = conn
+        # Held for every use of the connection, which its owner may share with other threads
+        self.lock = lock or threading.RLock()
+        # Held briefly around the in-memory aggregates, which summaries read from worker threads
+        self.memory_lock = threading.Lock()
+        self.aggregates: Dict[str, Aggregate] = {}
+        self.dirty: Set[str] = set()
+        with self.lock:
+            self.conn.executescript(STATS_SCHEMA)
+            for row in self.conn.execute("SELECT scope, data FROM stats"):
+                self.aggregates[row[0]] = Aggregate.from_dict(json.loads(row[1]))
+
+    def add(self, test_run_id: str, target_url: str, record: Dict[str, Any]):
+        """Fold one result into its run, target and global aggregates, in memory."""
+        with self.memory_lock:
+            for scope in (run_scope(test_run_id), target_scope(target_url), GLOBAL_SCOPE):
+                self.aggregates.setdefault(scope, Aggregate()).add(record)
+                self.dirty.add(scope)
+
+    def take_dirty(self) -> List[Tuple[str, str]]:
+        """Serialize the aggregates changed since the last call, for ``write``."""
+        with self.memory_lock:
+            rows = [
+                (scope, json.dumps(self.aggregates[scope].to_dict()))
+                for scope in self.dirty if scope in self.aggregates
+            ]
+            self.dirty = set()
+        return rows
+
+    def write(self, rows: List[Tuple[str, str]]):
+        """Store serialized aggregates, committing anything else written on the connection with them."""
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO stats (scope, data) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def reset_run(self, test_run_id: str):
+        """Forget a run's own aggregate (e.g. before re-indexing it)."""
+        with self.lock:
+            scope = run_scope(test_run_id)
+            with self.memory_lock:
+                self.aggregates.pop(scope, None)
+                self.dirty.discard(scope)
+            self.conn.execute("DELETE FROM stats WHERE scope = ?", (scope,))
+            self.conn.commit()
+
+    def rebuild_if_stale(self):
+        """Rebuild every aggregate from the index if any run's results changed under it.
+
+        A run's results were replaced (re-indexed from its file, or retried)
+        when its generation in the index (``ResultsIndex.bump_generation``)
+        differs from the one the aggregates were built from. The global count
+        is also compared, for results indexed before statistics existed.
+        This only reads the indexed per-result rows, never the run files.
+        """
+        with self.lock:
+            stale_runs = self.conn.execute(
+                "SELECT COUNT(*) FROM run_generations g "
+                "LEFT JOIN stats_generations s ON s.test_run_id = g.test_run_id "
+                "WHERE s.generation IS NULL OR s.generation != g.generation"
+            ).fetchone()[0]
+            indexed = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            with self.memory_lock:
+                current = self.aggregates.get(GLOBAL_SCOPE)
+                counted = current.total if current else 0
+            if not stale_runs and counted == indexed:
+                return
+
+            logger.info(f"Rebuilding statistics from {indexed} indexed results ({stale_runs} run(s) replaced)")
+            aggregates: Dict[str, Aggregate] = {}
+            tags: Dict[tuple, List[str]] = {}
+            for run_id, idx, tag in self.conn.execute("SELECT test_run_id, idx, tag FROM result_tags"):
+                tags.setdefault((run_id, idx), []).append(tag)
+            rows = self.conn.execute(
+                "SELECT r.test_run_id, r.idx, r.status, r.execution_time, runs.target_url "
+                "FROM results r LEFT JOIN runs ON runs.test_run_id = r.test_run_id"
+            ).fetchall()
+            for run_id, idx, status, execution_time, target_url in rows:
+                record = {
+                    "status": status,
+                    "execution_time": execution_time,
+                    "tags": tags.get((run_id, idx), []),
+                }
+                for scope in (run_scope(run_id), target_scope(target_url or ""), GLOBAL_SCOPE):
+                    aggregates.setdefault(scope, Aggregate()).add(record)
+            with self.memory_lock:
+                self.aggregates = aggregates
+                self.dirty = set()
+            self.conn.execute("DELETE FROM stats")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO stats (scope, data) VALUES (?, ?)",
+                [(scope, json.dumps(aggregate.to_dict())) for scope, aggregate in aggregates.items()]
+            )
+            self.conn.execute("DELETE FROM stats_generations")
+            self.conn.execute("INSERT INTO stats_generations SELECT test_run_id, generation FROM run_generations")
+            self.conn.commit()
+
+    def summary(self, scope: str = GLOBAL_SCOPE) -> Optional[Dict[str, Any]]:
+        with self.memory_lock:
+            aggregate = self.aggregates.get(scope)
+            return aggregate.summary() if aggregate else None
+
+    def targets(self) -> Dict[str, Dict[str, Any]]:
+        prefix = target_scope("")
+        with self.memory_lock:
+            return {
+                scope[len(prefix):]: aggregate.summary()
+                for scope, aggregate in self.aggregates.items()
+                if scope.startswith(prefix)
+            }
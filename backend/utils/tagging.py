@@ -0,0 +1,162 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+try:
+    import ahocorasick
+except ImportError:  # optional C accelerator (pyahocorasick)
+    ahocorasick = None
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "tagging_rules.json")
+
+# Set to point the tagging engines at a different rule file
+RULES_PATH_ENV = "REDPROMPT_TAGGING_RULES"
+
+
+@dataclass
+class RuleSet:
+    """A named group of keywords that adds ``tags`` when any keyword occurs."""
+
+    name: str
+    tags: List[str]
+    patterns: List[str]
+    # Rule sets that suppress this one when they also match
+    unless: List[str] = field(default_factory=list)
+
+
+class TaggingEngine:
+    """Matches every rule set against a text in a single pass.
+
+    All keywords are compiled once into an Aho-Corasick automaton, which
+    reports every (overlapping) keyword occurrence in one scan of the text and
+    stops as soon as further matches can no longer change the tags: every
+    rule set has matched or been suppressed by an ``unless`` rule that has.
+    Without the optional ``pyahocorasick`` package the engine falls back to
+    one substring scan per keyword, which is what the original keyword lists
+    did.
+    """
+
+    def __init__(self, rule_sets: List[RuleSet]):
+        self.rule_sets = rule_sets
+        names = list(dict.fromkeys(rule_set.name for rule_set in rule_sets))
+        # Rule sets are tracked as bits of an int while scanning
+        self._bits = {name: 1 << position for position, name in enumerate(names)}
+        owners: Dict[str, int] = {}
+        for rule_set in rule_sets:
+            for pattern in rule_set.patterns:
+                keyword = pattern.lower()
+                owners[keyword] = owners.get(keyword, 0) | self._bits[rule_set.name]
+        self._owners = owners
+        self._lowered = [
+            (self._bits[rule_set.name], tuple(pattern.lower() for pattern in rule_set.patterns))
+            for rule_set in rule_sets
+        ]
+        self._tags: Dict[int, tuple] = {}
+        self._settled: Dict[int, bool] = {}
+
+        self._automaton = None
+        if ahocorasick is not None and owners:
+            automaton = ahocorasick.Automaton()
+            for keyword, mask in owners.items():
+                automaton.add_word(keyword, mask)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    @property
+    def backend(self) -> str:
+        return "aho-corasick" if self._automaton is not None else "substring"
+
+    def _is_settled(self, found: int) -> bool:
+        """Whether no further keyword match can change the tags of ``found``."""
+        settled = self._settled.get(found)
+        if settled is None:
+            settled = self._settled[found] = all(
+                found & self._bits[rule_set.name] or any(found & self._bits.get(name, 0) for name in rule_set.unless)
+                for rule_set in self.rule_sets
+            )
+        return settled
+
+    def _match_mask(self, text: str) -> int:
+        found = 0
+        if not text or not self._owners:
+            return found
+        text_lower = text.lower()
+
+        if self._automaton is not None:
+            for _, mask in self._automaton.iter(text_lower):
+                if mask & ~found:
+                    found |= mask
+                    if self._is_settled(found):
+                        break
+            return found
+
+        for bit, patterns in self._lowered:
+            if not found & bit and any(pattern in text_lower for pattern in patterns):
+                found |= bit
+        return found
+
+    def match(self, text: str) -> Set[str]:
+        """Return the names of the rule sets with a keyword in ``text`` (case-insensitive).
+
+        Rule sets suppressed by one that matched may be left out.
+        """
+        found = self._match_mask(text)
+        return {name for name, bit in self._bits.items() if found & bit}
+
+    def tag(self, text: str) -> List[str]:
+        """Return the tags of the matching rule sets, in rule order."""
+        found = self._match_mask(text)
+        if not found:
+            return []
+        tags = self._tags.get(found)
+        if tags is None:
+            tags = self._tags[found] = tuple(
+                tag
+                for rule_set in self.rule_sets
+                if found & self._bits[rule_set.name]
+                and not any(found & self._bits.get(name, 0) for name in rule_set.unless)
+                for tag in rule_set.tags
+            )
+        return list(tags)
+
+    def tag_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """Tag a whole batch of texts in one call."""
+        return [self.tag(text) for text in texts]
+
+
+def load_rule_sets(path: Optional[str] = None) -> Dict[str, List[RuleSet]]:
+    """Load rule sets by target ("prompt", "response") from a JSON config file."""
+    path = path or os.environ.get(RULES_PATH_ENV) or DEFAULT_RULES_PATH
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return {
+        target: [
+            RuleSet(
+                name=rule["name"],
+                tags=list(rule["tags"]),
+                patterns=list(rule["patterns"]),
+                unless=list(rule.get("unless", []))
+            )
+            for rule in rules
+        ]
+        for target, rules in config.items()
+    }
+
+
+_engines: Dict[str, TaggingEngine] = {}
+
+
+def get_tagging_engine(target: str) -> TaggingEngine:
+    """Return the compiled engine for "prompt" or "response" rules, compiling it once."""
+    engine = _engines.get(target)
+    if engine is None:
+        for name, rule_sets in load_rule_sets().items():
+            _engines[name] = TaggingEngine(rule_sets)
+        engine = _engines.setdefault(target, TaggingEngine([]))
+    return engine
+
+
+def reload_tagging_engines():
+    """Drop compiled engines so the next lookup re-reads the rule file."""
+    _engines.clear()
@@ -0,0 +1,113 @@
+import time
+from typing import Any, Dict, Optional
+
+# Phases of one prompt, in the order they normally happen
+PHASES = [
+    "pacing_wait", "goto", "iframe_resolve", "input_resolve", "type_submit",
+    "first_response", "settle", "screenshot",
+]
+
+
+def perf_counter_of(epoch: float) -> float:
+    """The ``time.perf_counter()`` reading matching an epoch timestamp, e.g. one from the browser."""
+    return time.perf_counter() - (time.time() - epoch)
+
+
+class PhaseTimer:
+    """Splits one prompt's wall time into consecutive named phases.
+
+    ``begin`` closes the phase in progress and starts the next one, so a
+    failure is charged to the phase it happened in once ``end`` is called.
+    Phases are measured with ``time.perf_counter()``, so clock adjustments
+    cannot distort them.
+    """
+
+    __slots__ = ("phases", "current", "started")
+
+    enabled = True
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.current: Optional[str] = None
+        self.started = 0.0
+
+    def begin(self, phase: str, at: Optional[float] = None):
+        """Start ``phase`` now (or at the ``time.perf_counter()`` reading ``at``), ending the current one."""
+        now = time.perf_counter()
+        if at is not None:
+            now = min(max(at, self.started), now)
+        self._charge(now)
+        self.current = phase
+        self.started = now
+
+    def end(self):
+        """Close the phase in progress."""
+        self._charge(time.perf_counter())
+        self.current = None
+
+    def _charge(self, now: float):
+        if self.current is not None:
+            self.phases[self.current] = self.phases.get(self.current, 0.0) + now - self.started
+
+    def snapshot(self) -> Optional[Dict[str, float]]:
+        return {phase: round(seconds, 4) for phase, seconds in self.phases.items()}
+
+
+class NullTimer:
+    """Stand-in for ``PhaseTimer`` when timings are not recorded."""
+
+    __slots__ = ()
+
+    enabled = False
+
+    def begin(self, phase: str, at: Optional[float] = None):
+        pass
+
+    def end(self):
+        pass
+
+    def snapshot(self) -> Optional[Dict[str, float]]:
+        return None
+
+
+NULL_TIMER = NullTimer()
+
+
+def phase_timer(enabled: bool):
+    return PhaseTimer() if enabled else NULL_TIMER
+
+
+class TimingSummary:
+    """Per-phase totals over a run's results, updated as each result lands."""
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.prompts = 0
+
+    def add(self, timings: Optional[Dict[str, float]]):
+        if not timings:
+            return
+        self.prompts += 1
+        for phase, seconds in timings.items():
+            entry = self.phases.setdefault(phase, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Count, total, mean and max seconds per phase and its share of all timed seconds."""
+        grand_total = sum(entry["total"] for entry in self.phases.values())
+        order = {phase: position for position, phase in enumerate(PHASES)}
+        return {
+            "prompts": self.prompts,
+            "phases": {
+                phase: {
+                    "count": entry["count"],
+                    "total": round(entry["total"], 3),
+                    "mean": round(entry["total"] / entry["count"], 4),
+                    "max": round(entry["max"], 4),
+                    "share": round(entry["total"] / grand_total, 4) if grand_total else 0.0,
+                }
+                for phase, entry in sorted(self.phases.items(), key=lambda item: order.get(item[0], len(order)))
+            },
+        }
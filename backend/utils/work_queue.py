@@ -0,0 +1,371 @@
+import json
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Set to the queue URL shared by the API and its workers
+WORK_QUEUE_ENV = "REDPROMPT_WORK_QUEUE"
+DEFAULT_WORK_QUEUE_URL = "sqlite:///runs/work_queue.db"
+
+# Bearer token workers present to the API's /work-queue endpoints; required by the API when set
+WORKER_TOKEN_ENV = "REDPROMPT_WORKER_TOKEN"
+
+# Attempts at each call to the API's work queue before a network error is given up on
+HTTP_ATTEMPTS = 3
+HTTP_RETRY_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_run_id TEXT,
+    config TEXT,
+    items TEXT,
+    status TEXT,
+    attempts INTEGER DEFAULT 0,
+    worker_id TEXT,
+    lease_expires REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS batches_by_status ON batches (status, batch_id);
+CREATE INDEX IF NOT EXISTS batches_by_run ON batches (test_run_id, status);
+
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_run_id TEXT,
+    idx INTEGER,
+    result TEXT,
+    UNIQUE (test_run_id, idx) ON CONFLICT IGNORE
+);
+"""
+
+# (input index, prompt as a dict)
+WorkItem = Tuple[int, Dict[str, Any]]
+
+
+class WorkQueue(ABC):
+    """Queue of prompt batches leased by out-of-process workers.
+
+    A worker leases one batch at a time and must renew the lease while it
+    works. A batch whose lease expires (the worker died or hung) is handed to
+    the next worker that asks, up to ``max_attempts`` times. Results are
+    reported per prompt and only the first result for each prompt is kept, so
+    redelivered batches never produce duplicates.
+    """
+
+    @abstractmethod
+    def enqueue(self, test_run_id: str, config: Dict[str, Any], batches: List[List[WorkItem]]):
+        ...
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Lease the next batch, or return None if there is nothing to do."""
+        ...
+
+    @abstractmethod
+    def renew(self, batch_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a lease; False means the batch was taken away (expired or cancelled)."""
+        ...
+
+    @abstractmethod
+    def report(self, test_run_id: str, index: int, result: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def complete(self, batch_id: int, worker_id: str):
+        ...
+
+    @abstractmethod
+    def fail(self, batch_id: int, worker_id: str, error: str):
+        """Give a batch back after an error; it is redelivered until attempts run out."""
+        ...
+
+    @abstractmethod
+    def fetch_results(self, test_run_id: str, after_seq: int = 0, limit: int = 500) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """Return (seq, index, result) reported for a run after ``after_seq``."""
+        ...
+
+    @abstractmethod
+    def run_status(self, test_run_id: str) -> Dict[str, Any]:
+        """Batch counts by status plus the items of batches that gave up."""
+        ...
+
+    @abstractmethod
+    def depth(self) -> Dict[str, int]:
+        """Batch counts by status across all runs (queued, leased, ...)."""
+        ...
+
+    @abstractmethod
+    def cancel(self, test_run_id: str):
+        ...
+
+    @abstractmethod
+    def purge(self, test_run_id: str):
+        """Drop a finished run's batches and results."""
+        ...
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue in a SQLite file, shared by the API and workers on one host.
+
+    The file is in WAL mode, which needs shared memory between the processes
+    using it, so it must be on a local filesystem, not a network share.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        # One connection is shared by the threads of the process using it
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def enqueue(self, test_run_id: str, config: Dict[str, Any], batches: List[List[WorkItem]]):
+        config_json = json.dumps(config)
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO batches (test_run_id, config, items, status) VALUES (?, ?, ?, 'queued')",
+                [(test_run_id, config_json, json.dumps(batch)) for batch in batches if batch]
+            )
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock, self.conn:
+            # Take the write lock first so two workers never lease the same batch
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(
+                "UPDATE batches SET status = 'failed', error = COALESCE(error, 'Lease expired too often') "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            row = self.conn.execute(
+                "SELECT batch_id, test_run_id, config, items, attempts FROM batches "
+                "WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY batch_id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            batch_id, test_run_id, config, items, attempts = row
+            self.conn.execute(
+                "UPDATE batches SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = ? "
+                "WHERE batch_id = ?",
+                (worker_id, now + lease_seconds, attempts + 1, batch_id)
+            )
+            # Skip prompts an earlier lease holder already reported
+            done = {
+                idx for (idx,) in self.conn.execute(
+                    "SELECT idx FROM results WHERE test_run_id = ?", (test_run_id,)
+                )
+            }
+        return {
+            "batch_id": batch_id,
+            "test_run_id": test_run_id,
+            "config": json.loads(config),
+            "items": [item for item in json.loads(items) if item[0] not in done],
+            "attempt": attempts + 1,
+        }
+
+    def renew(self, batch_id: int, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE batches SET lease_expires = ? WHERE batch_id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + lease_seconds, batch_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def report(self, test_run_id: str, index: int, result: Dict[str, Any]):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO results (test_run_id, idx, result) VALUES (?, ?, ?)",
+                (test_run_id, index, json.dumps(result))
+            )
+
+    def complete(self, batch_id: int, worker_id: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE batches SET status = 'done', lease_expires = NULL "
+                "WHERE batch_id = ? AND worker_id = ? AND status = 'leased'",
+                (batch_id, worker_id)
+            )
+
+    def fail(self, batch_id: int, worker_id: str, error: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE batches SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "error = ?, lease_expires = NULL "
+                "WHERE batch_id = ? AND worker_id = ? AND status = 'leased'",
+                (self.max_attempts, error, batch_id, worker_id)
+            )
+
+    def fetch_results(self, test_run_id: str, after_seq: int = 0, limit: int = 500) -> List[Tuple[int, int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, idx, result FROM results WHERE test_run_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (test_run_id, after_seq, limit)
+            ).fetchall()
+        return [(seq, idx, json.loads(result)) for seq, idx, result in rows]
+
+    def run_status(self, test_run_id: str) -> Dict[str, Any]:
+        with self._lock:
+            # Expired leases count as failed once they have used up their attempts
+            self.conn.execute(
+                "UPDATE batches SET status = 'failed', error = COALESCE(error, 'Lease expired too often') "
+                "WHERE test_run_id = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (test_run_id, time.time(), self.max_attempts)
+            )
+            counts = dict(self.conn.execute(
+                "SELECT status, COUNT(*) FROM batches WHERE test_run_id = ? GROUP BY status", (test_run_id,)
+            ).fetchall())
+            failed_items = [
+                (item, error)
+                for items, error in self.conn.execute(
+                    "SELECT items, error FROM batches WHERE test_run_id = ? AND status = 'failed'", (test_run_id,)
+                ).fetchall()
+                for item in json.loads(items)
+            ]
+        return {"batches": counts, "failed_items": failed_items}
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM batches GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ("queued", "leased")}
+
+    def cancel(self, test_run_id: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE batches SET status = 'cancelled', lease_expires = NULL "
+                "WHERE test_run_id = ? AND status IN ('queued', 'leased')",
+                (test_run_id,)
+            )
+
+    def purge(self, test_run_id: str):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM batches WHERE test_run_id = ?", (test_run_id,))
+            self.conn.execute("DELETE FROM results WHERE test_run_id = ?", (test_run_id,))
+
+
+class HTTPWorkQueue(WorkQueue):
+    """Worker side of the API's work queue, reached over HTTP at its ``/work-queue`` endpoints.
+
+    Lets workers on other hosts share one queue: the API keeps the batches in
+    its own (local) queue and hands each lease out from there, so no batch is
+    leased to two workers at once. Only the calls a worker makes are
+    available; the API enqueues and collects results on its own queue.
+
+    A lease that cannot reach the API counts as an empty queue, and a lost
+    completion or failure report is left to lease expiry, which redelivers
+    the batch without duplicating its reported results.
+    """
+
+    def __init__(self, base_url: str, token: Optional[str] = None, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.client = httpx.Client(base_url=self.base_url, headers=headers, timeout=timeout)
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Any:
+        for attempt in range(1, HTTP_ATTEMPTS + 1):
+            try:
+                response = self.client.post(path, json=payload)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error: Exception = httpx.HTTPStatusError(
+                    f"{response.status_code} from {self.base_url}{path}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+            if attempt < HTTP_ATTEMPTS:
+                time.sleep(HTTP_RETRY_SECONDS * attempt)
+        raise error
+
+    def enqueue(self, test_run_id: str, config: Dict[str, Any], batches: List[List[WorkItem]]):
+        raise NotImplementedError("Runs are enqueued by the API on its own work queue")
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        try:
+            return self._post("/lease", {"worker_id": worker_id, "lease_seconds": lease_seconds})["batch"]
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not lease from {self.base_url}: {e}")
+            return None
+
+    def renew(self, batch_id: int, worker_id: str, lease_seconds: float) -> bool:
+        try:
+            return self._post(
+                f"/batches/{batch_id}/renew", {"worker_id": worker_id, "lease_seconds": lease_seconds}
+            )["renewed"]
+        except httpx.HTTPError as e:
+            # Keep working; the next renewal tells whether the lease survived
+            logger.warning(f"Could not renew the lease on batch {batch_id}: {e}")
+            return True
+
+    def report(self, test_run_id: str, index: int, result: Dict[str, Any]):
+        self._post(f"/runs/{test_run_id}/results", {"index": index, "result": result})
+
+    def complete(self, batch_id: int, worker_id: str):
+        try:
+            self._post(f"/batches/{batch_id}/complete", {"worker_id": worker_id})
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not complete batch {batch_id}; it is redelivered once its lease expires: {e}")
+
+    def fail(self, batch_id: int, worker_id: str, error: str):
+        try:
+            self._post(f"/batches/{batch_id}/fail", {"worker_id": worker_id, "error": error})
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not give back batch {batch_id}; it is redelivered once its lease expires: {e}")
+
+    def fetch_results(self, test_run_id: str, after_seq: int = 0, limit: int = 500) -> List[Tuple[int, int, Dict[str, Any]]]:
+        raise NotImplementedError("Results are collected by the API from its own work queue")
+
+    def run_status(self, test_run_id: str) -> Dict[str, Any]:
+        raise NotImplementedError("Run status is kept by the API's own work queue")
+
+    def depth(self) -> Dict[str, int]:
+        raise NotImplementedError("Queue depth is kept by the API's own work queue")
+
+    def cancel(self, test_run_id: str):
+        raise NotImplementedError("Runs are cancelled through the API")
+
+    def purge(self, test_run_id: str):
+        raise NotImplementedError("Runs are purged by the API on its own work queue")
+
+
+def _sqlite_queue(url) -> WorkQueue:
+    # sqlite:///relative/path.db or sqlite:////absolute/path.db
+    return SQLiteWorkQueue(url.path[1:] if url.path.startswith("/") else url.path)
+
+
+def _http_queue(url) -> WorkQueue:
+    # http(s)://api-host:8000/work-queue, for workers on other hosts than the API
+    return HTTPWorkQueue(url.geturl(), token=os.environ.get(WORKER_TOKEN_ENV))
+
+
+# Queue backends by URL scheme; other backends register here
+WORK_QUEUE_BACKENDS = {
+    "sqlite": _sqlite_queue,
+    "http": _http_queue,
+    "https": _http_queue,
+}
+
+
+def open_work_queue(url: Optional[str] = None) -> WorkQueue:
+    """Open the work queue at ``url`` (default: $REDPROMPT_WORK_QUEUE or a local SQLite file)."""
+    url = url or os.environ.get(WORK_QUEUE_ENV) or DEFAULT_WORK_QUEUE_URL
+    parsed = urlparse(url)
+    backend = WORK_QUEUE_BACKENDS.get(parsed.scheme)
+    if backend is None:
+        raise ValueError(f"Unsupported work queue URL: {url}")
+    return backend(parsed)
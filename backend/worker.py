@@ -0,0 +1,191 @@
+"""Standalone test worker.
+
+Leases prompt batches from the shared work queue, runs them with
+``ChatWidgetTester`` and reports each result back. Start the API with
+REDPROMPT_EXECUTION_MODE=remote and run as many workers as needed on the
+same host, all pointed at the same REDPROMPT_WORK_QUEUE:
+
+    python worker.py --worker-id worker-1
+
+Workers on other hosts lease through the API instead (set
+REDPROMPT_WORKER_TOKEN on both sides to require a shared token):
+
+    python worker.py --queue http://api-host:8000/work-queue
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+if sys.platform.startswith("win"):
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+from typing import Any, Dict
+
+from models import PromptData, TestRunRequest, TestResult
+from utils.test_runner import run_prompt_tests, prompt_test_options
+from utils.selector_cache import SelectorCache
+from utils.response_cache import ResponseCache
+from utils.work_queue import WorkQueue, open_work_queue
+from utils.browser_pool import BrowserPool
+from utils.network_policy import StaticAssetCache
+from utils.screenshots import ScreenshotStore
+from utils.direct_protocol import ProtocolStore
+from utils import metrics
+
+logger = logging.getLogger("worker")
+
+# Seconds between refreshes of the browser pool gauges served on --metrics-port
+POOL_METRICS_INTERVAL = 5.0
+
+
+async def keep_lease(work_queue: WorkQueue, batch_id: int, worker_id: str, lease_seconds: float):
+    """Renew a lease until it is lost; returns when the batch was taken away."""
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        if not await asyncio.to_thread(work_queue.renew, batch_id, worker_id, lease_seconds):
+            return
+
+
+async def run_batch(
+    work_queue: WorkQueue,
+    batch: Dict[str, Any],
+    worker_id: str,
+    lease_seconds: float,
+    selector_cache: SelectorCache,
+    response_cache: ResponseCache,
+    asset_cache: StaticAssetCache,
+    screenshot_store: ScreenshotStore,
+    protocol_store: ProtocolStore,
+    browser_pool: BrowserPool
+) -> bool:
+    """Run one leased batch; returns False if the lease was lost part-way."""
+    request = TestRunRequest(**batch["config"])
+    indices = [index for index, _ in batch["items"]]
+    prompts = [PromptData(**prompt) for _, prompt in batch["items"]]
+
+    async def on_result(position: int, result: TestResult):
+        await asyncio.to_thread(work_queue.report, batch["test_run_id"], indices[position], result.dict())
+
+    run = asyncio.create_task(run_prompt_tests(
+        request.target_url,
+        prompts,
+        **prompt_test_options(request),
+        selector_cache=selector_cache,
+        response_cache=response_cache,
+        on_result=on_result,
+        browser_pool=browser_pool,
+        asset_cache=asset_cache,
+        screenshot_store=screenshot_store,
+        run_id=batch["test_run_id"],
+        protocol_store=protocol_store
+    ))
+    heartbeat = asyncio.create_task(keep_lease(work_queue, batch["batch_id"], worker_id, lease_seconds))
+    try:
+        await asyncio.wait({run, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        if not run.done():
+            logger.warning(f"Lost lease on batch {batch['batch_id']}; abandoning it")
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+            return False
+        run.result()
+        return True
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+
+
+async def refresh_pool_metrics(browser_pool: BrowserPool, interval: float = POOL_METRICS_INTERVAL):
+    """Update the browser pool gauges from the event loop that owns the pool.
+
+    The metrics server renders from its own thread, so it only ever reads
+    these gauges, never the pool itself.
+    """
+    collect = metrics.browser_pool_collector(browser_pool)
+    while True:
+        try:
+            await browser_pool.sample_rss()
+            collect()
+        except Exception as e:
+            logger.warning(f"Could not refresh browser pool metrics: {e}")
+        await asyncio.sleep(interval)
+
+
+async def work(
+    work_queue: WorkQueue,
+    worker_id: str,
+    lease_seconds: float,
+    poll_interval: float,
+    browser_pool: BrowserPool,
+    pool_metrics: bool = False
+):
+    """Lease and run batches until cancelled."""
+    if pool_metrics:
+        metrics_task = asyncio.create_task(refresh_pool_metrics(browser_pool))
+    selector_cache = SelectorCache()
+    response_cache = ResponseCache()
+    asset_cache = StaticAssetCache()
+    # Screenshots are only served by the API if this directory is shared with it
+    screenshot_store = ScreenshotStore()
+    protocol_store = ProtocolStore()
+    logger.info(f"Worker {worker_id} waiting for work")
+    try:
+        while True:
+            batch = await asyncio.to_thread(work_queue.lease, worker_id, lease_seconds)
+            if batch is None:
+                await asyncio.sleep(poll_interval)
+                continue
+
+            batch_id = batch["batch_id"]
+            logger.info(
+                f"Leased batch {batch_id} of run {batch['test_run_id']} "
+                f"({len(batch['items'])} prompts, attempt {batch['attempt']})"
+            )
+            try:
+                if batch["items"] and not await run_batch(
+                    work_queue, batch, worker_id, lease_seconds, selector_cache, response_cache, asset_cache,
+                    screenshot_store, protocol_store, browser_pool
+                ):
+                    continue
+                await asyncio.to_thread(work_queue.complete, batch_id, worker_id)
+            except Exception as e:
+                logger.error(f"Batch {batch_id} failed: {e}")
+                await asyncio.to_thread(work_queue.fail, batch_id, worker_id, str(e))
+    finally:
+        if pool_metrics:
+            metrics_task.cancel()
+        selector_cache.save()
+        await browser_pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RedPrompt test worker")
+    parser.add_argument("--queue", help="Work queue URL, sqlite:///... or http://api-host/work-queue (default: $REDPROMPT_WORK_QUEUE)")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--lease-seconds", type=float, default=120, help="Lease length, renewed while a batch runs")
+    parser.add_argument("--poll-interval", type=float, default=2, help="Seconds between polls of an empty queue")
+    parser.add_argument("--browsers", type=int, default=1, help="Warm browsers kept by this worker")
+    parser.add_argument("--metrics-port", type=int, help="Serve this worker's runner metrics on /metrics")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Interface for --metrics-port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    browser_pool = BrowserPool(size=args.browsers)
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port, args.metrics_host)
+    try:
+        asyncio.run(work(
+            open_work_queue(args.queue),
+            args.worker_id,
+            args.lease_seconds,
+            args.poll_interval,
+            browser_pool,
+            pool_metrics=bool(args.metrics_port)
+        ))
+    except KeyboardInterrupt:
+        # A batch in flight is redelivered once its lease expires
+        pass
+
+
+if __name__ == "__main__":
+    main()
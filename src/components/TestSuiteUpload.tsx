@@ -6,7 +6,7 @@ import { downloadExampleJSON, downloadExampleCSV } from '@/utils/exampleFiles';
 import { uploadPrompts } from '@/utils/redpromptApi';
 
 interface TestSuiteUploadProps {
-  onFileUpload: (prompts: PromptData[]) => void;
+  onFileUpload: (prompts: PromptData[], promptSetId?: string) => void;
 }
 
 export const TestSuiteUpload = ({ onFileUpload }: TestSuiteUploadProps) => {
@@ -21,8 +21,8 @@ export const TestSuiteUpload = ({ onFileUpload }: TestSuiteUploadProps) => {
     setIsProcessing(true);
     setError(null);
     try {
-      const prompts = await uploadPrompts(file);
-      onFileUpload(prompts);
+      const upload = await uploadPrompts(file);
+      onFileUpload(upload.prompts, upload.prompt_set_id);
     } catch (err: any) {
       setError(err.message || 'Failed to upload prompts');
       onFileUpload([]);
@@ -1,10 +1,10 @@
 import { useEffect, useState } from 'react';
 import { Header } from '@/components/Header';
-import { getResults, TestRunResult } from '@/utils/redpromptApi';
+import { getResults, TestRunSummary } from '@/utils/redpromptApi';
 import { Table, TableHeader, TableRow, TableHead, TableBody, TableCell } from '@/components/ui/table';
 
 const History = () => {
-  const [runs, setRuns] = useState<TestRunResult[]>([]);
+  const [runs, setRuns] = useState<TestRunSummary[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -15,9 +15,11 @@ const Index = () => {
   const [traceMode, setTraceMode] = useState(false);
   const [currentFilter, setCurrentFilter] = useState('all');
   const [testRunId, setTestRunId] = useState<string | null>(null);
+  const [promptSetId, setPromptSetId] = useState<string | undefined>(undefined);
 
-  const handleFileUpload = (uploadedPrompts: PromptData[]) => {
+  const handleFileUpload = (uploadedPrompts: PromptData[], uploadedSetId?: string) => {
     setPrompts(uploadedPrompts);
+    setPromptSetId(uploadedSetId);
     setResponses([]);
   };
 
@@ -26,13 +28,13 @@ const Index = () => {
     setIsRunning(true);
     setResponses([]);
     try {
-      const runResp: TestRunResponse = await runTests(targetUrl);
+      const runResp: TestRunResponse = await runTests(targetUrl, promptSetId);
       setTestRunId(runResp.test_run_id);
       // Poll for results every 2 seconds until status is not 'started'
       let finished = false;
       while (!finished) {
         const result: TestRunResult = await getTestResult(runResp.test_run_id);
-        if (result.status === 'completed' || result.status === 'error') {
+        if (['completed', 'error', 'cancelled', 'interrupted'].includes(result.status)) {
           setResponses(result.results as PromptData[]);
           setIsRunning(false);
           finished = true;
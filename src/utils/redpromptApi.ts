@@ -45,14 +45,25 @@ export interface TestRunResult {
   error?: string;
 }
 
+export type TestRunSummary = Omit<TestRunResult, 'results'>;
+
 export interface ResultsResponse {
-  results: TestRunResult[];
+  results: TestRunSummary[];
   total_runs: number;
+  next_cursor: string | null;
 }
 
 const API_BASE = 'http://localhost:8000';
 
-export async function uploadPrompts(file: File): Promise<PromptData[]> {
+export interface UploadResponse {
+  prompt_set_id: string;
+  prompts_count: number;
+  tag_counts: Record<string, number>;
+  prompts: PromptData[];  // preview of the first prompts only
+  preview_truncated: boolean;
+}
+
+export async function uploadPrompts(file: File): Promise<UploadResponse> {
   const formData = new FormData();
   formData.append('file', file);
   const res = await fetch(`${API_BASE}/upload-prompts`, {
@@ -60,15 +71,14 @@ export async function uploadPrompts(file: File): Promise<PromptData[]> {
     body: formData,
   });
   if (!res.ok) throw new Error('Failed to upload prompts');
-  const data = await res.json();
-  return data.prompts;
+  return res.json();
 }
 
-export async function runTests(targetUrl: string): Promise<TestRunResponse> {
+export async function runTests(targetUrl: string, promptSetId?: string): Promise<TestRunResponse> {
   const res = await fetch(`${API_BASE}/run-tests`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ target_url: targetUrl }),
+    body: JSON.stringify({ target_url: targetUrl, prompt_set_id: promptSetId }),
   });
   if (!res.ok) throw new Error('Failed to start test run');
   return res.json();